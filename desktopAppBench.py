@@ -0,0 +1,150 @@
+# LaBLog Poster: A desktop App for interacting with the University of 
+# Southampton LaBLog system as an electronic laboratory notebook
+#
+# Copyright (C) 2010 Cameron Neylon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Dependencies: The benchmark requires PyQt and Qt to be installed and
+# a display to show the application window on. 
+#
+# Usage: python desktopAppBench.py [--runs N] [--json FILE]
+#
+# Each run starts the application in a new interpreter and measures the
+# time until the main window is first painted, divided between starting
+# the interpreter, importing the application, creating the window and
+# painting it. The window is closed as soon as it has been painted.
+
+import os.path
+import sys
+import time
+import json
+import optparse
+import subprocess
+
+# Global Variables
+
+FORMAT_VERSION = 1
+
+# The phases the time to first paint is divided between
+PHASES = ['interpreter', 'import', 'window', 'paint']
+
+def first_paint(launched):
+    """Run the application until its window is first painted
+
+    This is run in the interpreter started by run_once, with launched
+    the time the interpreter was started, and writes the times of the 
+    phases and the application modules imported as JSON to standard 
+    output.
+    """
+
+    start = time.time()
+    from PyQt4.QtCore import QObject, QEvent
+    from PyQt4.QtGui import QApplication
+    import desktopAppController
+    imported = time.time()
+
+    app = QApplication(sys.argv[:1])
+    window = desktopAppController.desktopApp()
+    created = time.time()
+
+    painted = []
+    class PaintFilter(QObject):
+        def eventFilter(self, watched, event):
+            if event.type() == QEvent.Paint and not painted:
+                painted.append(time.time())
+                app.quit()
+            return False
+
+    paintfilter = PaintFilter()
+    app.installEventFilter(paintfilter)
+    window.show()
+    app.exec_()
+
+    modules = [name for name in sys.modules if sys.modules[name] and
+               (name.startswith('lablog') or name.startswith('desktopApp'))]
+    print json.dumps({'phases'  : {'interpreter' : start - launched,
+                                   'import'      : imported - start,
+                                   'window'      : created - imported,
+                                   'paint'       : painted[0] - created},
+                      'total'   : painted[0] - launched,
+                      'modules' : sorted(modules)})
+
+def run_once():
+    """Time the first paint of the application in a new interpreter"""
+
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__),
+                                '--first-paint', repr(time.time())],
+                               stdout = subprocess.PIPE,
+                               cwd = os.path.dirname(os.path.abspath(
+                                                                __file__)))
+    output = process.communicate()[0]
+    assert process.returncode == 0, 'Application failed to start'
+    return json.loads(output)
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+def main(args):
+    parser = optparse.OptionParser(usage = '%prog [options]')
+    parser.add_option('--runs', type = 'int', default = 5,
+                      help = 'times the application is started [%default]')
+    parser.add_option('--json', metavar = 'FILE',
+                      help = "write the results as JSON to FILE, '-' "
+                             "for standard output")
+    parser.add_option('--first-paint', type = 'float', metavar = 'TIME',
+                      help = optparse.SUPPRESS_HELP)
+    options, arguments = parser.parse_args(args)
+
+    if options.first_paint != None:
+        first_paint(options.first_paint)
+        return 0
+    if options.runs < 1:
+        parser.error('--runs must be at least 1')
+
+    runs = [run_once() for i in range(options.runs)]
+    report = {'version' : FORMAT_VERSION,
+              'python'  : sys.version.split()[0],
+              'platform': sys.platform,
+              'time'    : time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'runs'    : runs}
+
+    if options.json == '-':
+        print json.dumps(report, indent = 1, sort_keys = True)
+    else:
+        if options.json:
+            f = open(options.json, 'w')
+            json.dump(report, f, indent = 1, sort_keys = True)
+            f.close()
+        print_report(report)
+    return 0
+
+def print_report(report):
+    runs = report['runs']
+    print '%-12s %9s %9s' % ('phase', 'median', 'min')
+    for phase in PHASES:
+        times = [run['phases'][phase] for run in runs]
+        print '%-12s %8.3fs %8.3fs' % (phase, median(times), min(times))
+    totals = [run['total'] for run in runs]
+    print '%-12s %8.3fs %8.3fs' % ('first paint', median(totals), 
+                                   min(totals))
+    print 'Modules loaded: ' + ', '.join(runs[-1]['modules'])
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -21,15 +21,50 @@
 # this source distribution and separately with a ccZero public domain
 # waiver at http://github.com/cameronneylon/LaBLog-Utilities. The 
 # application requires a range of modules from the Python 2.6 standard 
-# library. 
+# library. The desktopAppDoc and desktopAppView modules are imported 
+# when a blog action is first chosen rather than at startup.
 
 import sys
 import os.path
 import logging
+import optparse
 from PyQt4.QtGui import *
 from PyQt4.QtCore import *
-import desktopAppDoc
-import desktopAppView
+import desktopAppPrefs
+import lablogtrace
+
+# Global Variables
+
+# The document and view classes of each blog action, as (module, class)
+# pairs. The modules are only imported, see load_class, when the action
+# is first chosen so that they and the upload code they need do not
+# slow the appearance of the application window.
+DOCVIEWS = {'MultiPostDataUpload' : (('desktopAppDoc', 
+                                      'MultiPostDataUploadDoc'),
+                                     ('desktopAppView', 
+                                      'MultiPostDataUploadView')),
+            'MultiPostCreation'   : (('desktopAppDoc', 
+                                      'MultiPostCreationDoc'),
+                                     ('desktopAppView', 
+                                      'MultiPostCreationView'))}
+
+# Milliseconds after startup before the server catalogues are refreshed
+CATALOGUE_REFRESH_DELAY = 1000
+
+# Debugging messages are only written, here, if asked for with --debug
+LOG_FILENAME = os.path.join(os.path.expanduser('~'), '.lablog-desktop.log')
+
+def load_class(module, name):
+    """Import a module if it is not already and return one of its classes
+    """
+
+    return getattr(__import__(module), name)
+
+def load_doc_class(action):
+    return load_class(*DOCVIEWS[action][0])
+
+def load_view_class(action):
+    return load_class(*DOCVIEWS[action][1])
 
 class desktopApp(QMainWindow):
     def __init__(self, *args):
@@ -80,18 +115,28 @@ class desktopApp(QMainWindow):
 
         The preferences doc holds the lists of available servers as
         well as the relationship between servers, blogs, and 
-        usernames. The method initialises the document for the prefs
-        and then connects the Signal sigDocCurrentBlogServerSet to 
-        the function that will we reset the menus with the appropriate
-        blogs and usernames for that server.
+        usernames, loaded from the preferences saved by the last
+        session, from which the menus are populated. The method 
+        initialises the document for the prefs and then connects the
+        Signal sigDocCurrentBlogServerSet to the function that will we
+        reset the menus with the appropriate blogs and usernames for 
+        that server.
         """
 
         # Create and initialise the Preferences Document
-        self.prefs = desktopAppDoc.PrefsDoc()
+        self.prefs = desktopAppPrefs.PrefsDoc()
 
         # Connect the signal to trigger the re-setting of the menus
         self.connect(self.prefs, SIGNAL('sigDocCurrentBlogServerSet'),
                                self.resetBlogandUserMenu)
+        self.connect(self.prefs, SIGNAL('sigDocCatalogueChanged'),
+                               self.resetBlogServerMenu)
+        self.connect(self.prefs, SIGNAL('sigDocCatalogueChanged'),
+                               self.resetBlogandUserMenu)
+
+        # Bring the cached blogs and usernames up to date once the window
+        # is showing
+        QTimer.singleShot(CATALOGUE_REFRESH_DELAY, self.prefs.refreshCatalogue)
 
     def initMenuBar(self):
 
@@ -119,18 +164,13 @@ class desktopApp(QMainWindow):
         # First the blog server selection menu
         self.blogservermenu = QMenu()
         self.blogservermenu.setTitle('Select Blog Server')
-        i=0
-        for server in self.prefs.blogserverlist:
-            self.blogservermenu.addAction(server,
-                      lambda i=i: self.slotBlogServerMenuActivated(i))
-            i+=1
+        self.resetBlogServerMenu()
 
         # Then the current blog selection menu
         self.blogselectionmenu = QMenu()
         self.blogselectionmenu.setTitle('Select Blog')
         i=0
-        for blog in self.prefs.servertoblogmapping[
-                                           self.prefs.currentblogserver]:
+        for blog in self.prefs.getBlogsforCurrentBlogServer():
             self.blogselectionmenu.addAction(blog,
                       lambda i=i: self.slotBlogSelectionMenuActivated(i))
             i+=1
@@ -139,8 +179,7 @@ class desktopApp(QMainWindow):
         self.usernamemenu = QMenu()
         self.usernamemenu.setTitle('Select username')
         i=0
-        for username in self.prefs.usernamemapping[
-                                      self.prefs.currentblogserver]:
+        for username in self.prefs.getUsernamesforCurrentBlogServer():
             self.usernamemenu.addAction(username, 
                       lambda i=i: self.slotUsernameMenuActivated(i))
             i+=1
@@ -159,7 +198,9 @@ class desktopApp(QMainWindow):
     # required, one to initialise the appropriate document which will
     # be a subclass of AbstractPostDoc and placed in desktopAppDoc.py,
     # and one to initialise the connected view which will be a subclass
-    # of AbstractPostView and placed in desktopAppView.py. The main
+    # of AbstractPostView and placed in desktopAppView.py. The classes
+    # are registered in DOCVIEWS and created with load_doc_class and 
+    # load_view_class so that they are imported only when needed. The main
     # purpose of the initalisation is to connect up the appropriate
     # signals that are specific to that blog action. Generic connections
     # are provided by the generic init methods that should be called
@@ -193,6 +234,8 @@ class desktopApp(QMainWindow):
                                 self.notifyDocPostTextModified)
         self.connect(self.view, SIGNAL('sigViewDoUpload'),
                                 self.notifyDocDoUpload)
+        self.connect(self.view, SIGNAL('sigViewCancelUpload'),
+                                self.notifyDocCancelUpload)
 
     def initMultiPostDataUploadDoc(self):
         """The initialisation method for MultiPostDataUpload Docs
@@ -202,7 +245,7 @@ class desktopApp(QMainWindow):
         otherwise the document will not exist to connect the signals from.
         """
 
-        self.doc = desktopAppDoc.MultiPostDataUploadDoc(self.prefs)
+        self.doc = load_doc_class('MultiPostDataUpload')(self.prefs)
         self.initGeneralDocConnections()
 
     def initMultiPostDataUploadView(self):
@@ -215,7 +258,7 @@ class desktopApp(QMainWindow):
         """
 
         # Create the view
-        self.view = desktopAppView.MultiPostDataUploadView(self.doc)
+        self.view = load_view_class('MultiPostDataUpload')(self.doc)
         # Call the general connections method
         self.initGeneralViewConnections()
 
@@ -228,11 +271,21 @@ class desktopApp(QMainWindow):
         self.connect(self.view, SIGNAL('sigViewUseFilenameCheckedFALSE'),
                                 self.notifyDocUseFilenameCheckedFalse)
 
+        self.connect(self.view, SIGNAL('sigViewResumeCheckedTRUE'),
+                                self.notifyDocResumeCheckedTrue)
+        self.connect(self.view, SIGNAL('sigViewResumeCheckedFALSE'),
+                                self.notifyDocResumeCheckedFalse)
+
+        self.connect(self.view, SIGNAL('sigViewWatchCheckedTRUE'),
+                                self.notifyDocWatchCheckedTrue)
+        self.connect(self.view, SIGNAL('sigViewWatchCheckedFALSE'),
+                                self.notifyDocWatchCheckedFalse)
+
     def initMultiPostCreationDoc(self):
         """Init method for multiple post creation document
         """
 
-        self.doc = desktopAppDoc.MultiPostCreationDoc(self.prefs)
+        self.doc = load_doc_class('MultiPostCreation')(self.prefs)
         self.initGeneralDocConnections()
 
     def initMultiPostCreationView(self):
@@ -240,7 +293,7 @@ class desktopApp(QMainWindow):
         """
 
         # Create the view and call general connections function
-        self.view = desktopAppView.MultiPostCreationView(self.doc)
+        self.view = load_view_class('MultiPostCreation')(self.doc)
         self.initGeneralViewConnections()
 
         # Connect all the specific connections for this view/doc pair
@@ -313,35 +366,44 @@ class desktopApp(QMainWindow):
     def notifyDocTitleModified(self):
         """Notify the document when title line edit changed
         """
-        logging.debug('Setting Post Title: ' + self.view.titleedit.text())
+        logging.debug('Setting Post Title: %s', self.view.titleedit.text())
         self.doc.setPostTitle(self.view.titleedit.text())
 
     def notifyDocSectionChanged(self):
         """Notify the document when post section changed
         """
-        logging.debug('desktopAppController: Setting Post Section: ' 
-                             + self.view.metadatawidget.getSection())
+        logging.debug('desktopAppController: Setting Post Section: %s',
+                      self.view.metadatawidget.getSection())
         self.doc.setPostSection(self.view.metadatawidget.getSection())
 
     def notifyDocMetadataChanged(self):
         """Notify the document when metadata widget changes
         """
-        logging.debug('desktopAppController: Metadata Widget Changed: ' 
-                      + str(self.view.metadatawidget.getMetadata()))
+        logging.debug('desktopAppController: Metadata Widget Changed: %s',
+                      self.view.metadatawidget.getMetadata())
         self.doc.setPostMetadata(self.view.metadatawidget.getMetadata())
 
     def notifyDocPostTextModified(self):
         """Notify the document when post content box changed
+
+        The view sends the post text once typing pauses rather than
+        on every keystroke.
         """
-        logging.debug('desktopAppController: Setting Post Content: ' 
-                          + self.view.posttext.toPlainText())
-        self.doc.setPostContent(self.view.posttext.toPlainText())
+        content = self.view.posttext.toPlainText()
+        logging.debug('desktopAppController: Setting Post Content: '
+                      '%d characters', content.length())
+        self.doc.setPostContent(content)
 
     def notifyDocDoUpload(self):
         """Notify the document when the upload button pressed
         """
         self.doc.doUpload()
 
+    def notifyDocCancelUpload(self):
+        """Notify the document when the cancel button pressed
+        """
+        self.doc.cancelUpload()
+
 
     ####################
     # Slots from the MultiPostDataUpload UI
@@ -350,21 +412,42 @@ class desktopApp(QMainWindow):
     def notifyDocUseFilenameCheckedTrue(self):
         """Notify the document when usefilename checked
         """
-        logging.debug('desktopAppController: UseFilenameCheck: ' + 
-                      str(self.view.usefilenamecheck.isChecked()))
+        logging.debug('desktopAppController: UseFilenameCheck: %s',
+                      self.view.usefilenamecheck.isChecked())
         self.doc.setUseFilename(True)
 
     def notifyDocUseFilenameCheckedFalse(self):
         """Notify the document when usefilename unchecked
         """
-        logging.debug('desktopAppController: UseFilenameCheck: ' + 
-                      str(self.view.usefilenamecheck.isChecked()))
+        logging.debug('desktopAppController: UseFilenameCheck: %s',
+                      self.view.usefilenamecheck.isChecked())
         self.doc.setUseFilename(False)     
 
+    def notifyDocResumeCheckedTrue(self):
+        """Notify the document when resume checked
+        """
+        self.doc.setResume(True)
+
+    def notifyDocResumeCheckedFalse(self):
+        """Notify the document when resume unchecked
+        """
+        self.doc.setResume(False)
+
+    def notifyDocWatchCheckedTrue(self):
+        """Notify the document when watch checked
+        """
+        self.doc.setWatch(True)
+
+    def notifyDocWatchCheckedFalse(self):
+        """Notify the document when watch unchecked
+        """
+        self.doc.setWatch(False)
+
     def notifyDocDataDirModified(self):
         """Notify the document when data directory box changed
         """
-        logging.debug('Setting Post Title: ' + self.view.dirTextBox.text())
+        logging.debug('Setting Data Directory: %s', 
+                      self.view.dirTextBox.text())
         self.doc.setDataDirectory(self.view.dirTextBox.text())
 
 
@@ -375,14 +458,25 @@ class desktopApp(QMainWindow):
     def notifyDocNumpostsValueChanged(self):
         """Notify the document when the numposts spingbox value changes
         """
-        logging.debug('Numposts Spinbox set to: ' +
-                        str(self.view.numpostspinbox.value()))
+        logging.debug('Numposts Spinbox set to: %d',
+                      self.view.numpostspinbox.value())
         self.doc.setNumPosts(self.view.numpostspinbox.value())
 
     ####################
     # Slots from the document that require menu or statusbar changes
     ####################
 
+    def resetBlogServerMenu(self):
+        """Reset the blog server selection menu from the prefs
+        """
+
+        self.blogservermenu.clear()
+        i=0
+        for server in self.prefs.blogserverlist:
+            self.blogservermenu.addAction(server,
+                      lambda i=i: self.slotBlogServerMenuActivated(i))
+            i+=1
+
     def resetBlogandUserMenu(self):
         """Reset the blog and user selection menu for new server
         """
@@ -390,8 +484,7 @@ class desktopApp(QMainWindow):
         # Reset the blog selection menu
         self.blogselectionmenu.clear()
         i=0
-        for blog in self.prefs.servertoblogmapping[
-                                            self.prefs.currentblogserver]:
+        for blog in self.prefs.getBlogsforCurrentBlogServer():
             self.blogselectionmenu.addAction(blog,
                       lambda i=i: self.slotBlogSelectionMenuActivated(i))
             i+=1
@@ -399,8 +492,7 @@ class desktopApp(QMainWindow):
         # Then the user name selection
         self.usernamemenu.clear()
         i=0
-        for username in self.prefs.usernamemapping[
-                                       self.prefs.currentblogserver]:
+        for username in self.prefs.getUsernamesforCurrentBlogServer():
             self.usernamemenu.addAction(username, 
                       lambda i=i: self.slotUsernameMenuActivated(i))
             i+=1
@@ -413,10 +505,25 @@ class desktopApp(QMainWindow):
 
 
 def main(args):
-    LOG_FILENAME = '/logging.out'
-    logging.basicConfig(filename=LOG_FILENAME,level=logging.DEBUG)
-
     app=QApplication(args)
+
+    # Qt takes the options it knows from the arguments first
+    parser = optparse.OptionParser(usage = '%prog [--debug] [--trace FILE]')
+    parser.add_option('--debug', action = 'store_true', default = False,
+                      help = 'write debugging messages to ' + LOG_FILENAME)
+    parser.add_option('--trace', metavar = 'FILE',
+                      help = 'write the timing and status of each request '
+                             'to FILE, which is rotated as it grows')
+    options, arguments = parser.parse_args([str(arg) for arg in 
+                                            app.arguments()][1:])
+
+    if options.debug:
+        logging.basicConfig(filename = LOG_FILENAME, level = logging.DEBUG)
+    else:
+        logging.basicConfig(level = logging.WARNING)
+    if options.trace:
+        lablogtrace.enable(options.trace)
+
     docview = desktopApp()
     #app.setMainWidget(docview)
     docview.show()
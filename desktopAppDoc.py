@@ -25,122 +25,16 @@
 
 import sys
 import os.path
-import unittest
 import logging
+import sqlite3
 import lablogpost
+import lablogjournal
+import lablogcache
+import lablogretry
+import lablogscan
+import lablogwatch
 from PyQt4.QtCore import *
-
-class PrefsDoc(QObject):
-    """Class for containing preferences and blog information
-
-    This class handles the record of the currently selected
-    blog server, blog, and username. The document is created
-    when the application runs and persists for the the running
-    of the session. At the moment it doesn't persist between
-    sessions.
-    """
-
-    def __init__(self, *args):
-        QObject.__init__(self, *args)
-
-        self.initBlogServerList()
-        self.initCurrentBlogServer()
-        self.initServertoBlogMapping()
-        self.initCurrentUsername()
-        self.initCurrentBlog()
-        self.status=[]
-
-    def initBlogServerList(self):
-        self.blogserverlist = ['http://biolab.isis.rl.ac.uk']
-
-    def initCurrentBlogServer(self):
-        self.currentblogserver = 'http://biolab.isis.rl.ac.uk'
-
-    def initServertoBlogMapping(self):
-        self.servertoblogmapping = {
-          'http://biolab.isis.rl.ac.uk'   : 
-              ["ibrahim", "lab_materials", "testing_sandpit"]
-                          }
-
-    def setCurrentBlogServer(self, index):
-        #self.currentblogserver = self.blogserverlist[index]
-        try:
-            assert type(index) == int, 'List indices must be an integer'
-            assert index < len(self.blogserverlist
-                               ), 'List index out of range'
-            self.currentblogserver = \
-                       self.blogserverlist[index]
-            self.emit(SIGNAL('sigDocCurrentBlogServerSet'), 
-                            (self.currentblogserver,))
-
-            self.status.append('Blog server set to: ' + self.currentblogserver)
-            self.emit(SIGNAL('sigDocUpdateStatusBar'))
-
-            return True
-
-        except AssertionError, e:
-            self.emit(SIGNAL('sigDocumentError'), (e, ))
-            return False
-
-
-    def getCurrentBlogServer(self):
-        return self.currentblogserver
-
-    def getBlogsforCurrentBlogServer(self):        
-        return self.servertoblogmapping[self.currentblogserver]
-
-    def initCurrentBlog(self):
-        self.currentblog = self.getBlogsforCurrentBlogServer()[0]
-
-    def setCurrentBlog(self, index):
-        try:
-            assert type(index) == int, 'List indices must be an integer'
-            assert index < len(self.getBlogsforCurrentBlogServer()
-                               ), 'List index out of range'
-            self.currentblog = self.getBlogsforCurrentBlogServer()[index]
-            self.emit(SIGNAL('sigDocCurrentBlogSet'), (self.currentblog,))
-
-            self.status.append('Blog set to: ' + self.currentblog)
-            self.emit(SIGNAL('sigDocUpdateStatusBar'))
-
-            return True
-
-        except AssertionError, e:
-            self.emit(SIGNAL('sigDocumentError'), (e, ))
-            return False
-
-    def getCurrentBlog(self):
-        return self.currentblog
-
-    def getUsernamesforCurrentBlogServer(self):
-        self.usernamemapping = {
-            'http://biolab.isis.rl.ac.uk'   : ['ethem.myopenid.com']
-                          }
-        return self.usernamemapping[self.currentblogserver]
-
-    def initCurrentUsername(self):
-        self.currentusername = self.getUsernamesforCurrentBlogServer()[0]
-
-    def setCurrentUsername(self, index):
-        try:
-            assert type(index) == int, 'List indices must be an integer'
-            assert index < len(self.getUsernamesforCurrentBlogServer()
-                               ), 'List index out of range'
-            self.currentusername = \
-                self.getUsernamesforCurrentBlogServer()[index]
-            self.emit(SIGNAL('sigDocCurrentUsernameSet'), 
-                                        (self.currentusername,))
-            self.status.append('Username set to: ' + self.currentusername)
-            self.emit(SIGNAL('sigDocUpdateStatusBar'))
-
-            return True
-
-        except AssertionError, e:
-            self.emit(SIGNAL('sigDocumentError'), (e, ))
-            return False
-
-    def getCurrentUsername(self):
-        return self.currentusername
+from desktopAppPrefs import PrefsDoc, UploadWorker
 
 ####################################################################
 #                                                                  #
@@ -168,6 +62,12 @@ class AbstractPostDoc(QObject):
     The doUpload method is provided here as a place holder and should
     be overwritten for each specific document class. It is here simply
     to provide the template for the more specific upload methods.
+
+    Uploads are run in an UploadWorker thread started by startUpload
+    so that the GUI stays responsive. Progress is reported with the
+    sigDocUploadProgress signal and when the worker finishes the
+    finishUpload method, which subclasses overwrite, is called with
+    the result of the job in the GUI thread.
     """
 
     def __init__(self, prefs, *args):
@@ -180,12 +80,14 @@ class AbstractPostDoc(QObject):
         self.prefs = prefs
 
         self.status = []
+        self.worker = None
+        self.uploadcancelled = False
 
     def initPostTitle(self):
         self.posttitle = ''
 
     def setPostTitle(self, string):
-        logging.debug('Set Post Title: Received: ' + string)
+        logging.debug('Set Post Title: Received: %s', string)
         try:
             assert type(string) == QString, \
                                'Post title must be a string'
@@ -206,8 +108,8 @@ class AbstractPostDoc(QObject):
         # knows about the blog metadata
 
     def setPostSection(self, string):
-        logging.debug('desktopAppDoc: Set Post Section: Received: ' 
-                                                   + str(string))
+        logging.debug('desktopAppDoc: Set Post Section: Received: %s', 
+                      string)
         try: 
             assert type(string) == str, 'Section must be a string'
             self.postsection = str(string)
@@ -224,8 +126,8 @@ class AbstractPostDoc(QObject):
         self.postmetadata = {}
 
     def setPostMetadata(self, dictionary):
-        logging.debug('desktopAppDoc: Set Post Metadata: Received: ' 
-                                                + str(dictionary))
+        logging.debug('desktopAppDoc: Set Post Metadata: Received: %s', 
+                      dictionary)
         try: 
             assert type(dictionary) == dict, 'Metadata must be a dictionary'
             self.postmetadata = dictionary
@@ -242,11 +144,12 @@ class AbstractPostDoc(QObject):
         self.postcontent = ''
 
     def setPostContent(self, string):
-        logging.debug('Set Post Content: Received: ' + string)
         try:
             assert type(string) == QString, \
                                       'Post content must be a string'
             self.postcontent = string
+            logging.debug('Set Post Content: Received %d characters',
+                          string.length())
             self.emit(SIGNAL('sigDocPostContentChanged'), (self.postcontent,))
             return True
         except AssertionError, e:
@@ -281,12 +184,76 @@ class AbstractPostDoc(QObject):
         self.emit(SIGNAL('sigDocUpdateStatusBar'))
         self.emit(SIGNAL('sigDocUploading'))
 
-        # DO THE UPLOAD OF POSTS AND DATA HERE
+        # DO THE UPLOAD OF POSTS AND DATA HERE IN A JOB FUNCTION
+        # job = ...
+        # self.startUpload(job, NUMBER OF ITEMS)
 
-        self.emit(SIGNAL('sigDocFinishedUploading'))
+    def finishUpload(self, result):
+        """A template method for handling the result of the upload job
+
+        This function should be overwritten for any subclass. It is 
+        called in the GUI thread with the value returned by the upload
+        job just before the sigDocFinishedUploading signal is emitted.
+        """
 
         self.status.append() # INSERT AN APPROPRIATE STATUS MESSAGE
 
+    def newRetryPolicy(self):
+        """Return a retry policy for the requests of a single upload
+
+        Each upload gets its own retry budget and circuit breaker so 
+        that failures of one batch do not hold up the next.
+        """
+
+        return lablogretry.RetryPolicy(budget = lablogretry.RetryBudget(),
+                                       breaker = lablogretry.CircuitBreaker())
+
+    def startUpload(self, job, total, cancel = None):
+        """Run an upload job of total items in an UploadWorker thread"""
+
+        self.uploaded = 0
+        self.uploadtotal = total
+        self.uploadcancelled = False
+
+        self.worker = UploadWorker(job, cancel)
+        self.connect(self.worker, SIGNAL('sigWorkerProgress'),
+                                  self.notifyUploadProgress,
+                                  Qt.QueuedConnection)
+        self.connect(self.worker, SIGNAL('finished()'),
+                                  self.notifyUploadFinished,
+                                  Qt.QueuedConnection)
+        self.worker.start()
+
+    def notifyUploadProgress(self, succeeded):
+        """Count an uploaded item and signal the progress made"""
+
+        self.uploaded += 1
+        if succeeded:
+            self.emit(SIGNAL('sigDocPostUploadSuccess'))
+        self.emit(SIGNAL('sigDocUploadProgress'), 
+                        (self.uploaded, self.uploadtotal))
+
+    def notifyUploadFinished(self):
+        """Handle the end of the upload job in the GUI thread"""
+
+        self.uploadcancelled = self.worker.cancelled
+
+        if self.worker.error != None:
+            self.emit(SIGNAL('sigDocumentError'), (self.worker.error, ))
+        else:
+            self.finishUpload(self.worker.result)
+
+        self.emit(SIGNAL('sigDocUpdateStatusBar'))
+        self.emit(SIGNAL('sigDocFinishedUploading'))
+
+    def cancelUpload(self):
+        """Ask a running upload to stop after the items in progress"""
+
+        if self.worker != None and self.worker.isRunning():
+            self.worker.cancel()
+            self.status.append('Cancelling upload')
+            self.emit(SIGNAL('sigDocUpdateStatusBar'))
+
 
 class MultiPostDataUploadDoc(AbstractPostDoc):
     """Document for a multi-post directory data upload
@@ -302,6 +269,20 @@ class MultiPostDataUploadDoc(AbstractPostDoc):
     If the filenames are not used as post title the given post
     title simply has a number incremented at the end. Currently
     the post content is not modified.
+
+    The progress of the upload is recorded in a journal kept in the
+    data directory. If the resume flag is set files that the journal
+    shows were uploaded by an earlier, interrupted, upload are not
+    uploaded again. Files whose contents the data cache shows have
+    already been uploaded to the server are attached by their existing
+    data ID rather than sent again.
+
+    If the watch flag is set the upload does not stop once the files
+    in the directory are uploaded but carries on uploading new files
+    as they are written, each once it is complete, until it is 
+    cancelled. Files uploaded while watching are recorded in the
+    directory so that they are not uploaded again when watching is
+    started again later.
     """
 
     def __init__(self, prefs, *args):
@@ -309,6 +290,8 @@ class MultiPostDataUploadDoc(AbstractPostDoc):
 
         self.initUseFilename()
         self.initDataDirectory()
+        self.initResume()
+        self.initWatch()
 
 
     def initUseFilename(self):
@@ -328,14 +311,52 @@ class MultiPostDataUploadDoc(AbstractPostDoc):
     def getUseFilename(self):
         return self.usefilename
 
+    def initResume(self):
+        self.resume = False
+        self.journal = None
+        self.cache = None
+
+    def setResume(self, boolean):
+        try:
+            assert type(boolean) == bool, 'Resume must be True or False'
+            self.resume = boolean
+            self.emit(SIGNAL('sigDocResumeChanged'), (self.resume,))
+            return True
+
+        except AssertionError, e:
+            self.emit(SIGNAL('sigDocumentError'), (e, ))
+            return False
+
+    def getResume(self):
+        return self.resume
+
+    def initWatch(self):
+        self.watch = False
+        self.watcher = None
+
+    def setWatch(self, boolean):
+        try:
+            assert type(boolean) == bool, 'Watch must be True or False'
+            self.watch = boolean
+            self.emit(SIGNAL('sigDocWatchChanged'), (self.watch,))
+            return True
+
+        except AssertionError, e:
+            self.emit(SIGNAL('sigDocumentError'), (e, ))
+            return False
+
+    def getWatch(self):
+        return self.watch
+
     def initDataDirectory(self):
-        self.datadirectory = ''
+        self.datadirectory = self.prefs.getLastDirectory()
         
     def setDataDirectory(self, string):
         try:
             assert type(string) == QString, \
                                         'Data directory must be a string'
             self.datadirectory = str(string)
+            self.prefs.setLastDirectory(self.datadirectory)
             self.emit(SIGNAL('sigDocDataDirectoryChanged'), 
                             (self.datadirectory,))
             return True
@@ -364,31 +385,101 @@ class MultiPostDataUploadDoc(AbstractPostDoc):
             self.emit(SIGNAL('sigDocumentError'), (e, ))
             return False
 
-        self.status.append('Sending data posts to server')
+        # Files are uploaded as the directory is scanned, leaving out
+        # subdirectories and hidden files such as the journal
+        self.filelist = lablogscan.DirectoryScanner(self.datadirectory)
+        self.watcher = None
+        if self.watch:
+            try:
+                self.watcher = lablogwatch.DirectoryWatcher(
+                                                        self.datadirectory)
+            except EnvironmentError, e:
+                self.emit(SIGNAL('sigDocumentError'), (e, ))
+                return False
+
+        if self.watch:
+            self.status.append('Watching for new data files')
+        else:
+            self.status.append('Sending data posts to server')
         self.emit(SIGNAL('sigDocUpdateStatusBar'))
         self.emit(SIGNAL('sigDocUploading'))
-       
-        self.filelist = []
-        for file in os.listdir(self.datadirectory):
-            self.filelist.append(os.path.join(self.datadirectory, file))
 
+        # Keep the journal alongside the data if the directory allows
+        try:
+            self.journal = lablogjournal.UploadJournal.for_directory(
+                                                        self.datadirectory)
+        except sqlite3.Error, e:
+            logging.warning('Upload journal unavailable: ' + str(e))
+            self.journal = None
+
+        try:
+            self.cache = lablogcache.DataCache()
+        except sqlite3.Error, e:
+            logging.warning('Data cache unavailable: ' + str(e))
+            self.cache = None
 
         posts = lablogpost.MultiDataFileUpload(
                 **{'filelist'   : self.filelist,
                    'postnames'  : str(self.posttitle),
                    'posttext'   : str(self.postcontent),
-                   'metadata'   : self.getPostMetadata,
+                   'metadata'   : self.getPostMetadata(),
                    'server_url' : str(self.prefs.currentblogserver),
                    'blog_sname' : str(self.prefs.currentblog),
                    'username'   : str(self.prefs.currentusername),
                    'section'    : self.getPostSection(),
-                   'uid'        : lablogpost.DEFAULT_UID
+                   'uid'        : lablogpost.DEFAULT_UID,
+                   'journal'    : self.journal,
+                   'resume'     : self.resume,
+                   'cache'      : self.cache,
+                   'retry'      : self.newRetryPolicy()
                    })
 
-        # Record the set of successes and fails and send signals
-        self.data_fail, self.post_fail, self.length = posts.doUpload()
-        self.status.append('Uploaded ' + str(self.length) + ' data objects')
-        self.emit(SIGNAL('sigDocFinishedUploading'))
+        # Run the upload in the worker, reporting each file as it is done
+        watcher = self.watcher
+        def job(worker):
+            posts.progress = (lambda index, path, result:
+                                     worker.reportProgress(bool(result)))
+            if watcher:
+                return posts.doWatch(watcher)
+            return posts.doUpload()
+
+        # The total is not known until the scan or watch is over, so 
+        # the progress bar shows that the upload is busy
+        self.startUpload(job, 0, posts.cancel)
+
+    def finishUpload(self, result):
+        """Record the set of successes and fails"""
+
+        watching = self.watcher != None
+        if watching:
+            self.watcher.close()
+            self.watcher = None
+        if self.journal != None:
+            self.journal.close()
+            self.journal = None
+        if self.cache != None:
+            self.cache.close()
+            self.cache = None
+
+        # Watching only ever ends by being cancelled
+        if watching:
+            self.data_fail, self.post_fail, self.length = result
+            self.status.append('Stopped watching after ' + 
+                               str(self.length) + ' data objects')
+            return
+
+        # An error message is returned if there was nothing to upload
+        if type(result) == str:
+            self.emit(SIGNAL('sigDocumentError'), (result, ))
+            result = (0, 0, 0)
+
+        self.data_fail, self.post_fail, self.length = result
+        if self.uploadcancelled:
+            self.status.append('Upload cancelled after ' + 
+                               str(self.uploaded) + ' data objects')
+        else:
+            self.status.append('Uploaded ' + str(self.length) + 
+                               ' data objects')
 
 
 class MultiPostCreationDoc(AbstractPostDoc):
@@ -454,346 +545,60 @@ class MultiPostCreationDoc(AbstractPostDoc):
                            'blog_sname' : self.prefs.getCurrentBlog(),
                            'metadata'   : self.getPostMetadata()}
 
+        # Check and serialize everything but the titles once
+        try:
+            template = lablogpost.PostTemplate(**inputdictionary)
+
+        except (AssertionError, ValueError), e:
+            self.emit(SIGNAL('sigDocumentError'), (e, ))
+            return False
+
         # Send signals that upload is about to start
         self.status.append('Sending posts to server')
         self.emit(SIGNAL('sigDocUpdateStatusBar'))
         self.emit(SIGNAL('sigDocUploading'))
 
         # Set up some counters for the upload process
-        i=0
         self.post_fail = 0
-        self.post_failures = []
         self.post_success = 0
-        
-        # Do the uploads
-        while i < self.numposts:
-            i+=1
-            #Setup the post title
-            inputdictionary['title'] = str(self.getPostTitle()) + '-' + str(i)
-            #Create the post and upload it
-            post = lablogpost.LaBLogPost(**inputdictionary)
-            post.doPost(url = self.prefs.getCurrentBlogServer(),
-                        uid = lablogpost.DEFAULT_UID)
-
-            if post.posted:
-                self.post_success += 1
-                self.emit(SIGNAL('sigDocPostUploadSuccess'))
-
-            elif post.posted == False:
-                self.post_fail += 1
-                self.post_failures.append(i)
-
-            else:
-                # raise ValueError('post.posted should be type bool')
-                pass
-
-        #TODO retry the posting for those that have failed?
-
-        # Signal that upload is complete and update status
-        self.status.append('Uploaded ' + str(i) + 'posts with ' +
-                           str(self.post_fail) + ' failures.')
-        self.emit(SIGNAL('sigDocFinishedUploading'))            
-       
-
-###############################################################
-#
-# UnitTests
-#
-################################################################
-class AbstractTestCase(unittest.TestCase):
-    """An abstract test case that contains all the setup variables"""
-
-    def setUp(self):
-        self.doc = MultiPostDoc()
-        self.connectionBox = ConnectionBox()
-        self.types = [int, str, bool]
-        self.testint = 1
-        self.teststring = 'a test string'
-        self.testbool = True
-        self.testparams = [self.testint, self.teststring, self.testbool]
-        self.doc = MultiPostDoc()
-
-        self.signals = [{'signal'     : 'sigDocCurrentBlogServerSet',
-                         'function'   : self.doc.setCurrentBlogServer,
-                         'getmethod'  : self.doc.getCurrentBlogServer,
-                         'funcparams' : 1,
-                         'testparam'  : [self.testint],
-                         'returnexp'  : 'http://blogs.chem.soton.ac.uk',
-                         'funcptype'  : int,
-                         'returnspar' : 1,
-                         'returntype' : str},
-
-                        {'signal'     : 'sigDocCurrentBlogSet',
-                         'function'   : self.doc.setCurrentBlog,
-                         'getmethod'  : self.doc.getCurrentBlog,
-                         'funcparams' : 1,
-                         'testparam'  : [0],
-                         'returnexp'  : 'camerons_labblog',
-                         'funcptype'  : int,
-                         'returnspar' : 1,
-                         'returntype' : str},
-
-                        {'signal'     : 'sigDocCurrentUsernameSet',
-                         'function'   : self.doc.setCurrentUsername,
-                         'getmethod'  : self.doc.getCurrentUsername,
-                         'funcparams' : 1,
-                         'testparam'  : [0],
-                         'returnexp'  : 'cameron.neylon.myopenid.com',
-                         'funcptype'  : int,
-                         'returnspar' : 1,
-                         'returntype' : str},
-
-                        {'signal'     : 'sigDocPostTitleSet',
-                         'function'   : self.doc.setPostTitle,
-                         'getmethod'  : self.doc.getPostTitle,
-                         'funcparams' : 1,
-                         'testparam'  : ['test_title'],
-                         'funcptype'  : str,
-                         'returnexp'  : self.teststring,
-                         'returnspar' : 1,
-                         'returntype' : str},
-
-                        {'signal'     : 'sigDocUseFilenameChanged',
-                         'function'   : self.doc.setUseFilename,
-                         'getmethod'  : self.doc.getUseFilename,
-                         'funcparams' : 1,
-                         'testparam'  : [True],
-                         'returnexp'  : self.testbool,
-                         'funcptype'  : bool,
-                         'returnspar' : 1,
-                         'returntype' : bool},
-
-                        {'signal'     : 'sigDocPostContentChanged',
-                         'function'   : self.doc.setPostContent,
-                         'getmethod'  : self.doc.getPostContent,
-                         'funcparams' : 1,
-                         'testparam'  : ['some text content'],
-                         'returnexp'  : self.teststring,
-                         'funcptype'  : str,
-                         'returnspar' : 1,
-                         'returntype' : str},
-
-                        {'signal'     : 'sigDocDataDirectoryChanged',
-                         'function'   : self.doc.setDataDirectory,
-                         'getmethod'  : self.doc.getDataDirectory,
-                         'funcparams' : 1,
-                         'testparam'  : ['some string'],
-                         'returnexp'  : self.teststring,
-                         'funcptype'  : str,
-                         'returnspar' : 1,
-                         'returntype' : str}
-                        ] 
-
-    def tearDown(self):
-        self.doc = None
-        self.connectionBox = None
-
-class InitTestCase(unittest.TestCase):
-    """Check that documents initialize properly
-    """
-
-    def checkInitialisation(self):
-        """Check that documents initialize properly as expected
-        """
-
-        self.doc = MultiPostDoc()
-
-        self.assertEqual(self.doc.blogserverlist, [
-                               'http://biolab.isis.rl.ac.uk',
-                               'http://blogs.chem.soton.ac.uk',
-                               'http://blog_dev.sidious.chem.soton.ac.uk'])
-        self.assertEqual(self.doc.currentblogserver, 
-                               'http://biolab.isis.rl.ac.uk')
-        self.assertEqual(self.doc.currentblog, 'testing_sandpit')
-        self.assertEqual(self.doc.currentusername, 'cameronneylon.net')
-        self.assertEqual(self.doc.posttitle, '')
-        self.assertEqual(self.doc.usefilename, False)
-        self.assertEqual(self.doc.postcontent, '')
-
-class ErrorCatchingTestCase(AbstractTestCase):
-    """Check that all set functions fire errors as expected
-    """
-
-
-    def checkErrors(self):
-        """Test case that tries all parameters against all functions
-
-        The test case loops over each of the functions registered and
-        then within each function calls the set Function with the
-        registered test parameters of each type. For the incorrect
-        parameter types it checks that the error catching method is
-        triggered, that the correct error message is provided, and that
-        the sigDocumentError is emitted. For the correct type the
-        set value is compared to what it was meant to be set to.
-        """
-
-        self.connectionBox.connect(self.doc,
-                                   SIGNAL('sigDocumentError'),
-                                   self.connectionBox.slotSlot)
-                                         
-        # Loop over all the functions defined
-        i = 0
-        while i < len(self.signals):
-            j = 0
-
-            # Loop over all registered types to be passed to functions
-            while j < len(self.types):
-
-                # If the type doesn't match required type should return False
-                # provide the correct error message and emit the 
-                # sigDocumentError signal
-                if self.types[j] != self.signals[i]['funcptype']:
-                    test = self.signals[i]['function'](self.testparams[j])
-                    self.assertEqual(test, False)
-                    self.connectionBox.assertSignalArrived('sigDocumentError')
-
-                # If it does match, should work and return correct param
-                elif self.types[j] == self.signals[i]['funcptype']:
-                    self.signals[i]['function'](self.testparams[j])
-                    self.assertEqual(self.signals[i]['getmethod'](),
-                                     self.signals[i]['returnexp'])
-
-                j = j + 1
-
-            # Need to initialise everything before next signal test
-            self.doc.__init__()
-
-            i = i + 1
-
-
-                
-class SignalsTestCase(AbstractTestCase):
-    """Test the signals for the document
-    """
-
-    def tearDown(self):
-        self.doc = None
-        self.connectionBox = None
-
-    def runSignalArrives(self, index):
-        self.connectionBox.connect(self.doc, 
-                                   SIGNAL(self.signals[index]['signal']), 
-                                   self.connectionBox.slotSlot)
-
-        args = self.signals[index]['testparam']
-        self.signals[index]['function'](*args)
-        self.connectionBox.assertSignalArrived(self.signals[index]['signal'])
-        self.connectionBox.disconnect(self.doc, 
-                                   SIGNAL(self.signals[index]['signal']), 
-                                   self.connectionBox.slotSlot)
-
-    def checkSignalArrives(self):
-        """Check that the correct signals arrive as expected
-        """
-
-        index = 0
-        while index < len(self.signals):
-            self.runSignalArrives(index)
-            index = index + 1
-
-    def runSignalDoesNotArrive(self, index):
-        """Check whether the sigDocModifiedXXX signal does not arrive"""
-
-        self.connectionBox.connect(self.doc, 
-                                   SIGNAL(self.signals[index]['signal']+'XXX'),
-                                   self.connectionBox.slotSlot)
-        args = self.signals[index]['testparam']
-        self.signals[index]['function'](*args)
-        
-
-        self.assertRaises(AssertionError,
-                          self.connectionBox.assertSignalArrived,
-                          signal = self.signals[index-1]['signal']+'XXX')
-
-        # Disconnect ConnectionBox before running next test
-        self.connectionBox.disconnect(self.doc, 
-                                   SIGNAL(self.signals[index]['signal']+'XXX'), 
-                                   self.connectionBox.slotSlot)
-        self.doc.__init__()
-
-
-    def checkSignalDoesNotArrive(self):
-        """Check whether the sigDocModifiedXXX signal does not arrive"""
-
-        index = 0
-        while index < len(self.signals):
-            self.runSignalDoesNotArrive(index)
-            index = index + 1
-
-    def runArgumentToSignal(self, index):
-        """Check whether the sigDocModified signal has the right
-           number of arguments
-        """
-        self.connectionBox.connect(self.doc, 
-                                   SIGNAL(self.signals[index]['signal']),
-                                   self.connectionBox.slotSlot)
-        args = self.signals[index]['testparam']
-        self.signals[index]['function'](*args)
-        self.connectionBox.assertNumberOfArguments(
-                                   self.signals[index]['returnspar'])
-
-        # Disconnect ConnectionBox before running next test
-        self.connectionBox.disconnect(self.doc, 
-                                   SIGNAL(self.signals[index]['signal']), 
-                                   self.connectionBox.slotSlot)
-        self.doc.__init__()
-
-    def checkArgumentToSignal(self):
-        """Check whether the sigDocModified signal has the right
-           number of arguments
-        """
-        index = 0
-        while index < len(self.signals):
-            self.runArgumentToSignal(index)
-            index = index + 1
-
-    def runArgumentTypes(self, index):
-        """Check whether the sigDocModified signal has the right 
-           type of arguments.
-        """
-        self.connectionBox.connect(self.doc,                                   
-                                   SIGNAL(self.signals[index]['signal']),
-                                   self.connectionBox.slotSlot)
-        args = self.signals[index]['testparam']
-        self.signals[index]['function'](*args)
-        self.connectionBox.assertArgumentTypes(
-                                   self.signals[index]['returntype'])
-
-        self.connectionBox.disconnect(self.doc, 
-                                   SIGNAL(self.signals[index]['signal']), 
-                                   self.connectionBox.slotSlot)
-        self.doc.__init__()
-
-
-    def checkArgumentTypes(self):
-        """Check whether the sigDocModified signal has the right 
-           type of arguments.
-        """
-
-        index = 0
-        while index < len(self.signals):
-            self.runArgumentTypes(index)
-            index+=1
-
-def suite():
-    signalsTestSuite=unittest.makeSuite(SignalsTestCase, 'check')
-    initTestSuite = unittest.makeSuite(InitTestCase, 'check')
-    errorTestSuite = unittest.makeSuite(ErrorCatchingTestCase, 'check')
-    testSuite = unittest.TestSuite([signalsTestSuite, 
-                                    initTestSuite,
-                                    errorTestSuite])
-    return testSuite
-
-def main():
-    runner = unittest.TextTestRunner(verbosity=2)
-    runner.run(suite())
-    
-        
-if __name__ == '__main__':
-    from TestingConnectionBox import *
-    main()
 
+        # Take copies of the settings so the GUI can't change them
+        # while the worker is running
+        title = str(self.getPostTitle())
+        numposts = self.numposts
+        url = self.prefs.getCurrentBlogServer()
+        retry = self.newRetryPolicy()
         
-        
-        
-        
+        def job(worker):
+            # Do the uploads, creating the posts as they are needed
+            titles = (title + '-' + str(i) for i in xrange(1, numposts + 1))
+            posts = lablogpost.create_posts(titles, template, url = url,
+                                            retry = retry)
+            i = 0
+            for index, posttitle, post_id, error in posts:
+                i += 1
+                if post_id:
+                    self.post_success += 1
+                else:
+                    self.post_fail += 1
+
+                worker.reportProgress(bool(post_id))
+                if worker.cancelled:
+                    break
+
+            posts.close()
+            return i
+
+        self.startUpload(job, numposts)
+
+    def finishUpload(self, i):
+        """Update status once the posts are uploaded"""
+
+        if self.uploadcancelled:
+            self.status.append('Upload cancelled after ' + str(i) + 
+                               ' posts with ' + str(self.post_fail) + 
+                               ' failures.')
+        else:
+            self.status.append('Uploaded ' + str(i) + ' posts with ' +
+                               str(self.post_fail) + ' failures.')
+       
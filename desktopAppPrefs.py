@@ -0,0 +1,345 @@
+# LaBLog Poster: A desktop App for interacting with the University of 
+# Southampton LaBLog system as an electronic laboratory notebook
+#
+# Copyright (C) 2010 Cameron Neylon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Dependencies: The application code requires PyQt and Qt to be installed. 
+# The desktopAppPrefs module holds the documents needed as soon as the
+# application starts and utilises the lablogprefs and lablogcatalogue 
+# modules available with this source distribution. The lablogpost 
+# module is only imported once the catalogue is refreshed so that the
+# application window appears quickly.
+
+import logging
+import lablogprefs
+import lablogcatalogue
+from PyQt4.QtCore import *
+
+class PrefsDoc(QObject):
+    """Class for containing preferences and blog information
+
+    This class handles the record of the currently selected
+    blog server, blog, and username. The document is created
+    when the application runs and persists for the the running
+    of the session. The selections, along with the last data 
+    directory and the metadata presets, are kept between sessions in
+    the preferences store, a lablogprefs.Preferences.
+
+    The servers offered are those in the preferences followed by any
+    others in the server catalogue cached on disk, so that nothing 
+    waits for the network at startup. The blogs and usernames offered
+    are those in the catalogue followed by any others chosen for the
+    server before, which are remembered in case the catalogue no 
+    longer lists them. The metadata vocabularies come from the 
+    catalogue. refreshCatalogue() brings stale catalogues up to date
+    in the background and emits sigDocCatalogueChanged if they changed.
+    sigDocMetadataPresetsChanged is emitted when a preset is saved or
+    deleted.
+    """
+
+    def __init__(self, *args):
+        QObject.__init__(self, *args)
+
+        self.initPreferences()
+        self.initCatalogue()
+        self.initBlogServerList()
+        self.initCurrentBlogServer()
+        self.initCurrentUsername()
+        self.initCurrentBlog()
+        self.status=[]
+
+    def initCatalogue(self):
+        self.catalogue = lablogcatalogue.ServerCatalogue()
+        self.catalogueworker = None
+
+    def initPreferences(self):
+        self.preferences = lablogprefs.Preferences()
+
+    def mergeChoices(self, first, others):
+        """Return the items of first followed by the others not in it"""
+
+        choices = list(first)
+        for item in others:
+            if item not in choices:
+                choices.append(item)
+        return choices
+
+    def initBlogServerList(self):
+        self.blogserverlist = self.mergeChoices(
+                                    self.preferences.get('servers'),
+                                    self.catalogue.servers())
+
+    def initCurrentBlogServer(self):
+        self.currentblogserver = self.preferences.get('server')
+        if self.currentblogserver not in self.blogserverlist:
+            self.currentblogserver = self.blogserverlist[0]
+
+    def setCurrentBlogServer(self, index):
+        #self.currentblogserver = self.blogserverlist[index]
+        try:
+            assert type(index) == int, 'List indices must be an integer'
+            assert index < len(self.blogserverlist
+                               ), 'List index out of range'
+            self.currentblogserver = \
+                       self.blogserverlist[index]
+            self.preferences.set('server', self.currentblogserver)
+
+            # Keep to the blogs and usernames of the new server
+            if self.currentblog not in self.getBlogsforCurrentBlogServer():
+                self.initCurrentBlog()
+            if (self.currentusername not in 
+                self.getUsernamesforCurrentBlogServer()):
+                self.initCurrentUsername()
+
+            self.emit(SIGNAL('sigDocCurrentBlogServerSet'), 
+                            (self.currentblogserver,))
+
+            self.status.append('Blog server set to: ' + self.currentblogserver)
+            self.emit(SIGNAL('sigDocUpdateStatusBar'))
+
+            return True
+
+        except AssertionError, e:
+            self.emit(SIGNAL('sigDocumentError'), (e, ))
+            return False
+
+
+    def getCurrentBlogServer(self):
+        return self.currentblogserver
+
+    def rememberChoice(self, name, item):
+        """Record a blog or username chosen for the current server
+
+        Name is the preference, 'blogs' or 'usernames', it is kept in.
+        """
+
+        choices = dict(self.preferences.get(name))
+        chosen = choices.get(self.currentblogserver, [])
+        if item and item not in chosen:
+            choices[self.currentblogserver] = chosen + [item]
+            self.preferences.set(name, choices)
+
+    def getBlogsforCurrentBlogServer(self):        
+        return self.mergeChoices(
+                self.catalogue.blogs(self.currentblogserver),
+                self.preferences.get('blogs').get(self.currentblogserver, []))
+
+    def initCurrentBlog(self):
+        blogs = self.getBlogsforCurrentBlogServer()
+        self.currentblog = self.preferences.get('blog')
+        if self.currentblog not in blogs:
+            self.currentblog = ''
+            if blogs:
+                self.currentblog = blogs[0]
+
+    def setCurrentBlog(self, index):
+        try:
+            assert type(index) == int, 'List indices must be an integer'
+            assert index < len(self.getBlogsforCurrentBlogServer()
+                               ), 'List index out of range'
+            self.currentblog = self.getBlogsforCurrentBlogServer()[index]
+            self.preferences.set('blog', self.currentblog)
+            self.rememberChoice('blogs', self.currentblog)
+            self.emit(SIGNAL('sigDocCurrentBlogSet'), (self.currentblog,))
+
+            self.status.append('Blog set to: ' + self.currentblog)
+            self.emit(SIGNAL('sigDocUpdateStatusBar'))
+
+            return True
+
+        except AssertionError, e:
+            self.emit(SIGNAL('sigDocumentError'), (e, ))
+            return False
+
+    def getCurrentBlog(self):
+        return self.currentblog
+
+    def getUsernamesforCurrentBlogServer(self):
+        return self.mergeChoices(
+            self.catalogue.usernames(self.currentblogserver),
+            self.preferences.get('usernames').get(self.currentblogserver, []))
+
+    def initCurrentUsername(self):
+        usernames = self.getUsernamesforCurrentBlogServer()
+        self.currentusername = self.preferences.get('username')
+        if self.currentusername not in usernames:
+            self.currentusername = ''
+            if usernames:
+                self.currentusername = usernames[0]
+
+    def setCurrentUsername(self, index):
+        try:
+            assert type(index) == int, 'List indices must be an integer'
+            assert index < len(self.getUsernamesforCurrentBlogServer()
+                               ), 'List index out of range'
+            self.currentusername = \
+                self.getUsernamesforCurrentBlogServer()[index]
+            self.preferences.set('username', self.currentusername)
+            self.rememberChoice('usernames', self.currentusername)
+            self.emit(SIGNAL('sigDocCurrentUsernameSet'), 
+                                        (self.currentusername,))
+            self.status.append('Username set to: ' + self.currentusername)
+            self.emit(SIGNAL('sigDocUpdateStatusBar'))
+
+            return True
+
+        except AssertionError, e:
+            self.emit(SIGNAL('sigDocumentError'), (e, ))
+            return False
+
+    def getCurrentUsername(self):
+        return self.currentusername
+
+    def getLastDirectory(self):
+        return self.preferences.get('directory')
+
+    def setLastDirectory(self, directory):
+        self.preferences.set('directory', directory)
+
+    def getMetadataPresets(self):
+        """Return the names of the saved section and metadata presets"""
+
+        return self.preferences.presetNames()
+
+    def getMetadataPreset(self, name):
+        """Return the (section, metadata) saved as preset name"""
+
+        return self.preferences.getPreset(name)
+
+    def saveMetadataPreset(self, name, section, metadata):
+        try:
+            assert type(name) == str and name != '', \
+                                        'Preset name must be a string'
+            self.preferences.savePreset(name, section, metadata)
+            self.emit(SIGNAL('sigDocMetadataPresetsChanged'), (name,))
+            return True
+
+        except AssertionError, e:
+            self.emit(SIGNAL('sigDocumentError'), (e, ))
+            return False
+
+    def deleteMetadataPreset(self, name):
+        self.preferences.deletePreset(name)
+        self.emit(SIGNAL('sigDocMetadataPresetsChanged'), (name,))
+
+    def getMetadataKeys(self):
+        """Return the metadata keys offered for the current server"""
+
+        return [key for key, values in 
+                self.catalogue.metadata(self.currentblogserver)
+                if key != 'Section']
+
+    def getMetadataVocabulary(self):
+        """Return a dictionary of the values offered for each key
+
+        The values for 'Section' are the sections of the current blog 
+        if any are known. Keys without any values are left out.
+        """
+
+        vocabulary = {}
+        for key, values in self.catalogue.metadata(self.currentblogserver):
+            if values:
+                vocabulary[key] = values
+        sections = self.catalogue.sections(self.currentblogserver,
+                                           self.currentblog)
+        if sections:
+            vocabulary['Section'] = sections
+        return vocabulary
+
+    def refreshCatalogue(self):
+        """Revalidate the stale server catalogues in the background"""
+
+        if self.catalogueworker != None and self.catalogueworker.isRunning():
+            return
+
+        catalogue = self.catalogue
+        def job(worker):
+            import lablogpost
+            changed = False
+            for server in catalogue.servers():
+                try:
+                    changed = catalogue.refresh(server) or changed
+                except lablogpost.REQUEST_ERRORS + (ValueError,), e:
+                    logging.warning('Catalogue of ' + server + 
+                                    ' not refreshed: ' + str(e))
+            return changed
+
+        self.catalogueworker = UploadWorker(job)
+        self.connect(self.catalogueworker, SIGNAL('finished()'),
+                                  self.notifyCatalogueRefreshed,
+                                  Qt.QueuedConnection)
+        self.catalogueworker.start()
+
+    def notifyCatalogueRefreshed(self):
+        """Pick up changes to the catalogue in the GUI thread"""
+
+        if self.catalogueworker.error != None:
+            logging.warning('Catalogue refresh failed: ' + 
+                            str(self.catalogueworker.error))
+        if not self.catalogueworker.result:
+            return
+
+        # Keep the current choices if they are still offered
+        self.initBlogServerList()
+        if self.currentblog not in self.getBlogsforCurrentBlogServer():
+            self.initCurrentBlog()
+        if (self.currentusername not in 
+            self.getUsernamesforCurrentBlogServer()):
+            self.initCurrentUsername()
+        self.emit(SIGNAL('sigDocCatalogueChanged'))
+
+class UploadWorker(QThread):
+    """Thread for running an upload job off the GUI thread
+
+    The job is a callable that takes the worker as its only argument
+    and carries out the network requests of an upload, calling 
+    reportProgress once for each item that it finishes and stopping
+    early if worker.cancelled becomes True. Its return value is kept
+    in self.result, or any exception it raises in self.error.
+
+    The sigWorkerProgress signal is emitted from the worker thread so
+    documents living in the GUI thread should connect to it, and to
+    finished(), with a queued connection. The cancel callable, if
+    given, is called by cancel() to pass the request on to the job.
+    """
+
+    def __init__(self, job, cancel = None, *args):
+        QThread.__init__(self, *args)
+
+        self.job = job
+        self.cancelcallback = cancel
+        self.cancelled = False
+        self.result = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.result = self.job(self)
+        except Exception, e:
+            logging.exception('Upload job failed')
+            self.error = e
+
+    def reportProgress(self, succeeded):
+        """Report that an item has been uploaded or has failed"""
+
+        self.emit(SIGNAL('sigWorkerProgress'), succeeded)
+
+    def cancel(self):
+        """Ask the job to stop after the items in progress"""
+
+        self.cancelled = True
+        if self.cancelcallback:
+            self.cancelcallback()
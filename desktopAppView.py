@@ -30,6 +30,13 @@ import widget_metadata
 from PyQt4.QtGui import *
 from PyQt4.QtCore import *
 
+# Posts are created as they are uploaded so large numbers are allowed
+MAX_NUMPOSTS = 1000000
+
+# Milliseconds after the last change to the post text before it is
+# passed to the document
+POST_TEXT_DELAY = 400
+
 class AbstractPostView(QWidget):
     """Abstract base class for UI widgets for each type of action.
 
@@ -64,18 +71,12 @@ class AbstractPostView(QWidget):
         self.posttitle = QLabel('Post title')
         self.titleedit = QLineEdit()
 
-        # Metadata widget - setup with hardcoded metadata options
-        # for Ibrahim
+        # Metadata widget - setup with the metadata options of the
+        # server catalogue
         self.metadatawidget = widget_metadata.MetadataWidget(
-             keymenuitems = ['Material_Type', 'Procedure', 'Data_Type', 'Note'],
-             keytovaluesmapping = 
-                 {'Section'       : ['Material', 'Procedure', 'Data', 'Note'], 
-                  'Material_Type' : ['Solution', 'Powder', 'Solid'],
-                  'Procedure'     : ['Labelling', 'Gel_electrophoresis',
-                                      'Cell_culture', 'Protein_purification'],
-                  'Data_Type'     : ['Gel_image', 'FPLC trace', 
-                                     'Fluorescence_data', 'Other_Excel_file'],
-                  'Project'       : ['Sortase_optimisation']})
+             keymenuitems = self.doc.prefs.getMetadataKeys(),
+             keytovaluesmapping = self.doc.prefs.getMetadataVocabulary())
+        self.metadatawidget.setPresets(self.doc.prefs.getMetadataPresets())
 
         # Text box for post text content. Only accepts plain text
         # TODO metadata setting
@@ -83,9 +84,23 @@ class AbstractPostView(QWidget):
         self.posttext = QTextEdit()
         self.posttext.setAcceptRichText(False)
 
+        # The post text is passed to the document once typing pauses
+        # rather than on every keystroke, see flushPostText
+        self.posttexttimer = QTimer(self)
+        self.posttexttimer.setSingleShot(True)
+        self.posttexttimer.setInterval(POST_TEXT_DELAY)
+        self.sendingposttext = False
+
         # The upload to blog button
         self.uploadButton = QPushButton('Upload!', self)
 
+        # Progress bar and cancel button for uploads in progress
+        self.progressbar = QProgressBar()
+        self.progressbar.setValue(0)
+        self.cancelButton = QPushButton('Cancel', self)
+        self.cancelButton.setEnabled(False)
+        self.blockedinputs = []
+
         ####################
         #
         # Connections to shared actions to be notified to the document
@@ -110,15 +125,32 @@ class AbstractPostView(QWidget):
         self.connect(self.metadatawidget, SIGNAL('metadataWidgetActivated'),
                                           self.emitViewMetadataChanged)
 
+        # Actions on choosing, saving or deleting a metadata preset
+        self.connect(self.metadatawidget, 
+                          SIGNAL('metadataWidgetPresetChosen'),
+                                     self.applyMetadataPreset)
+        self.connect(self.metadatawidget, 
+                          SIGNAL('metadataWidgetPresetSaved'),
+                                     self.saveMetadataPreset)
+        self.connect(self.metadatawidget, 
+                          SIGNAL('metadataWidgetPresetDeleted'),
+                                     self.deleteMetadataPreset)
+
         # Action on modifying the Post Content text edit
         self.connect(self.posttext, SIGNAL('textChanged()'),
-                                    self.emitViewPostTextModified)
+                                    self.posttexttimer.start)
+        self.connect(self.posttexttimer, SIGNAL('timeout()'),
+                                    self.flushPostText)
 
         # Action on pressing Upload button
         # TODO generalise the doUpload signal
         self.connect(self.uploadButton, SIGNAL('clicked()'),
                                         self.emitViewDoUpload)
 
+        # Action on pressing Cancel button
+        self.connect(self.cancelButton, SIGNAL('clicked()'),
+                                        self.emitViewCancelUpload)
+
         ####################
         #
         # Connections to signals originating in the App Document
@@ -145,11 +177,25 @@ class AbstractPostView(QWidget):
         self.connect(self.doc, SIGNAL('sigDocUploading'),
                                self.blockallinputs)
 
+        # Progress of an upload
+        self.connect(self.doc, SIGNAL('sigDocUploadProgress'),
+                               self.setUploadProgress)
+
         # Multipost data upload complete
         # TODO generalise the upload complete signal
+        self.connect(self.doc, SIGNAL('sigDocFinishedUploading'),
+                               self.unblockallinputs)
         self.connect(self.doc, SIGNAL('sigDocFinishedUploading'),
                                self.notifyUserUploadComplete)
 
+        # Metadata options changed with the catalogue or blog
+        self.connect(self.doc.prefs, SIGNAL('sigDocCatalogueChanged'),
+                               self.resetMetadataVocabulary)
+        self.connect(self.doc.prefs, SIGNAL('sigDocCurrentBlogSet'),
+                               self.resetMetadataVocabulary)
+        self.connect(self.doc.prefs, SIGNAL('sigDocMetadataPresetsChanged'),
+                               self.resetMetadataPresets)
+
 
     ####################
     #
@@ -186,14 +232,18 @@ class AbstractPostView(QWidget):
         First check whether is the same as current text so as to
         prevent race condition. If it is different (e.g. if set
         via script or macro, then change linedit to match. This
-        method is connected to sigDocPostContentChanged
+        method is connected to sigDocPostContentChanged. Content the
+        view has just sent is not compared, as the text may be large.
         """
 
-        if self.doc.postcontent == self.posttext.toPlainText():
+        if self.sendingposttext:
+            return
+        elif self.doc.postcontent == self.posttext.toPlainText():
             return
         else:
-            self.posttext.clear()
-            self.posttext.insertPlainText(self.postcontent)
+            self.posttext.setPlainText(self.doc.postcontent)
+            self.posttexttimer.stop()
+            self.posttext.document().setModified(False)
  
     def notifyUserDocumentError(self, e):
         """Method triggered by Document error catching routines
@@ -211,10 +261,71 @@ class AbstractPostView(QWidget):
     def blockallinputs(self):
         """Method called when all inputs need to be deactivated
 
-        Currently called only when a data upload is in progress.
+        Currently called only when a data upload is in progress. The
+        cancel button and progress bar are left active so that the
+        upload can be followed and stopped. The widgets disabled are
+        recorded so that unblockallinputs can enable them again.
         """
 
-        self.setDisabled(True)
+        self.blockedinputs = []
+        for widget in self.findChildren(QWidget):
+            if (widget.isEnabled() and widget is not self.cancelButton 
+                                   and widget is not self.progressbar):
+                widget.setEnabled(False)
+                self.blockedinputs.append(widget)
+
+        self.progressbar.setValue(0)
+        self.cancelButton.setEnabled(True)
+
+    def unblockallinputs(self):
+        """Method called when an upload is finished or cancelled
+        """
+
+        for widget in self.blockedinputs:
+            widget.setEnabled(True)
+        self.blockedinputs = []
+        self.cancelButton.setEnabled(False)
+
+    def resetMetadataVocabulary(self):
+        """Offer the metadata options of the current blog"""
+
+        self.metadatawidget.setVocabulary(self.doc.prefs.getMetadataKeys(),
+                                  self.doc.prefs.getMetadataVocabulary())
+
+    def resetMetadataPresets(self, signal):
+        """Offer the metadata presets saved in the preferences"""
+
+        self.metadatawidget.setPresets(self.doc.prefs.getMetadataPresets())
+
+    def applyMetadataPreset(self, signal):
+        """Set the section and metadata to those of a chosen preset"""
+
+        name = signal[0]
+        section, metadata = self.doc.prefs.getMetadataPreset(name)
+        self.metadatawidget.setPreset(section, metadata)
+
+    def saveMetadataPreset(self, signal):
+        """Save the section and metadata chosen as a named preset"""
+
+        name = signal[0]
+        self.doc.prefs.saveMetadataPreset(name,
+                                          self.metadatawidget.getSection(),
+                                          self.metadatawidget.getMetadata())
+
+    def deleteMetadataPreset(self, signal):
+        name = signal[0]
+        self.doc.prefs.deleteMetadataPreset(name)
+
+    def setUploadProgress(self, signal):
+        """Method triggered when doc signals upload progress
+
+        The signal carries the number of items uploaded so far and
+        the total number of items in the upload.
+        """
+
+        uploaded, total = signal
+        self.progressbar.setMaximum(total)
+        self.progressbar.setValue(uploaded)
 
     def notifyUserUploadComplete(self):
         """Dialog box triggered when data upload is complete
@@ -225,7 +336,10 @@ class AbstractPostView(QWidget):
         called.
         """
         
-        message = ("Upload succeeded") 
+        if self.doc.uploadcancelled:
+            message = ("Upload cancelled")
+        else:
+            message = ("Upload succeeded") 
         notify = QMessageBox.warning(self,
                              'QtMessageBox.warning()', message)
 
@@ -257,18 +371,42 @@ class AbstractPostView(QWidget):
         self.emit(SIGNAL('sigViewMetadataChanged'))
         logging.debug('Emitted sigViewMetadataChanged')
 
+    def flushPostText(self):
+        """Send any changes to the post text on to the document
+
+        Called when typing pauses and before an upload. However many
+        keystrokes there have been the text is only sent once, and not
+        at all if it has not been modified since it was last sent.
+        """
+
+        self.posttexttimer.stop()
+        if not self.posttext.document().isModified():
+            return
+        self.posttext.document().setModified(False)
+        self.emitViewPostTextModified()
+
     def emitViewPostTextModified(self):
         """Notify the document when post content box changed
         """
-        self.emit(SIGNAL('sigViewPostTextModified'))
+        self.sendingposttext = True
+        try:
+            self.emit(SIGNAL('sigViewPostTextModified'))
+        finally:
+            self.sendingposttext = False
 
 
     # TODO generalise this for all Upload actions
     def emitViewDoUpload(self):
         """Notify the document when the upload button pressed
         """
+        self.flushPostText()
         self.emit(SIGNAL('sigViewDoUpload'))
 
+    def emitViewCancelUpload(self):
+        """Notify the document when the cancel button pressed
+        """
+        self.emit(SIGNAL('sigViewCancelUpload'))
+
 class MultiPostDataUploadView(AbstractPostView):
     """View for a multi-post directory data upload
 
@@ -287,9 +425,15 @@ class MultiPostDataUploadView(AbstractPostView):
         # Create checkbox for 'use filenames' option
         self.usefilenamecheck = QCheckBox('Use filenames?', self)
 
+        # Create checkbox for resuming an interrupted upload
+        self.resumecheck = QCheckBox('Resume previous upload?', self)
+
+        # Create checkbox for carrying on uploading new files
+        self.watchcheck = QCheckBox('Watch for new files?', self)
+
         # Button to open file dialogue and text edit to display path
         self.selectDirButton = QPushButton('Select data directory', self)
-        self.dirTextBox = QLineEdit()
+        self.dirTextBox = QLineEdit(self.doc.getDataDirectory())
 
         # Setting up the layout of the widget
         self.grid.addWidget(self.posttitle, 0, 0)
@@ -299,9 +443,13 @@ class MultiPostDataUploadView(AbstractPostView):
         self.grid.addWidget(self.posttexttitle, 2, 0)
         self.grid.addWidget(self.posttext, 2, 1, 2, 2)
         self.grid.addWidget(QLabel(''), 4, 0)
+        self.grid.addWidget(self.watchcheck, 4, 1)
+        self.grid.addWidget(self.resumecheck, 4, 2)
         self.grid.addWidget(self.selectDirButton, 5, 0)
         self.grid.addWidget(self.dirTextBox, 5, 1, 1, 2)
+        self.grid.addWidget(self.progressbar, 6, 0, 1, 2)
         self.grid.addWidget(self.uploadButton, 6, 2)
+        self.grid.addWidget(self.cancelButton, 7, 2)
 
         self.setLayout(self.grid)
 
@@ -337,6 +485,14 @@ class MultiPostDataUploadView(AbstractPostView):
         self.connect(self.usefilenamecheck, SIGNAL('stateChanged(int)'),
                          self.emitFilenameCheckClicked)
 
+        # Resume checkbox state changed
+        self.connect(self.resumecheck, SIGNAL('stateChanged(int)'),
+                         self.emitResumeCheckClicked)
+
+        # Watch checkbox state changed
+        self.connect(self.watchcheck, SIGNAL('stateChanged(int)'),
+                         self.emitWatchCheckClicked)
+
         # Action on modifying the Data Directory text edit
         self.connect(self.dirTextBox, SIGNAL('editingFinished()'),
                                       self.emitViewDataDirModified)
@@ -407,7 +563,7 @@ class MultiPostDataUploadView(AbstractPostView):
 
         directory = QFileDialog.getExistingDirectory(self, 
                     'Open Directory',
-                    '/home')
+                    self.doc.getDataDirectory() or '/home')
         self.dirTextBox.setText(directory)
         self.doc.setDataDirectory(directory)
 
@@ -430,7 +586,11 @@ class MultiPostDataUploadView(AbstractPostView):
         """Dialog box triggered when data upload is complete
         """
         
-        message = ("Upload succeeded\n\n For " + str(self.doc.length) + 
+        if self.doc.uploadcancelled:
+            outcome = "Upload cancelled"
+        else:
+            outcome = "Upload succeeded"
+        message = (outcome + "\n\n For " + str(self.doc.length) + 
                    " data objects, " + str(self.doc.data_fail) + 
                    " data uploads failed and " + str(self.doc.post_fail) +
                    " post creations failed") 
@@ -466,6 +626,24 @@ class MultiPostDataUploadView(AbstractPostView):
         else:
             pass
 
+    def emitResumeCheckClicked(self):
+        """Action called when Resume checkbox is clicked"""
+
+        if self.resumecheck.isChecked() == True:
+            self.emit(SIGNAL('sigViewResumeCheckedTRUE'))
+
+        elif self.resumecheck.isChecked() == False:
+            self.emit(SIGNAL('sigViewResumeCheckedFALSE'))
+
+    def emitWatchCheckClicked(self):
+        """Action called when Watch checkbox is clicked"""
+
+        if self.watchcheck.isChecked() == True:
+            self.emit(SIGNAL('sigViewWatchCheckedTRUE'))
+
+        elif self.watchcheck.isChecked() == False:
+            self.emit(SIGNAL('sigViewWatchCheckedFALSE'))
+
 class MultiPostCreationView(AbstractPostView):
     """View for creating multiple posts with incrementing titles
 
@@ -484,6 +662,7 @@ class MultiPostCreationView(AbstractPostView):
         # Create a spinbox to select number of incremented posts
         self.spinboxlabel = QLabel('Number of posts required')
         self.numpostspinbox = QSpinBox()
+        self.numpostspinbox.setMaximum(MAX_NUMPOSTS)
 
         # Layout the widgets
         self.grid.addWidget(self.posttitle, 0, 0)
@@ -494,7 +673,9 @@ class MultiPostCreationView(AbstractPostView):
         self.grid.addWidget(self.posttexttitle, 3, 0)
         self.grid.addWidget(self.posttext, 3, 1, 3, 2)
         self.grid.addWidget(QLabel(''), 4, 0)
+        self.grid.addWidget(self.progressbar, 6, 0, 1, 2)
         self.grid.addWidget(self.uploadButton, 6, 2)
+        self.grid.addWidget(self.cancelButton, 7, 2)
 
         self.setLayout(self.grid)
 
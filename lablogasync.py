@@ -0,0 +1,386 @@
+# LaBLogAsync: Asynchronous posting of many LaBLog objects at once
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to lablogasync.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Dependencies: The module requires a range of modules from the
+# Python 2.6 standard library.
+
+import sys
+import time
+import errno
+import select
+import socket
+import urllib
+import httplib
+import urllib2
+import asyncore
+import urlparse
+import collections
+import lablogpost
+import lablogproxy
+import lablogtrace
+import lablogtransport
+from StringIO import StringIO
+
+# Global Variables
+
+DEFAULT_CONCURRENCY = 50
+POLL_INTERVAL = 0.05
+
+class AsyncResult(object):
+    """The outcome of a post made by an AsyncLaBLogClient
+
+    Once the post has finished done is True and get() returns the data
+    or post ID, or False or None, as doPost of the object would, or
+    raises the error doPost would have raised. If a callback is given
+    it is called with the result when the post finishes.
+    """
+
+    def __init__(self, callback = None):
+        self.callback = callback
+        self.done = False
+        self.value = None
+        self.error = None
+
+    def set(self, value, error = None):
+        self.value = value
+        self.error = error
+        self.done = True
+        if self.callback:
+            self.callback(self)
+
+    def get(self):
+        assert self.done, 'Post has not finished'
+        if self.error != None:
+            raise self.error
+        return self.value
+
+
+class RequestDispatcher(asyncore.dispatcher):
+    """A single HTTP request made by an AsyncLaBLogClient
+
+    The request is sent as HTTP/1.0 so that the response ends when the
+    server closes the connection. The body, a string or a file-like
+    object such as a lablogpost.StreamingBody, is read a block at a
+    time as the socket can take it. When the request finishes
+    done(response, error) is queued on the client.
+    """
+
+    def __init__(self, client, url, body, timeout, done):
+        asyncore.dispatcher.__init__(self, map = client.map)
+        self.client = client
+        self.url = url
+        self.timeout = timeout
+        self.done = done
+        self.incoming = []
+        self.finished = False
+
+        scheme, netloc, path, query, fragment = urlparse.urlsplit(url)
+        if query:
+            path = path + '?' + query
+
+        if scheme != 'http':
+            raise urllib2.URLError('Unsupported scheme for asynchronous '
+                                   'requests: ' + scheme)
+
+        # Requests through a proxy go to the proxy with the full URL
+        host = netloc
+        headers = {}
+        proxy = client.proxies.resolve(url)
+        if proxy:
+            scheme, netloc, path, headers = lablogproxy.proxy_request(url,
+                                                                      proxy)
+            if scheme != 'http':
+                raise urllib2.URLError('Unsupported proxy for asynchronous '
+                                       'requests: ' + scheme)
+
+        head = ['POST %s HTTP/1.0' % path, 'Host: ' + host,
+                'Content-Length: %d' % len(body)]
+        if hasattr(body, 'content_type'):
+            head.append('Content-Type: ' + body.content_type)
+        for name, value in headers.items():
+            head.append(name + ': ' + value)
+        self.outgoing = '\r\n'.join(head) + '\r\n\r\n'
+        if hasattr(body, 'read'):
+            self.body = body
+        else:
+            self.outgoing += body
+            self.body = None
+
+        host, port = urllib.splitport(netloc)
+        family, socktype, proto, canonname, address = socket.getaddrinfo(
+                        host.strip('[]'), int(port or httplib.HTTP_PORT),
+                        0, socket.SOCK_STREAM)[0]
+        self.touch()
+        self.create_socket(family, socktype)
+        try:
+            self.connect(address)
+        except socket.error, e:
+            self.fail(e)
+
+    def touch(self):
+        self.last_activity = time.time()
+
+    def expired(self, now):
+        if self.connected:
+            return now - self.last_activity > self.timeout
+        return now - self.last_activity > self.client.connect_timeout
+
+    def writable(self):
+        return not self.connected or self.outgoing or self.body != None
+
+    def handle_connect(self):
+        self.touch()
+
+    def handle_write(self):
+        if not self.outgoing and self.body != None:
+            self.outgoing = self.body.read(lablogtransport.BLOCK_SIZE)
+            if not self.outgoing:
+                self.body = None
+                return
+
+        sent = self.send(self.outgoing)
+        self.outgoing = self.outgoing[sent:]
+        if sent:
+            self.touch()
+
+    def handle_read(self):
+        data = self.recv(lablogtransport.BLOCK_SIZE)
+        if data:
+            self.incoming.append(data)
+            self.touch()
+
+    def handle_close(self):
+        content = ''.join(self.incoming)
+        if not content:
+            self.fail(socket.error(errno.ECONNRESET,
+                                   'Connection reset by peer'))
+            return
+
+        try:
+            response = parse_response(content, self.url)
+        except (urllib2.HTTPError, httplib.HTTPException), e:
+            self.finish(None, e)
+        else:
+            self.finish(response, None)
+
+    def handle_error(self):
+        self.fail(sys.exc_info()[1])
+
+    def fail(self, error):
+        if not isinstance(error, urllib2.URLError):
+            error = urllib2.URLError(error)
+        self.finish(None, error)
+
+    def finish(self, response, error):
+        self.close()
+        if not self.finished:
+            self.finished = True
+            self.client.completed.append((self.done, response, error))
+
+
+def parse_response(content, url):
+    """Return the response in content as urllib2 would
+
+    Raises urllib2.HTTPError for an HTTP error status and
+    httplib.BadStatusLine if the response cannot be read.
+    """
+
+    head, separator, content = content.partition('\r\n\r\n')
+    lines = head.split('\r\n')
+    try:
+        version, status, reason = (lines[0].split(None, 2) + [''])[:3]
+        status = int(status)
+    except ValueError:
+        raise httplib.BadStatusLine(lines[0])
+    if not separator or not version.startswith('HTTP/'):
+        raise httplib.BadStatusLine(lines[0])
+
+    headers = httplib.HTTPMessage(StringIO('\r\n'.join(lines[1:]) +
+                                           '\r\n\r\n'))
+    if headers.getheader('content-length', '').isdigit():
+        content = content[:int(headers.getheader('content-length'))]
+
+    if status >= 400:
+        raise urllib2.HTTPError(url, status, reason, headers,
+                                StringIO(content))
+    return lablogtransport.Response(content, status, reason, url)
+
+
+class AsyncLaBLogClient(object):
+    """Posts many LaBLog objects at once from a single thread
+
+    doPost() queues a lablogpost.LaBLogData or LaBLogPost to be posted
+    and returns an AsyncResult, and run() makes the requests until
+    every post has finished. At most concurrency requests are in
+    progress at once, each on its own connection, with all of them
+    driven by one asyncore event loop rather than a thread per request.
+    Callbacks may queue more posts, for example the post for a data
+    object once its data ID is known, and run() carries on until they
+    have finished too.
+
+    The objects are checked, serialized and their responses read with
+    the same methods as their own doPost, so the requests and results
+    are the same as posting them one at a time, including falling back
+    to inline transfers for servers that refuse multipart data or do
+    not store all of it. Proxies and timeouts are as for 
+    lablogclient.LaBLogClient; only http URLs are supported.
+    """
+
+    def __init__(self, concurrency = DEFAULT_CONCURRENCY, proxies = None,
+                 connect_timeout = lablogtransport.DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout = lablogtransport.DEFAULT_READ_TIMEOUT):
+        self.concurrency = concurrency
+        if not isinstance(proxies, lablogproxy.ProxyResolver):
+            proxies = lablogproxy.ProxyResolver(proxies)
+        self.proxies = proxies
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.map = {}
+        self.queue = collections.deque()
+        self.completed = []
+
+    def doPost(self, lablogobject, url = lablogpost.DEFAULT_URL,
+               uid = lablogpost.DEFAULT_UID, callback = None):
+        """Queue a LaBLogData or LaBLogPost to be posted
+
+        The object is checked at once, raising AssertionError as its
+        doPost would if it is not ready to post. Returns an AsyncResult
+        that is given callback.
+        """
+
+        lablogobject.checkPost()
+        result = AsyncResult(callback)
+        if isinstance(lablogobject, lablogpost.LaBLogData):
+            self.postData(lablogobject, url, uid, result,
+                          lablogobject.useMultipart(url))
+        else:
+            self.request(url + '/api/rest/addpost/uid/' + uid,
+                         lablogobject.serialize_body, False,
+                         lambda response, error:
+                             self.finishPost(lablogobject, result,
+                                             response, error))
+        return result
+
+    def postData(self, data, url, uid, result, multipart):
+        if multipart:
+            serialize = data.serialize_multipart_body
+        else:
+            serialize = data.serialize_body
+
+        def done(response, error):
+            refused = (multipart and isinstance(error, urllib2.HTTPError) and
+                       str(error.code) in lablogpost.MULTIPART_REFUSED)
+            if error != None and not refused:
+                result.set(None, error)
+                return
+
+            if error == None:
+                try:
+                    parsedresponse = data.readResponse(response)
+                except lablogpost.REQUEST_ERRORS, e:
+                    result.set(None, e)
+                    return
+                refused = multipart and not data.acceptedMultipart(
+                                                             parsedresponse)
+
+            # Send the data again inline straight away
+            if refused:
+                data.refuseMultipart(url)
+                self.postData(data, url, uid, result, False)
+                return
+
+            data.noteServer(url, parsedresponse)
+            result.set(data.postResult(parsedresponse))
+
+        # Data sent again after a refused multipart transfer goes first
+        self.request(url + '/api/rest/adddata/uid/' + uid, serialize,
+                     True, done, first = not multipart)
+
+    def finishPost(self, lablogobject, result, response, error):
+        if error != None:
+            result.set(None, error)
+            return
+
+        try:
+            parsedresponse = lablogobject.readResponse(response)
+        except lablogpost.REQUEST_ERRORS, e:
+            result.set(None, e)
+            return
+        result.set(lablogobject.postResult(parsedresponse))
+
+    def request(self, url, serialize, upload, done, first = False):
+        """Queue a request whose body is made by calling serialize
+
+        Bodies are only serialized when their request starts so that
+        no more than concurrency are open at once. The timeout of
+        uploads grows with their size as for LaBLogData.doPost. If 
+        first is set the request goes to the front of the queue.
+        """
+
+        if first:
+            self.queue.appendleft((url, serialize, upload, done))
+        else:
+            self.queue.append((url, serialize, upload, done))
+
+    def start(self, url, serialize, upload, done):
+        try:
+            body = serialize()
+            timeout = self.read_timeout
+            if upload:
+                timeout = lablogpost.upload_timeout(self, len(body))
+            if lablogtrace.enabled:
+                done = self.traced(url, len(body), done)
+            RequestDispatcher(self, url, body, timeout, done)
+        except (EnvironmentError, urllib2.URLError), e:
+            if not isinstance(e, urllib2.URLError):
+                e = urllib2.URLError(e)
+            self.completed.append((done, None, e))
+
+    def traced(self, url, size, done):
+        """Wrap the callback of a request to time it as a trace span"""
+
+        span = lablogtrace.span('AsyncRequest', url = url, bytes = size)
+        def finish(response, error):
+            span.finish(error = error)
+            done(response, error)
+        return finish
+
+    def pending(self):
+        """Return the number of requests queued or in progress"""
+
+        return len(self.queue) + len(self.map) + len(self.completed)
+
+    def run(self):
+        """Make the queued requests until every post has finished"""
+
+        use_poll = hasattr(select, 'poll')
+        while self.pending():
+            while self.queue and len(self.map) < self.concurrency:
+                self.start(*self.queue.popleft())
+
+            if self.map:
+                asyncore.loop(POLL_INTERVAL, use_poll, self.map, 1)
+
+            now = time.time()
+            for dispatcher in self.map.values():
+                if dispatcher.expired(now):
+                    dispatcher.fail(socket.timeout('timed out'))
+
+            # Callbacks run outside the event loop so that their errors
+            # are raised from run()
+            completed, self.completed = self.completed, []
+            for done, response, error in completed:
+                done(response, error)
+
+    def close(self):
+        """Abandon any requests in progress"""
+
+        asyncore.close_all(self.map)
+        self.queue.clear()
+        self.completed = []
@@ -0,0 +1,442 @@
+# LaBLogBench: Benchmarks for the LaBLogPost upload path
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to lablogbench.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Dependencies: The module requires a range of modules from the
+# Python 2.6 standard library.
+#
+# Usage: python lablogbench.py [--scenario NAME] [--transfer MODE]
+#                              [--scale F] [--json FILE] [options]
+
+import os
+import os.path
+import sys
+import time
+import json
+import base64
+import shutil
+import resource
+import tempfile
+import threading
+import subprocess
+import optparse
+import lablogpost
+import lablogclient
+import lablogtransport
+import lablogmock
+
+# Global Variables
+
+FORMAT_VERSION = 1
+
+# The phases upload time is divided between
+PHASES = ['read', 'encode', 'serialize', 'network', 'parse']
+
+# Transports requests can be sent with, see make_transport
+TRANSPORTS = ['pooled', 'urllib2', 'memory']
+
+# Synthetic data sets as lists of (number of files, file size)
+SCENARIOS = {'small' : [(1000, 4096)],
+             'huge'  : [(3, 64 << 20)],
+             'mixed' : [(200, 4096), (20, 1 << 20), (2, 32 << 20)]}
+
+class PhaseTimer(object):
+    """Totals the time spent in each phase of an upload
+
+    Timed calls may be nested, for example the file is read and
+    encoded while the request is being sent, in which case the time
+    of the inner call is counted only in its own phase. Calls are
+    timed separately in each thread so the totals are of time spent
+    by all threads.
+    """
+
+    def __init__(self):
+        self.totals = {}
+        for phase in PHASES:
+            self.totals[phase] = 0.0
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def call(self, phase, func, *args, **kwargs):
+        """Call func(*args, **kwargs) counting its time in phase"""
+
+        if not hasattr(self.local, 'nested'):
+            self.local.nested = []
+        self.local.nested.append(0.0)
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+
+        finally:
+            elapsed = time.time() - start
+            nested = self.local.nested.pop()
+            if self.local.nested:
+                self.local.nested[-1] += elapsed
+            self.lock.acquire()
+            self.totals[phase] += elapsed - nested
+            self.lock.release()
+
+    def wrap(self, phase, func):
+        """Return func wrapped to count its time in phase"""
+
+        def timed(*args, **kwargs):
+            return self.call(phase, func, *args, **kwargs)
+        return timed
+
+
+class CountingClient(lablogtransport.Transport):
+    """Wraps a client counting the request bytes and network time"""
+
+    def __init__(self, client, timer):
+        self.client = client
+        self.read_timeout = client.read_timeout
+        self.timer = timer
+        self.request_bytes = 0
+        self.lock = threading.Lock()
+
+    def post(self, url, body, headers = None, timeout = None):
+        self.lock.acquire()
+        self.request_bytes += len(body)
+        self.lock.release()
+        return self.timer.call('network', self.client.post, url, body,
+                               headers, timeout)
+
+
+def instrument(timer):
+    """Time the phases of uploads made with lablogpost
+
+    Replaces the file reading and encoding functions and serialization
+    and request methods of lablogpost with versions that count their
+    time with timer. Returns a function that restores the originals.
+    """
+
+    def b64encode_file(path, chunksize = lablogpost.CHUNK_SIZE):
+        assert chunksize % 3 == 0, 'Chunk size must be a multiple of 3'
+        f = open(path, 'rb')
+        try:
+            while True:
+                chunk = timer.call('read', f.read, chunksize)
+                if not chunk:
+                    break
+                yield timer.call('encode', base64.standard_b64encode,
+                                 chunk)
+        finally:
+            f.close()
+
+    def read_file(path, chunksize = lablogpost.CHUNK_SIZE):
+        f = open(path, 'rb')
+        try:
+            while True:
+                chunk = timer.call('read', f.read, chunksize)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            f.close()
+
+    originals = []
+    def replace(owner, name, replacement):
+        originals.append((owner, name, owner.__dict__[name]))
+        setattr(owner, name, replacement)
+
+    replace(lablogpost, 'b64encode_file', b64encode_file)
+    replace(lablogpost, 'read_file', read_file)
+    for owner, name in [(lablogpost.LaBLogData, 'serialize'),
+                        (lablogpost.LaBLogData, 'serialize_body'),
+                        (lablogpost.LaBLogData, 'serialize_multipart_body'),
+                        (lablogpost.LaBLogPost, 'serialize_body')]:
+        replace(owner, name, timer.wrap('serialize', getattr(owner, name)))
+
+    # Time in a request that is not spent sending it is parsing
+    replace(lablogpost.LaBLogObject, 'sendRequest',
+            timer.wrap('parse', lablogpost.LaBLogObject.sendRequest))
+
+    def restore():
+        for owner, name, original in reversed(originals):
+            setattr(owner, name, original)
+    return restore
+
+def make_transport(name, latency = 0):
+    """Return a transport of the type given by name
+
+    The 'pooled' and 'urllib2' transports send requests over HTTP. The
+    'memory' transport hands them to a lablogmock.MockLaBLogApp, with
+    the given latency, in this process.
+    """
+
+    if name == 'pooled':
+        return lablogclient.LaBLogClient()
+    elif name == 'urllib2':
+        return lablogtransport.Urllib2Transport(proxies = {})
+    elif name == 'memory':
+        app = lablogmock.MockLaBLogApp(latency = latency)
+        return lablogtransport.InMemoryTransport(app.dispatch)
+    raise ValueError('Unknown transport ' + name)
+
+def make_file(directory, name, size):
+    """Write size bytes of random data to a file and return its path"""
+
+    path = os.path.join(directory, name)
+    f = open(path, 'wb')
+    while size > 0:
+        block = os.urandom(min(size, 1 << 20))
+        f.write(block)
+        size -= len(block)
+    f.close()
+    return path
+
+def make_scenario(directory, scenario, scale = 1.0):
+    """Fill directory with the files of a scenario and return the paths
+
+    The number and size of the files are both multiplied by scale.
+    """
+
+    paths = []
+    for count, size in SCENARIOS[scenario]:
+        size = max(1, int(size * scale))
+        for n in range(max(1, int(count * scale))):
+            paths.append(make_file(directory, 'file%05d-%d.dat' %
+                                   (len(paths), size), size))
+    return paths
+
+def peak_rss_mb():
+    """Return the peak resident set size of the process in MB
+
+    Where /proc is available the peak is read from VmHWM, which starts
+    afresh when a program is executed. On Linux ru_maxrss is carried
+    over through fork and exec, so an isolated run would otherwise 
+    report the peak of the process hosting the mock LaBLog if that 
+    was larger than its own.
+    """
+
+    try:
+        status = open('/proc/self/status')
+        try:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.0
+        finally:
+            status.close()
+    except IOError:
+        pass
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes and Mac OS X bytes
+    if sys.platform == 'darwin':
+        return peak / float(1 << 20)
+    return peak / 1024.0
+
+def measure(paths, client, stage):
+    """Run stage() timing its phases and return the results"""
+
+    timer = PhaseTimer()
+    counting = CountingClient(client, timer)
+    restore = instrument(timer)
+    try:
+        start = time.time()
+        stage(counting)
+        seconds = time.time() - start
+    finally:
+        restore()
+
+    size = sum([os.path.getsize(path) for path in paths])
+    phases = {}
+    for phase in PHASES:
+        phases[phase] = round(timer.totals[phase], 6)
+    return {'seconds'       : round(seconds, 6),
+            'files'         : len(paths),
+            'bytes'         : size,
+            'request_bytes' : counting.request_bytes,
+            'files_per_s'   : round(len(paths) / seconds, 3),
+            'mb_per_s'      : round(size / float(1 << 20) / seconds, 3),
+            'phases'        : phases}
+
+def run_scenario(scenario, url, transfer = lablogpost.TRANSFER_INLINE,
+                 scale = 1.0, concurrency = 1, client = None):
+    """Benchmark uploads of the files of a scenario to the LaBLog at url
+
+    Two stages are timed: data posts of each file in turn with
+    LaBLogData.set_data and doPost, and a full MultiDataFileUpload of
+    the directory creating a post for each file. Requests are sent with
+    client, by default a new lablogclient.LaBLogClient.
+
+    A small file is posted before timing starts so that the server has
+    said whether it accepts multipart transfers, which are otherwise
+    not used for the first file, and the connection is open.
+    """
+
+    tempdir = tempfile.mkdtemp()
+    if client == None:
+        client = lablogclient.LaBLogClient()
+    try:
+        warmup = lablogpost.LaBLogData()
+        warmup.set_type('inline')
+        warmup.set_data(make_file(tempdir, 'warmup.dat', 1024))
+        assert warmup.doPost(url = url, uid = '', client = client), \
+               'Warm-up data post failed'
+
+        paths = make_scenario(tempdir, scenario, scale)
+
+        def post_data(counting):
+            for path in paths:
+                data = lablogpost.LaBLogData()
+                data.set_type('inline')
+                data.transfer = transfer
+                if transfer == lablogpost.TRANSFER_MULTIPART:
+                    data.set_data(path, stream = True)
+                else:
+                    data.set_data(path)
+                assert data.doPost(url = url, uid = '', client = counting), \
+                       'Data post failed'
+
+        def upload(counting):
+            posts = lablogpost.MultiDataFileUpload(filelist = list(paths),
+                                          postnames = 'bench',
+                                          posttext = 'Benchmark upload',
+                                          username = 'bench',
+                                          blog_sname = 'bench',
+                                          server_url = url, uid = '',
+                                          client = counting,
+                                          concurrency = concurrency,
+                                          transfer = transfer)
+            data_fail, post_fail, length = posts.doUpload()
+            assert data_fail == 0 and post_fail == 0, 'Upload failed'
+
+        return {'scenario'    : scenario,
+                'transfer'    : transfer,
+                'transport'   : client.__class__.__name__,
+                'scale'       : scale,
+                'concurrency' : concurrency,
+                'data'        : measure(paths, client, post_data),
+                'upload'      : measure(paths, client, upload),
+                'peak_rss_mb' : round(peak_rss_mb(), 1)}
+
+    finally:
+        client.close()
+        shutil.rmtree(tempdir)
+
+def run_isolated(scenario, transfer, args):
+    """Run a scenario in a new interpreter so its peak RSS is its own"""
+
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__),
+                                '--no-isolate', '--json', '-',
+                                '--scenario', scenario,
+                                '--transfer', transfer] + args,
+                               stdout = subprocess.PIPE)
+    output = process.communicate()[0]
+    assert process.returncode == 0, 'Benchmark of ' + scenario + ' failed'
+    return json.loads(output)['results'][0]
+
+def main(args):
+    parser = optparse.OptionParser(usage = '%prog [options]')
+    parser.add_option('--scenario', action = 'append',
+                      choices = sorted(SCENARIOS.keys()),
+                      help = 'data set to upload, may be repeated '
+                             '[all of ' + ', '.join(sorted(SCENARIOS)) + ']')
+    parser.add_option('--transfer', action = 'append',
+                      choices = [lablogpost.TRANSFER_INLINE,
+                                 lablogpost.TRANSFER_MULTIPART],
+                      help = 'data transfer mode, may be repeated [both]')
+    parser.add_option('--transport', choices = TRANSPORTS,
+                      default = 'pooled',
+                      help = 'transport for requests, one of ' +
+                             ', '.join(TRANSPORTS) + ' [%default]')
+    parser.add_option('--scale', type = 'float', default = 1.0,
+                      help = 'multiplier for the number and size of '
+                             'files [%default]')
+    parser.add_option('--concurrency', type = 'int', default = 1,
+                      help = 'parallel uploads in MultiDataFileUpload '
+                             '[%default]')
+    parser.add_option('--latency', type = 'float', default = 0,
+                      help = 'latency of the mock LaBLog in seconds '
+                             '[%default]')
+    parser.add_option('--bandwidth', type = 'int',
+                      help = 'bandwidth of the mock LaBLog in bytes/s')
+    parser.add_option('--url',
+                      help = 'benchmark against this LaBLog rather than '
+                             'a local mock')
+    parser.add_option('--json', metavar = 'FILE',
+                      help = "write the results as JSON to FILE, '-' "
+                             "for standard output")
+    parser.add_option('--no-isolate', action = 'store_false',
+                      dest = 'isolate', default = True,
+                      help = 'run all scenarios in this process')
+    options, arguments = parser.parse_args(args)
+
+    scenarios = options.scenario or sorted(SCENARIOS.keys())
+    transfers = options.transfer or [lablogpost.TRANSFER_INLINE,
+                                     lablogpost.TRANSFER_MULTIPART]
+
+    server = None
+    url = options.url
+    if options.transport == 'memory':
+        url = 'http://lablog'
+    elif url == None:
+        server = lablogmock.MockLaBLog(latency = options.latency,
+                                       bandwidth = options.bandwidth)
+        server.start()
+        url = server.url
+
+    results = []
+    try:
+        for scenario in scenarios:
+            for transfer in transfers:
+                if options.isolate:
+                    results.append(run_isolated(scenario, transfer,
+                                   ['--url', url, '--scale',
+                                    str(options.scale), '--concurrency',
+                                    str(options.concurrency), '--latency',
+                                    str(options.latency), '--transport',
+                                    options.transport]))
+                else:
+                    client = make_transport(options.transport,
+                                            options.latency)
+                    results.append(run_scenario(scenario, url, transfer,
+                                                options.scale,
+                                                options.concurrency,
+                                                client))
+    finally:
+        if server:
+            server.stop()
+
+    report = {'version'   : FORMAT_VERSION,
+              'python'    : sys.version.split()[0],
+              'platform'  : sys.platform,
+              'time'      : time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'latency'   : options.latency,
+              'bandwidth' : options.bandwidth,
+              'results'   : results}
+
+    if options.json == '-':
+        print json.dumps(report, indent = 1, sort_keys = True)
+    else:
+        if options.json:
+            f = open(options.json, 'w')
+            json.dump(report, f, indent = 1, sort_keys = True)
+            f.close()
+        print_report(report)
+    return 0
+
+def print_report(report):
+    print '%-8s %-10s %-7s %8s %9s %9s %8s  %s' % ('scenario', 'transfer',
+              'stage', 'files/s', 'MB/s', 'MB sent', 'RSS MB',
+              ' '.join(['%9s' % phase for phase in PHASES]))
+    for result in report['results']:
+        for stage in ['data', 'upload']:
+            times = result[stage]
+            print '%-8s %-10s %-7s %8.1f %9.2f %9.2f %8.1f  %s' % (
+                      result['scenario'], result['transfer'], stage,
+                      times['files_per_s'], times['mb_per_s'],
+                      times['request_bytes'] / float(1 << 20),
+                      result['peak_rss_mb'],
+                      ' '.join(['%8.3fs' % times['phases'][phase]
+                                for phase in PHASES]))
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,231 @@
+# LaBLogCache: A content-hash cache of uploaded data for LaBLogPost
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to lablogcache.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Dependencies: The module requires a range of modules from the
+# Python 2.6 standard library including sqlite3 and hashlib.
+#
+# Usage: python lablogcache.py --invalidate SERVER_URL [--cache PATH]
+
+import os
+import os.path
+import sys
+import time
+import hashlib
+import sqlite3
+import threading
+import optparse
+
+# Global Variables
+
+DEFAULT_CACHE = os.path.join(os.path.expanduser('~'),
+                             '.lablog-datacache.sqlite')
+DEFAULT_MAX_ENTRIES = 100000
+EVICT_INTERVAL = 100
+HASH_CHUNK_SIZE = 65536
+
+class DataCache(object):
+    """A persistent index from file contents to LaBLog data IDs
+
+    The cache records the data_id returned by the LaBLog for each
+    file uploaded, keyed by the server URL and the SHA-1 hash and size
+    of the file contents, so that a file whose contents have already
+    been uploaded to a server can be attached to a new post using the
+    existing data_id rather than being sent again.
+
+    Hashing a file means reading all of it so the hash of each path is
+    also kept along with the size and modification time of the file.
+    While these are unchanged the stored hash is used without reading
+    the file.
+
+    Each table holds at most max_entries rows, the least recently
+    used rows being removed first. Entries for a server, for example
+    after its database has been reset, are removed with invalidate().
+    The cache may be shared between the threads of a concurrent
+    upload.
+    """
+
+    def __init__(self, path = DEFAULT_CACHE,
+                 max_entries = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self.stores = 0
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread = False)
+        self.connection.text_factory = str
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS files (
+                                       path TEXT PRIMARY KEY,
+                                       size INTEGER,
+                                       mtime REAL,
+                                       sha1 TEXT,
+                                       last_used REAL)""")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS data (
+                                       server_url TEXT,
+                                       sha1 TEXT,
+                                       size INTEGER,
+                                       data_id TEXT,
+                                       last_used REAL,
+                                       PRIMARY KEY (server_url, sha1, size))""")
+        self.connection.commit()
+        self.evict()
+
+    def file_hash(self, path):
+        """Return the SHA-1 hash and size of the contents of a file
+
+        The stored hash is used, and marked as used for eviction, if
+        the size and modification time of the file are those recorded
+        when it was last hashed.
+        """
+
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+
+        self.lock.acquire()
+        try:
+            row = self.connection.execute("""SELECT size, mtime, sha1
+                                             FROM files WHERE path = ?""",
+                                          (path,)).fetchone()
+            if row and row[0] == stat.st_size and row[1] == stat.st_mtime:
+                self.connection.execute("""UPDATE files SET last_used = ?
+                                           WHERE path = ?""",
+                                        (time.time(), path))
+                self.connection.commit()
+                return row[2], stat.st_size
+        finally:
+            self.lock.release()
+
+        sha1 = hashlib.sha1()
+        f = open(path, 'rb')
+        try:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            while chunk:
+                sha1.update(chunk)
+                chunk = f.read(HASH_CHUNK_SIZE)
+        finally:
+            f.close()
+
+        self.lock.acquire()
+        try:
+            self.connection.execute("""INSERT OR REPLACE INTO files
+                                       VALUES (?, ?, ?, ?, ?)""",
+                                    (path, stat.st_size, stat.st_mtime,
+                                     sha1.hexdigest(), time.time()))
+            self.connection.commit()
+        finally:
+            self.lock.release()
+
+        return sha1.hexdigest(), stat.st_size
+
+    def lookup(self, server_url, path):
+        """Return the data ID of a file already uploaded to a server
+
+        Returns None if the contents of the file have not been
+        uploaded to the server before.
+        """
+
+        sha1, size = self.file_hash(path)
+
+        self.lock.acquire()
+        try:
+            row = self.connection.execute("""SELECT data_id FROM data WHERE
+                                             server_url = ? AND sha1 = ?
+                                             AND size = ?""",
+                                          (server_url, sha1, size)).fetchone()
+            if row == None:
+                return None
+
+            self.connection.execute("""UPDATE data SET last_used = ? WHERE
+                                       server_url = ? AND sha1 = ?
+                                       AND size = ?""",
+                                    (time.time(), server_url, sha1, size))
+            self.connection.commit()
+            return row[0]
+
+        finally:
+            self.lock.release()
+
+    def store(self, server_url, path, data_id):
+        """Record the data ID a file has been uploaded as"""
+
+        sha1, size = self.file_hash(path)
+
+        self.lock.acquire()
+        try:
+            self.connection.execute("""INSERT OR REPLACE INTO data
+                                       VALUES (?, ?, ?, ?, ?)""",
+                                    (server_url, sha1, size, data_id,
+                                     time.time()))
+            self.connection.commit()
+            self.stores += 1
+            evict = self.stores % EVICT_INTERVAL == 0
+        finally:
+            self.lock.release()
+
+        if evict:
+            self.evict()
+
+    def evict(self):
+        """Remove the least recently used rows above max_entries"""
+
+        self.lock.acquire()
+        try:
+            for table in ['files', 'data']:
+                count = self.connection.execute('SELECT COUNT(*) FROM ' +
+                                                table).fetchone()[0]
+                if count > self.max_entries:
+                    self.connection.execute('DELETE FROM ' + table +
+                                            ' WHERE rowid IN (SELECT rowid'
+                                            ' FROM ' + table +
+                                            ' ORDER BY last_used LIMIT ?)',
+                                            (count - self.max_entries,))
+            self.connection.commit()
+        finally:
+            self.lock.release()
+
+    def invalidate(self, server_url):
+        """Remove all entries for a server and return how many there were"""
+
+        self.lock.acquire()
+        try:
+            cursor = self.connection.execute("""DELETE FROM data
+                                                WHERE server_url = ?""",
+                                             (server_url,))
+            self.connection.commit()
+            return cursor.rowcount
+        finally:
+            self.lock.release()
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            self.connection.close()
+        finally:
+            self.lock.release()
+
+
+def main(args):
+    parser = optparse.OptionParser(
+                        usage = '%prog --invalidate SERVER_URL [options]')
+    parser.add_option('--invalidate', metavar = 'SERVER_URL',
+                      help = 'remove all cached data IDs for a server')
+    parser.add_option('--cache', default = DEFAULT_CACHE,
+                      help = 'path of the cache file [%default]')
+    options, arguments = parser.parse_args(args)
+
+    if not options.invalidate:
+        parser.error('No command given')
+
+    cache = DataCache(options.cache)
+    removed = cache.invalidate(options.invalidate)
+    cache.close()
+    print 'Removed %d entries for %s' % (removed, options.invalidate)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,182 @@
+# LaBLogCatalogue: A cached catalogue of the blogs on LaBLog servers
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to lablogcatalogue.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Dependencies: The module requires a range of modules from the
+# Python 2.6 standard library and the lablogpost module, which is
+# only imported when a catalogue is fetched so that reading the
+# catalogue at application startup stays quick.
+
+import os
+import os.path
+import json
+import time
+import logging
+import threading
+import lablogprefs
+
+# Global Variables
+
+DEFAULT_CATALOGUE = os.path.join(os.path.expanduser('~'),
+                                 '.lablog-catalogue.json')
+DEFAULT_TTL = 3600
+
+# What is known of each server before its catalogue is first fetched
+BUILTIN_CATALOGUE = {
+    'http://biolab.isis.rl.ac.uk' : {
+        'blogs'     : [['ibrahim', []],
+                       ['lab_materials', []],
+                       ['testing_sandpit', []]],
+        'usernames' : ['ethem.myopenid.com'],
+        'metadata'  : [['Section', ['Material', 'Procedure', 'Data', 'Note']],
+                       ['Material_Type', ['Solution', 'Powder', 'Solid']],
+                       ['Procedure', ['Labelling', 'Gel_electrophoresis',
+                                      'Cell_culture', 'Protein_purification']],
+                       ['Data_Type', ['Gel_image', 'FPLC trace',
+                                      'Fluorescence_data', 'Other_Excel_file']],
+                       ['Note', []],
+                       ['Project', ['Sortase_optimisation']]]}
+                     }
+
+class ServerCatalogue(object):
+    """The blogs, usernames and metadata vocabularies of LaBLog servers
+
+    The catalogue of each server is kept in a JSON file at path so
+    that reading it never waits for the network. Entries older than
+    ttl seconds are stale and refresh() asks the server whether they
+    have changed, sending the etag of the entry held so that an
+    unchanged catalogue is not sent again. Until a server's catalogue
+    has been fetched the entry for it in defaults, by default the
+    BUILTIN_CATALOGUE, is used.
+
+    Each entry is a dictionary holding 'blogs', a list of [short name,
+    sections] pairs, 'usernames', a list, and 'metadata', a list of
+    [key, values] pairs, along with the 'etag' and 'fetched' time of
+    the catalogue. The catalogue may be shared between threads.
+    """
+
+    def __init__(self, path = DEFAULT_CATALOGUE, ttl = DEFAULT_TTL,
+                 defaults = BUILTIN_CATALOGUE, clock = time.time):
+        self.path = path
+        self.ttl = ttl
+        self.defaults = defaults
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = {}
+
+        if path and os.path.exists(path):
+            try:
+                cataloguefile = open(path, 'rb')
+                try:
+                    self.entries = json.load(cataloguefile)
+                finally:
+                    cataloguefile.close()
+            except (EnvironmentError, ValueError), e:
+                logging.warning('Server catalogue unreadable: ' + str(e))
+
+    def entry(self, server_url):
+        self.lock.acquire()
+        try:
+            if server_url in self.entries:
+                return self.entries[server_url]
+        finally:
+            self.lock.release()
+        return self.defaults.get(server_url, {})
+
+    def servers(self):
+        """Return the servers known, the default servers first"""
+
+        self.lock.acquire()
+        try:
+            others = [server for server in self.entries
+                      if server not in self.defaults]
+        finally:
+            self.lock.release()
+        others.sort()
+        return sorted(self.defaults.keys()) + others
+
+    def blogs(self, server_url):
+        """Return the short names of the blogs on a server"""
+
+        return [str(blog) for blog, sections in
+                self.entry(server_url).get('blogs', [])]
+
+    def sections(self, server_url, blog):
+        """Return the sections of a blog, or [] if there are none known"""
+
+        for sname, sections in self.entry(server_url).get('blogs', []):
+            if sname == blog:
+                return [str(section) for section in sections]
+        return []
+
+    def usernames(self, server_url):
+        return [str(username) for username in
+                self.entry(server_url).get('usernames', [])]
+
+    def metadata(self, server_url):
+        """Return the metadata keys and values as a list of pairs"""
+
+        metadata = []
+        for key, values in self.entry(server_url).get('metadata', []):
+            metadata.append((str(key), [str(value) for value in values]))
+        return metadata
+
+    def is_stale(self, server_url):
+        fetched = self.entry(server_url).get('fetched')
+        return fetched == None or self.clock() - fetched >= self.ttl
+
+    def refresh(self, server_url, force = False, uid = None, client = None,
+                retry = None):
+        """Revalidate the catalogue of a server if it is stale
+
+        The request is made with client and retried according to retry
+        as for lablogpost requests, with the DEFAULT_UID of lablogpost
+        if uid is None. Returns True if the catalogue has changed.
+        Network errors are raised as for lablogpost requests and
+        refusals as ValueError.
+        """
+
+        if not force and not self.is_stale(server_url):
+            return False
+
+        import lablogpost
+        if uid == None:
+            uid = lablogpost.DEFAULT_UID
+        etag = self.entry(server_url).get('etag')
+        entry = lablogpost.LaBLogCatalogue().doRequest(server_url, uid, etag,
+                                                       client, retry)
+
+        self.lock.acquire()
+        try:
+            if entry == None:
+                entry = self.entries[server_url]
+            else:
+                self.entries[server_url] = entry
+            entry['fetched'] = self.clock()
+        finally:
+            self.lock.release()
+
+        self.save()
+        return entry.get('etag') != etag or etag == None
+
+    def save(self):
+        """Write the catalogue to its file, replacing it atomically"""
+
+        if not self.path:
+            return
+
+        self.lock.acquire()
+        try:
+            content = json.dumps(self.entries, indent = 1, sort_keys = True)
+        finally:
+            self.lock.release()
+
+        try:
+            lablogprefs.write_atomically(self.path, content)
+        except EnvironmentError, e:
+            logging.warning('Server catalogue not saved: ' + str(e))
@@ -0,0 +1,298 @@
+# LaBLogCLI: Command line batch uploads to a LaBLog
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to lablogcli.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Dependencies: The module requires a range of modules from the
+# Python 2.6 standard library.
+#
+# Usage: python lablogcli.py --blog SNAME --username NAME [options] DIRECTORY
+#
+# Each file in DIRECTORY, and with --recursive its subdirectories,
+# is uploaded as a data object and attached to
+# a new post, as the multiple data upload of the desktop application
+# does, without needing a display. Progress is written to standard
+# output as one JSON object per line. With --watch new files are 
+# uploaded as they are written until the upload is interrupted.
+
+import os
+import os.path
+import sys
+import json
+import time
+import signal
+import sqlite3
+import logging
+import optparse
+import threading
+import lablogpost
+import lablogretry
+import lablogcache
+import lablogjournal
+import lablogscan
+import lablogwatch
+import lablogtrace
+
+# Global Variables
+
+# Exit statuses
+EXIT_OK = 0
+EXIT_FAILURES = 1           # Some files were not uploaded
+EXIT_USAGE = 2              # As used by optparse for bad arguments
+EXIT_INTERRUPTED = 3        # Stopped by SIGINT or SIGTERM
+
+class ProgressWriter(object):
+    """Writes progress events as JSON lines, one object per line
+
+    Events may be written from several threads at once. Each line is
+    flushed straight away so that the progress can be followed as it
+    happens, for example by a script reading the output.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.lock = threading.Lock()
+
+    def write(self, event, **fields):
+        fields['event'] = event
+        fields['time'] = round(time.time(), 3)
+        line = json.dumps(fields, sort_keys = True)
+        self.lock.acquire()
+        try:
+            self.out.write(line + '\n')
+            self.out.flush()
+        finally:
+            self.lock.release()
+
+    def progress(self, index, path, result):
+        """Progress callback for MultiDataFileUpload"""
+
+        if result == None:
+            status = 'data_failed'
+        elif result == False:
+            status = 'post_failed'
+        else:
+            status = 'posted'
+        self.write('file', index = index, path = path, status = status,
+                   post_id = result or None)
+
+
+def parse_metadata(option, opt_str, value, parser):
+    """optparse callback collecting KEY=VALUE metadata options"""
+
+    key, separator, item = value.partition('=')
+    if not separator or not key:
+        raise optparse.OptionValueError(opt_str + ' must be KEY=VALUE')
+    parser.values.metadata[key] = item
+
+def make_scanner(directory, options):
+    """Return a scanner of the files in directory to upload"""
+
+    return lablogscan.DirectoryScanner(directory, 
+                                       recursive = options.recursive,
+                                       include = options.include,
+                                       exclude = options.exclude,
+                                       min_size = options.min_size,
+                                       max_size = options.max_size)
+
+def make_parser():
+    parser = optparse.OptionParser(usage = '%prog --blog SNAME '
+                                   '--username NAME [options] DIRECTORY')
+    parser.add_option('--server', default = lablogpost.DEFAULT_URL,
+                      help = 'LaBLog server URL [%default]')
+    parser.add_option('--blog', help = 'short name of the blog to post to')
+    parser.add_option('--username', help = 'LaBLog username for the posts')
+    parser.add_option('--uid', default = lablogpost.DEFAULT_UID,
+                      help = 'LaBLog API user ID')
+    parser.add_option('--section', default = '',
+                      help = 'blog section for the posts')
+    parser.add_option('--title',
+                      help = 'post title, numbered for each file')
+    parser.add_option('--use-filename', action = 'store_true',
+                      default = False,
+                      help = 'use the file names as post titles')
+    parser.add_option('--text', default = '',
+                      help = 'text of each post')
+    parser.add_option('--metadata', action = 'callback', type = 'string',
+                      callback = parse_metadata, metavar = 'KEY=VALUE',
+                      help = 'metadata for each post, may be repeated')
+    parser.add_option('--recursive', action = 'store_true', default = False,
+                      help = 'also upload the files in subdirectories')
+    parser.add_option('--include', action = 'append', metavar = 'GLOB',
+                      help = 'only upload files matching, may be repeated')
+    parser.add_option('--exclude', action = 'append', metavar = 'GLOB',
+                      help = 'skip files and directories matching, may be '
+                             'repeated')
+    parser.add_option('--min-size', type = 'int', metavar = 'BYTES',
+                      help = 'skip files smaller than this')
+    parser.add_option('--max-size', type = 'int', metavar = 'BYTES',
+                      help = 'skip files larger than this')
+    parser.add_option('--concurrency', type = 'int', default = 1,
+                      help = 'files uploaded in parallel [%default]')
+    parser.add_option('--resume', action = 'store_true', default = False,
+                      help = 'skip files uploaded by an earlier run')
+    parser.add_option('--transfer', default = lablogpost.TRANSFER_INLINE,
+                      choices = [lablogpost.TRANSFER_INLINE,
+                                 lablogpost.TRANSFER_MULTIPART],
+                      help = 'data transfer mode, inline or multipart. '
+                             'Multipart is only used once the server has '
+                             'said it accepts it, and files it does not '
+                             'store whole are sent again inline '
+                             '[%default]')
+    parser.add_option('--cache', default = lablogcache.DEFAULT_CACHE,
+                      metavar = 'FILE',
+                      help = 'cache of data already uploaded [%default]')
+    parser.add_option('--no-cache', action = 'store_const', const = None,
+                      dest = 'cache', help = 'do not use a data cache')
+    parser.add_option('--attempts', type = 'int',
+                      default = lablogretry.DEFAULT_ATTEMPTS,
+                      help = 'attempts at each request before giving up '
+                             '[%default]')
+    parser.add_option('--deadline', type = 'float', metavar = 'SECONDS',
+                      help = 'give up on files not uploaded in this time')
+    parser.add_option('--trace', metavar = 'FILE',
+                      help = 'write the timing and status of each request '
+                             'to FILE, which is rotated as it grows')
+    parser.add_option('--watch', action = 'store_true', default = False,
+                      help = 'keep uploading new files as they are written')
+    parser.add_option('--settle', type = 'float',
+                      default = lablogwatch.DEFAULT_SETTLE,
+                      metavar = 'SECONDS',
+                      help = 'with --watch, time a file must be unchanged '
+                             'before it is uploaded [%default]')
+    parser.set_defaults(metadata = {})
+    return parser
+
+def main(args, out = sys.stdout):
+    """Run an upload from the command line, returning the exit status"""
+
+    parser = make_parser()
+    options, arguments = parser.parse_args(args)
+    if len(arguments) != 1:
+        parser.error('one data directory is needed')
+    if not options.blog or not options.username:
+        parser.error('--blog and --username are needed')
+    if not options.title and not options.use_filename:
+        parser.error('--title or --use-filename is needed')
+    if options.concurrency < 1 or options.attempts < 1:
+        parser.error('--concurrency and --attempts must be at least 1')
+
+    directory = arguments[0]
+    if not os.path.isdir(directory):
+        parser.error('no such directory: ' + directory)
+
+    progress = ProgressWriter(out)
+    watcher = None
+    if options.watch:
+        watcher = lablogwatch.DirectoryWatcher(directory, 
+                                               settle = options.settle)
+
+    # Keep the journal alongside the data if the directory allows
+    try:
+        journal = lablogjournal.UploadJournal.for_directory(directory)
+    except sqlite3.Error, e:
+        logging.warning('Upload journal unavailable: ' + str(e))
+        journal = None
+
+    cache = None
+    if options.cache:
+        try:
+            cache = lablogcache.DataCache(options.cache)
+        except sqlite3.Error, e:
+            logging.warning('Data cache unavailable: ' + str(e))
+
+    posts = lablogpost.MultiDataFileUpload(
+                filelist = make_scanner(directory, options),
+                postnames = options.title,
+                posttext = options.text,
+                metadata = options.metadata or None,
+                server_url = options.server,
+                blog_sname = options.blog,
+                username = options.username,
+                section = options.section,
+                uid = options.uid,
+                usefilename = options.use_filename,
+                concurrency = options.concurrency,
+                progress = progress.progress,
+                journal = journal,
+                resume = options.resume and journal != None,
+                cache = cache,
+                retry = lablogretry.RetryPolicy(options.attempts,
+                                    budget = lablogretry.RetryBudget(),
+                                    breaker = lablogretry.CircuitBreaker()),
+                transfer = options.transfer,
+                deadline = options.deadline)
+
+    # Stop starting files on a signal, letting those in progress finish
+    interrupted = []
+    def stop(signum, frame):
+        interrupted.append(signum)
+        posts.cancel()
+
+    handlers = {}
+    if threading.currentThread().getName() == 'MainThread':
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            handlers[signum] = signal.signal(signum, stop)
+
+    progress.write('start', server = options.server, directory = directory,
+                   watch = options.watch)
+    start = time.time()
+    if options.trace:
+        lablogtrace.enable(options.trace)
+    try:
+        # Upload from a thread so that signals are handled while the
+        # main thread waits
+        result = []
+        def upload():
+            try:
+                if watcher:
+                    result.append(posts.doWatch(watcher))
+                else:
+                    result.append(posts.doUpload())
+            except Exception, e:
+                result.append(e)
+
+        thread = threading.Thread(target = upload)
+        thread.setDaemon(True)
+        thread.start()
+        while thread.isAlive():
+            thread.join(0.2)
+        if isinstance(result[0], Exception):
+            raise result[0]
+
+        # A message is returned if there were no files to upload
+        if type(result[0]) == str:
+            data_fail, post_fail, length = 0, 0, 0
+        else:
+            data_fail, post_fail, length = result[0]
+
+    finally:
+        if options.trace:
+            lablogtrace.disable()
+        for signum, handler in handlers.items():
+            signal.signal(signum, handler)
+        if watcher != None:
+            watcher.close()
+        if journal != None:
+            journal.close()
+        if cache != None:
+            cache.close()
+
+    progress.write('done', files = length, data_failed = data_fail,
+                   post_failed = post_fail, interrupted = bool(interrupted),
+                   seconds = round(time.time() - start, 3))
+
+    if interrupted:
+        return EXIT_INTERRUPTED
+    if data_fail or post_fail:
+        return EXIT_FAILURES
+    return EXIT_OK
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level = logging.WARNING)
+    sys.exit(main(sys.argv[1:]))
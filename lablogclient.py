@@ -0,0 +1,270 @@
+# LaBLogClient: Persistent HTTP connections for the LaBLogPost library
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to lablogclient.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Dependencies: The module requires a range of modules from the
+# Python 2.6 standard library.
+
+import time
+import socket
+import httplib
+import urllib2
+import urlparse
+import threading
+import lablogproxy
+import lablogtransport
+from StringIO import StringIO
+
+# Global Variables
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_IDLE_TIMEOUT = 60.0
+
+def set_nodelay(connection):
+    """Disable Nagle's algorithm on a connected HTTP connection
+
+    httplib sends the headers and a file-like body of a request in
+    separate writes. With Nagle's algorithm the body then waits for
+    the server to acknowledge the headers, which a server delaying its
+    ACKs holds back for up to 40ms or more on every request.
+    """
+
+    connection.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+def set_read_timeout(connection, timeout):
+    """Set the timeout for sending and reading on a connection
+
+    Connections are made with their connect timeout, connection.timeout,
+    and then wait for the server for at most connection.read_timeout.
+    """
+
+    connection.read_timeout = timeout
+    if connection.sock:
+        connection.sock.settimeout(timeout)
+
+class HTTPConnection(httplib.HTTPConnection):
+    read_timeout = lablogtransport.DEFAULT_READ_TIMEOUT
+
+    def connect(self):
+        httplib.HTTPConnection.connect(self)
+        set_nodelay(self)
+        set_read_timeout(self, self.read_timeout)
+
+class HTTPSConnection(httplib.HTTPSConnection):
+    read_timeout = lablogtransport.DEFAULT_READ_TIMEOUT
+
+    def connect(self):
+        httplib.HTTPSConnection.connect(self)
+        set_nodelay(self)
+        set_read_timeout(self, self.read_timeout)
+
+class ConnectionPool(object):
+    """A pool of persistent HTTP/1.1 connections to a single host
+
+    Connections are taken from the pool with get() and handed back
+    with put() once their response has been read in full. At most
+    maxsize idle connections are kept, any more are closed when they
+    are returned. Idle connections that have not been used for
+    idle_timeout seconds are closed rather than reused as the server
+    has most likely dropped them. New connections give up connecting
+    after connect_timeout seconds.
+    """
+
+    def __init__(self, scheme, host, maxsize = DEFAULT_POOL_SIZE,
+                 idle_timeout = DEFAULT_IDLE_TIMEOUT,
+                 connect_timeout = lablogtransport.DEFAULT_CONNECT_TIMEOUT):
+        self.scheme = scheme
+        self.host = host
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def new_connection(self):
+        if self.scheme == 'https':
+            return HTTPSConnection(self.host, timeout = self.connect_timeout)
+        else:
+            return HTTPConnection(self.host, timeout = self.connect_timeout)
+
+    def get(self):
+        """Return a connection and whether it has been used before"""
+
+        self.lock.acquire()
+        try:
+            self.evict_idle()
+            if self.idle:
+                connection, last_used = self.idle.pop()
+                return connection, True
+        finally:
+            self.lock.release()
+
+        return self.new_connection(), False
+
+    def put(self, connection):
+        """Return a connection to the pool for reuse"""
+
+        self.lock.acquire()
+        try:
+            self.evict_idle()
+            if len(self.idle) < self.maxsize:
+                self.idle.append((connection, time.time()))
+                return
+        finally:
+            self.lock.release()
+
+        connection.close()
+
+    def evict_idle(self):
+        """Close connections idle for longer than self.idle_timeout
+
+        Must be called with self.lock held.
+        """
+
+        now = time.time()
+        keep = []
+        for connection, last_used in self.idle:
+            if now - last_used > self.idle_timeout:
+                connection.close()
+            else:
+                keep.append((connection, last_used))
+        self.idle = keep
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            for connection, last_used in self.idle:
+                connection.close()
+            self.idle = []
+        finally:
+            self.lock.release()
+
+
+# The response content is read before the connection is returned to
+# the pool, so it is held as a file-like object with the HTTP status
+PooledResponse = lablogtransport.Response
+
+class LaBLogClient(lablogtransport.Transport):
+    """A transport holding a pool of HTTP connections per host
+
+    The client is the default transport for the LaBLog request path
+    so that a batch of requests to the same LaBLog shares a small 
+    number of persistent connections rather than opening a new 
+    connection, and paying a new TCP and proxy handshake, for every
+    request. The client is safe to share between threads.
+
+    Proxies are given as a lablogproxy.ProxyResolver, which may be
+    shared with other clients, or as a dictionary mapping a URL scheme
+    to a proxy URL in the same form as urllib2.ProxyHandler. By default
+    the proxy settings of the environment are used. Proxies are sent
+    any credentials in their URL, and https URLs cannot be requested
+    through a proxy, see lablogproxy.proxy_request. Errors are raised
+    as urllib2.URLError and urllib2.HTTPError exactly as for urlopen.
+
+    Connecting gives up after connect_timeout seconds and a request
+    after waiting read_timeout seconds for the server, or the timeout
+    given to post(), at any point.
+
+    If a request fails on a reused connection because the server has
+    closed it, the request is transparently sent again on a new
+    connection. Failures on new connections and timeouts are raised.
+    """
+
+    def __init__(self, maxsize = DEFAULT_POOL_SIZE,
+                 idle_timeout = DEFAULT_IDLE_TIMEOUT, proxies = None,
+                 connect_timeout = lablogtransport.DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout = lablogtransport.DEFAULT_READ_TIMEOUT):
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        if not isinstance(proxies, lablogproxy.ProxyResolver):
+            proxies = lablogproxy.ProxyResolver(proxies)
+        self.proxies = proxies
+        self.pools = {}
+        self.lock = threading.Lock()
+
+    def get_pool(self, url):
+        """Return the connection pool, request path and headers for a URL
+
+        The headers are those needed by the proxy, if any, for the URL.
+        """
+
+        scheme, netloc, path, query, fragment = urlparse.urlsplit(url)
+        headers = {}
+
+        # Requests through a proxy go to the proxy with the full URL
+        proxy = self.proxies.resolve(url)
+        if proxy:
+            scheme, netloc, path, headers = lablogproxy.proxy_request(url,
+                                                                      proxy)
+        elif query:
+            path = path + '?' + query
+
+        self.lock.acquire()
+        try:
+            if (scheme, netloc) not in self.pools:
+                self.pools[(scheme, netloc)] = ConnectionPool(scheme, netloc,
+                                                      self.maxsize,
+                                                      self.idle_timeout,
+                                                      self.connect_timeout)
+            return self.pools[(scheme, netloc)], path, headers
+
+        finally:
+            self.lock.release()
+
+    def post(self, url, body, headers = None, timeout = None):
+        """Post body to url and return a PooledResponse"""
+
+        if timeout == None:
+            timeout = self.read_timeout
+        pool, path, proxyheaders = self.get_pool(url)
+        requestheaders = self.request_headers(body, headers)
+        requestheaders.update(proxyheaders)
+
+        while True:
+            connection, reused = pool.get()
+            set_read_timeout(connection, timeout)
+            try:
+                connection.request('POST', path, body, requestheaders)
+                response = connection.getresponse()
+                content = response.read()
+                break
+
+            except (socket.error, httplib.HTTPException), e:
+                connection.close()
+
+                # A reused connection may have been closed by the server
+                # while idle so try again on a new connection
+                if reused and not isinstance(e, socket.timeout):
+                    if hasattr(body, 'rewind'):
+                        body.rewind()
+                    continue
+                raise urllib2.URLError(e)
+
+        if response.will_close:
+            connection.close()
+        else:
+            pool.put(connection)
+
+        if response.status >= 400:
+            raise urllib2.HTTPError(url, response.status, response.reason,
+                                    response.msg, StringIO(content))
+
+        return PooledResponse(content, response.status, response.reason,
+                              url)
+
+    def close(self):
+        """Close all idle connections held by the client"""
+
+        self.lock.acquire()
+        try:
+            for pool in self.pools.values():
+                pool.close()
+        finally:
+            self.lock.release()
@@ -0,0 +1,113 @@
+# LaBLogJournal: A resumable upload journal for the LaBLogPost library
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to lablogjournal.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Dependencies: The module requires a range of modules from the
+# Python 2.6 standard library including sqlite3.
+
+import os.path
+import time
+import sqlite3
+import threading
+
+# Global Variables
+
+JOURNAL_FILENAME = '.lablog-journal.sqlite'
+
+# States a file passes through during an upload
+PENDING = 'pending'
+DATA_POSTED = 'data_posted'
+POST_CREATED = 'post_created'
+
+def is_journal_file(filename):
+    """Return True for the journal file and SQLite's own temporary files"""
+
+    return os.path.basename(filename).startswith(JOURNAL_FILENAME)
+
+class UploadJournal(object):
+    """A durable record of the progress of each file in an upload
+
+    The journal is a small SQLite database holding, for each server
+    and file path, the state of the upload of that file: PENDING when
+    the data post has been started, DATA_POSTED with the data_id once
+    the data object exists on the LaBLog and POST_CREATED with the
+    post_id once the post attaching it has been made. Each change is
+    committed before the upload moves on, so after a crash, a network
+    failure or the machine sleeping the journal shows which files have
+    been completed and which only need their post creating.
+
+    The journal may be shared between the threads of a concurrent
+    upload. By default it is kept in the data directory, see
+    for_directory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread = False)
+        self.connection.text_factory = str
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS files (
+                                       server_url TEXT,
+                                       path TEXT,
+                                       state TEXT,
+                                       data_id TEXT,
+                                       post_id TEXT,
+                                       updated REAL,
+                                       PRIMARY KEY (server_url, path))""")
+        self.connection.commit()
+
+    @classmethod
+    def for_directory(cls, directory):
+        """Open the journal kept in a data directory"""
+
+        return cls(os.path.join(directory, JOURNAL_FILENAME))
+
+    def record(self, server_url, path, state, data_id = None,
+               post_id = None):
+        """Record and commit the state of the upload of a file"""
+
+        self.lock.acquire()
+        try:
+            self.connection.execute("""INSERT OR REPLACE INTO files
+                                       VALUES (?, ?, ?, ?, ?, ?)""",
+                                    (server_url, path, state, data_id,
+                                     post_id, time.time()))
+            self.connection.commit()
+        finally:
+            self.lock.release()
+
+    def get(self, server_url, path):
+        """Return (state, data_id, post_id) for a file or None"""
+
+        self.lock.acquire()
+        try:
+            return self.connection.execute("""SELECT state, data_id, post_id
+                                              FROM files WHERE
+                                              server_url = ? AND path = ?""",
+                                           (server_url, path)).fetchone()
+        finally:
+            self.lock.release()
+
+    def count(self, server_url, state):
+        """Return the number of files in a state for a server"""
+
+        self.lock.acquire()
+        try:
+            return self.connection.execute("""SELECT COUNT(*) FROM files
+                                              WHERE server_url = ? AND
+                                              state = ?""",
+                                           (server_url, state)).fetchone()[0]
+        finally:
+            self.lock.release()
+
+    def close(self):
+        self.lock.acquire()
+        try:
+            self.connection.close()
+        finally:
+            self.lock.release()
@@ -0,0 +1,442 @@
+# LaBLogMock: A local stand-in for the LaBLog REST API
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to lablogmock.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Dependencies: The module requires a range of modules from the
+# Python 2.6 standard library.
+#
+# Usage: python lablogmock.py [--port PORT] [--latency S] [--error-rate P]
+#                             [--reset-rate P] [--bandwidth BYTES/S]
+
+import re
+import sys
+import cgi
+import json
+import time
+import base64
+import hashlib
+import binascii
+import random
+import socket
+import struct
+import tempfile
+import threading
+import optparse
+import SocketServer
+import BaseHTTPServer
+from StringIO import StringIO
+from xml.etree import ElementTree as ET
+from xml.parsers import expat
+
+# Global Variables
+
+BLOCK_SIZE = 65536
+RESPONSE = ('<response><status_code>%s</status_code>'
+            '<success>%s</success>%s</response>')
+
+class RequestParser(object):
+    """Parses the XML of a request, decoding inline data as it goes
+
+    The XML is read from a file a block at a time and built into an
+    element with ElementTree's TreeBuilder, except that the base64 
+    text of a dataitem is decoded as it arrives into a temporary file,
+    self.data, and left out of the element. A large inline data post 
+    is then received in constant memory, as multipart data is by cgi.
+    Invalid base64 raises TypeError, as base64.standard_b64decode 
+    does, and invalid XML expat.ExpatError.
+    """
+
+    def __init__(self):
+        self.builder = ET.TreeBuilder()
+        self.parser = expat.ParserCreate()
+        self.parser.returns_unicode = False
+        self.parser.StartElementHandler = self.start
+        self.parser.EndElementHandler = self.end
+        self.parser.CharacterDataHandler = self.text
+        self.data = None
+        self.decoding = False
+        self.pending = ''
+
+    def parse(self, requestfile):
+        """Return the request element of the XML in requestfile"""
+
+        while True:
+            block = requestfile.read(BLOCK_SIZE)
+            self.parser.Parse(block, not block)
+            if not block:
+                return self.builder.close()
+
+    def start(self, tag, attributes):
+        self.builder.start(tag, attributes)
+        if tag == 'dataitem' and 'part' not in attributes:
+            self.data = tempfile.TemporaryFile()
+            self.decoding = True
+
+    def text(self, text):
+        if not self.decoding:
+            self.builder.data(text)
+            return
+
+        # Decode whole groups of four characters, keeping the rest
+        self.pending += ''.join(text.split())
+        usable = len(self.pending) - len(self.pending) % 4
+        self.data.write(base64.standard_b64decode(self.pending[:usable]))
+        self.pending = self.pending[usable:]
+
+    def end(self, tag):
+        if self.decoding and tag == 'dataitem':
+            self.decoding = False
+            self.data.write(base64.standard_b64decode(self.pending))
+            self.pending = ''
+        self.builder.end(tag)
+
+
+class MockLaBLogApp(object):
+    """The LaBLog API calls answered by MockLaBLog, without a server
+
+    dispatch() answers the adddata and addpost API calls as the
+    LaBLog would, with an XML response giving the status_code and 
+    success of the request and the data_id, or the post_id and 
+    post_info, of what was created. The getcatalogue call is answered
+    with self.catalogue, a dictionary with the 'blogs', 'usernames' and
+    'metadata' of a lablogcatalogue.ServerCatalogue entry, or refused
+    if that is None, and with a status_code of 304 if the request
+    carries the current etag. The catalogues sent are counted in 
+    self.catalogues_sent. Requests the LaBLog would reject
+    are answered with a status_code of 400, and multipart transfers of
+    raw file data with 415 when multipart is False. Responses to adddata
+    give the size of the data stored, and say that multipart transfers
+    are accepted unless multipart is False. It can be used 
+    directly as the handler of a lablogtransport.InMemoryTransport.
+
+    Each response is delayed by latency seconds. A fraction error_rate
+    of requests are answered with an HTTP 503 error and a fraction 
+    reset_rate have their connection reset. Setting seed makes the
+    choice of failing requests repeatable.
+
+    The data posted is recorded in self.datasets, a dictionary from
+    data ID to (title, filename, size), and the posts in self.posts, a
+    dictionary from post ID to (title, attached data IDs).
+    """
+
+    def __init__(self, url = 'http://lablog', latency = 0, error_rate = 0,
+                 reset_rate = 0, multipart = True, seed = None):
+        self.url = url
+        self.latency = latency
+        self.error_rate = error_rate
+        self.reset_rate = reset_rate
+        self.multipart = multipart
+        self.random = random.Random(seed)
+        self.datasets = {}
+        self.posts = {}
+        self.requests = 0
+        self.catalogue = None
+        self.catalogues_sent = 0
+        self.lock = threading.Lock()
+
+    def dispatch(self, path, headers, body):
+        """Answer a request returning (HTTP status, content)
+
+        Headers are the request headers, which must be accessible by
+        lower case name, and body a file holding the request body.
+        Returns None if the connection should be reset.
+        """
+
+        match = re.match('/api/rest/(adddata|addpost|getcatalogue)'
+                         '/uid/[^/?]*$', path)
+        if not match:
+            return 404, ''
+
+        self.count_request()
+
+        if self.chance(self.reset_rate):
+            return None
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        if self.chance(self.error_rate):
+            return 503, RESPONSE % ('503', 'false', '')
+
+        try:
+            form = cgi.FieldStorage(fp = body, headers = headers,
+                                    environ = {'REQUEST_METHOD' : 'POST'})
+            item = form['request']
+            if isinstance(item, list):
+                item = item[0]
+            if item.file == None:
+                item.file = StringIO(item.value)
+            parser = RequestParser()
+            request = parser.parse(item.file)
+        except (KeyError, TypeError, binascii.Error, expat.ExpatError):
+            return 200, RESPONSE % ('400', 'false', '')
+
+        if match.group(1) == 'adddata':
+            return 200, self.handle_data(request, form, parser.data)
+        elif match.group(1) == 'getcatalogue':
+            return 200, self.handle_catalogue(request)
+        else:
+            return 200, self.handle_post(request)
+
+    def handle_data(self, request, form, data):
+        title = request.findtext('title')
+        dataitem = request.find('data/dataitem')
+        if not title or dataitem == None:
+            return RESPONSE % ('400', 'false', '')
+
+        # The data is either a separate part or base64 encoded inline
+        part = dataitem.get('part')
+        if part != None:
+            if not self.multipart:
+                return RESPONSE % ('415', 'false', '')
+            if part not in form or form[part].file == None:
+                return RESPONSE % ('400', 'false', '')
+            form[part].file.seek(0, 2)
+            size = form[part].file.tell()
+        else:
+            if data == None:
+                return RESPONSE % ('400', 'false', '')
+            size = data.tell()
+
+        data_id = self.add_data(title, dataitem.get('filename'), size)
+        stored = '<data_id>' + data_id + '</data_id><size>%d</size>' % size
+        if self.multipart:
+            stored += '<multipart>true</multipart>'
+        return RESPONSE % ('200', 'true', stored)
+
+    def handle_post(self, request):
+        title = request.findtext('title')
+        attached = [data.text for data in
+                    request.findall('attached_data/data')]
+        post_id = None
+        if title:
+            post_id = self.add_post(title, attached)
+        if post_id == None:
+            return RESPONSE % ('400', 'false', '')
+
+        return RESPONSE % ('200', 'true',
+                           '<post_id>' + post_id + '</post_id>' +
+                           '<post_info>' + self.url + '/post/' + post_id +
+                           '.xml</post_info>')
+
+    def handle_catalogue(self, request):
+        if self.catalogue == None:
+            return RESPONSE % ('404', 'false', '')
+
+        etag = hashlib.sha1(json.dumps(self.catalogue,
+                                       sort_keys = True)).hexdigest()
+        if request.findtext('etag') == etag:
+            return RESPONSE % ('304', 'true', '')
+
+        catalogue = ET.Element('catalogue', etag = etag)
+        for sname, sections in self.catalogue.get('blogs', []):
+            blog = ET.SubElement(catalogue, 'blog', sname = sname)
+            for section in sections:
+                ET.SubElement(blog, 'section').text = section
+        for username in self.catalogue.get('usernames', []):
+            ET.SubElement(catalogue, 'username').text = username
+        for key, values in self.catalogue.get('metadata', []):
+            metadata = ET.SubElement(catalogue, 'metadata', key = key)
+            for value in values:
+                ET.SubElement(metadata, 'value').text = value
+
+        self.lock.acquire()
+        self.catalogues_sent += 1
+        self.lock.release()
+        return RESPONSE % ('200', 'true', ET.tostring(catalogue))
+
+    def chance(self, rate):
+        """Return True with probability rate"""
+
+        if not rate:
+            return False
+        self.lock.acquire()
+        try:
+            return self.random.random() < rate
+        finally:
+            self.lock.release()
+
+    def count_request(self):
+        self.lock.acquire()
+        self.requests += 1
+        self.lock.release()
+
+    def add_data(self, title, filename, size):
+        self.lock.acquire()
+        try:
+            data_id = str(len(self.datasets) + 1)
+            self.datasets[data_id] = (title, filename, size)
+            return data_id
+        finally:
+            self.lock.release()
+
+    def add_post(self, title, attached):
+        """Record a post, returning None if attached data is unknown"""
+
+        self.lock.acquire()
+        try:
+            for data_id in attached:
+                if data_id not in self.datasets:
+                    return None
+            post_id = str(len(self.posts) + 1)
+            self.posts[post_id] = (title, attached)
+            return post_id
+        finally:
+            self.lock.release()
+
+
+class MockLaBLogHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Request handler passing requests to the MockLaBLog"""
+
+    protocol_version = 'HTTP/1.1'
+
+    # Buffer each response so it is sent with a single write
+    wbufsize = -1
+
+    def setup(self):
+        BaseHTTPServer.BaseHTTPRequestHandler.setup(self)
+        self.server.connections.add(self.connection)
+
+    def finish(self):
+        self.server.connections.discard(self.connection)
+        BaseHTTPServer.BaseHTTPRequestHandler.finish(self)
+
+    def do_POST(self):
+        result = self.server.dispatch(self.path, self.headers,
+                                      self.read_body())
+        if result == None:
+            self.reset()
+            return
+
+        status, content = result
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def read_body(self):
+        """Read the request body, no faster than the bandwidth cap
+
+        The body is spooled to a temporary file which is returned.
+        """
+
+        remaining = int(self.headers.get('Content-Length', 0))
+        body = tempfile.TemporaryFile()
+        received = 0
+        start = time.time()
+        while remaining > 0:
+            block = self.rfile.read(min(remaining, BLOCK_SIZE))
+            if not block:
+                break
+            body.write(block)
+            remaining -= len(block)
+            received += len(block)
+
+            if self.server.bandwidth:
+                delay = (start + received / float(self.server.bandwidth) -
+                         time.time())
+                if delay > 0:
+                    time.sleep(delay)
+
+        body.seek(0)
+        return body
+
+    def reset(self):
+        """Drop the connection with a TCP reset"""
+
+        self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER,
+                                   struct.pack('ii', 1, 0))
+        self.close_connection = 1
+
+    def log_message(self, *args):
+        pass
+
+
+class MockLaBLog(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer,
+                 MockLaBLogApp):
+    """A local LaBLog server keeping the objects posted in memory
+
+    The server answers the adddata and addpost API calls at self.url
+    as described for MockLaBLogApp, so that uploads can be tested and
+    measured without a real LaBLog. In addition request bodies are read
+    at no more than bandwidth bytes per second.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    # Accept bursts of connections from concurrent clients
+    request_queue_size = 128
+
+    def __init__(self, port = 0, host = '127.0.0.1', latency = 0,
+                 error_rate = 0, reset_rate = 0, bandwidth = None,
+                 multipart = True, seed = None):
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port),
+                                           MockLaBLogHandler)
+        MockLaBLogApp.__init__(self, 'http://%s:%d' % (host,
+                                                       self.server_port),
+                               latency, error_rate, reset_rate, multipart,
+                               seed)
+        self.bandwidth = bandwidth
+        self.connections = set()
+
+    def start(self):
+        """Serve requests from a background thread"""
+
+        thread = threading.Thread(target = self.serve_forever)
+        thread.setDaemon(True)
+        thread.start()
+
+    def stop(self):
+        """Stop serving and close any connections kept alive"""
+
+        self.shutdown()
+        self.server_close()
+        for connection in list(self.connections):
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+
+def main(args):
+    parser = optparse.OptionParser(usage = '%prog [options]')
+    parser.add_option('--host', default = '127.0.0.1',
+                      help = 'address to listen on [%default]')
+    parser.add_option('--port', type = 'int', default = 8080,
+                      help = 'port to listen on [%default]')
+    parser.add_option('--latency', type = 'float', default = 0,
+                      help = 'seconds added to each response [%default]')
+    parser.add_option('--error-rate', type = 'float', default = 0,
+                      help = 'fraction of requests answered with HTTP '
+                             '503 [%default]')
+    parser.add_option('--reset-rate', type = 'float', default = 0,
+                      help = 'fraction of connections reset [%default]')
+    parser.add_option('--bandwidth', type = 'int',
+                      help = 'maximum upload rate in bytes per second')
+    parser.add_option('--no-multipart', action = 'store_false',
+                      dest = 'multipart', default = True,
+                      help = 'refuse multipart transfers of file data')
+    parser.add_option('--seed', type = 'int',
+                      help = 'seed for choosing failed requests')
+    options, arguments = parser.parse_args(args)
+
+    server = MockLaBLog(options.port, options.host, options.latency,
+                        options.error_rate, options.reset_rate,
+                        options.bandwidth, options.multipart, options.seed)
+    print 'Mock LaBLog serving at ' + server.url
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
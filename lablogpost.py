@@ -16,56 +16,246 @@
 # http://chemtools.chem.soton.ac.uk/wiki/index.php?title=Blog:API_REST
 
 import os.path
+import sys
+import csv
 import base64
-import unittest
+import uuid
+import Queue
+import threading
 import urllib2
-import urllib
-import socket
 import logging
+import lablogproxy
+import lablogclient
+import lablogjournal
+import lablogretry
+import lablogtrace
 from xml.etree import ElementTree as ET
+from xml.sax import saxutils
 
 # Global Variables
 
 MAX_MEM = 50000
+CHUNK_SIZE = 3 * 16384 # Must be a multiple of 3, see b64encode_file
 DEFAULT_URL = 'http://biolab.isis.rl.ac.uk'
 DEFAULT_UID = '' 
 DEFAULT_USERNAME = ''
 
-socket.setdefaulttimeout(10)
+# Known proxies for set_proxy
+PROXIES = {'none': {},
+           'ral' : {'http' : 'http://wwwcache.rl.ac.uk:8080'}
+          }
+
+# Network errors and unreadable files or server responses
+REQUEST_ERRORS = (EnvironmentError, SyntaxError)
+
+# Ways of sending the contents of a file in a data post, see LaBLogData
+TRANSFER_INLINE = 'inline'
+TRANSFER_MULTIPART = 'multipart'
+
+# Status codes with which a server refuses multipart transfers
+MULTIPART_REFUSED = ['415', '501']
+
+# Slowest rate, in bytes per second, at which a data post is expected
+# to be sent and processed, see upload_timeout
+UPLOAD_RATE = 32768
+
+_default_client = None
+_proxy_resolver = lablogproxy.ProxyResolver()
+_inline_only_servers = set()
+_multipart_servers = set()
 
 def set_proxy(boolean, proxy = 'ral'):
     """Method for setting up proxy arrangements
 
     Default proxy is currently for RAL which is one of the few
-    places where this will actually be needed.
+    places where this will actually be needed. Setting False connects
+    directly and None returns to the proxy settings of the environment,
+    which are used until set_proxy is called. Nothing is looked up 
+    until the next request; use check_server to test the connection.
     """
 
-    assert type(boolean) == bool, 'Allowed arguments are True and False'
-
-    proxies = {'none': {},
-               'ral' : {'http' : 'http://wwwcache.rl.ac.uk:8080'}
-              }
+    assert boolean in (True, False, None), \
+                     'Allowed arguments are True, False and None'
 
     if boolean == True:
-        # If the method is called to setup proxies
-        # Setup proxy handler and then install an opener for use
-        assert proxy in proxies, 'No information for that proxy'
-        proxy_support = urllib2.ProxyHandler(proxies[proxy])
-        urllib2.install_opener(urllib2.build_opener(proxy_support))
+        assert proxy in PROXIES, 'No information for that proxy'
+        _proxy_resolver.set_proxies(PROXIES[proxy])
 
     elif boolean == False:
-        # If the method is called to remove proxies 
-        # Set up as empty
-        proxy_support = urllib2.ProxyHandler(proxies['none'])
-        urllib2.install_opener(urllib2.build_opener(proxy_support))
-        
+        _proxy_resolver.set_proxies(PROXIES['none'])
+
+    else:
+        _proxy_resolver.set_proxies(None)
+
+def check_server(url = DEFAULT_URL, 
+                 timeout = lablogproxy.DEFAULT_CHECK_TIMEOUT):
+    """Return whether the LaBLog at url can be reached
+
+    The check uses the proxy arrangements of set_proxy and gives up
+    after timeout seconds.
+    """
+
+    return _proxy_resolver.check(url, timeout)
+
+def upload_timeout(client, length):
+    """Return the timeout for a data post with a body of length bytes
+
+    The timeout is the read timeout of client plus the time the body
+    takes at UPLOAD_RATE, so that the server has longer to take and
+    store large files than to answer small requests.
+    """
+
+    return client.read_timeout + float(length) / UPLOAD_RATE
+
+def default_client():
+    """Return the transport used for LaBLog requests by default
+
+    Unless one has been set with set_default_client this is a 
+    lablogclient.LaBLogClient, created on first use, that keeps a pool
+    of persistent connections to each LaBLog server and uses the 
+    proxy arrangements of set_proxy.
+    """
+
+    global _default_client
+    if _default_client == None:
+        _default_client = lablogclient.LaBLogClient(
+                                              proxies = _proxy_resolver)
+    return _default_client
+
+def set_default_client(client):
+    """Set the transport used for LaBLog requests by default
+
+    Client is any lablogtransport.Transport, for example a
+    lablogtransport.Urllib2Transport to send each request with 
+    urllib2, or None to return to the default LaBLogClient.
+    """
+
+    global _default_client
+    if _default_client != None and _default_client != client:
+        _default_client.close()
+    _default_client = client
+
+def b64encode_file(path, chunksize = CHUNK_SIZE):
+    """Generator yielding the base64 encoding of a file in chunks
+
+    The file is read chunksize bytes at a time and each chunk is
+    encoded as it is read so only one chunk is ever held in memory.
+    Because chunksize is a multiple of three only the final chunk
+    carries any padding, which means the encoded chunks can simply be
+    concatenated, or written out one after another, to give exactly
+    the encoding of the whole file.
+    """
+
+    assert chunksize % 3 == 0, 'Chunk size must be a multiple of 3'
+
+    f = open(path, 'rb')
     try:
-        f = urllib2.urlopen('http://google.com')
-        assert f.read(21) == '<!doctype html><html>'
-        return True
+        while True:
+            chunk = f.read(chunksize)
+            if not chunk:
+                break
+            yield base64.standard_b64encode(chunk)
 
-    except urllib2.URLError:
-        return False
+    finally:
+        f.close()
+
+def read_file(path, chunksize = CHUNK_SIZE):
+    """Generator yielding the contents of a file in chunks"""
+
+    f = open(path, 'rb')
+    try:
+        while True:
+            chunk = f.read(chunksize)
+            if not chunk:
+                break
+            yield chunk
+
+    finally:
+        f.close()
+
+def b64encoded_size(size):
+    """Return the length of the base64 encoding of size bytes"""
+
+    return 4 * ((size + 2) // 3)
+
+class StreamingBody(object):
+    """A file-like HTTP request body that is generated chunk by chunk
+
+    The body is described by chunks, a callable returning an iterator
+    over the strings that make up the body, and its total length which
+    must be known in advance so that it can be sent as the 
+    Content-Length. urllib2 and httplib send any data object that 
+    provides read() in blocks, taking the Content-Length from len(), so
+    at most one chunk of the body is held in memory at a time. Calling
+    rewind() restarts the body from the beginning so that the same 
+    request can be sent again.
+    """
+
+    def __init__(self, chunks, length, content_type):
+        self.chunks = chunks
+        self.length = length
+        self.content_type = content_type
+        self.rewind()
+
+    def __len__(self):
+        return self.length
+
+    def rewind(self):
+        self.iterator = iter(self.chunks())
+        self.buffer = ''
+
+    def read(self, size = -1):
+        # Collect chunks until the request can be satisfied
+        while size < 0 or len(self.buffer) < size:
+            try:
+                self.buffer += self.iterator.next()
+            except StopIteration:
+                break
+
+        if size < 0 or size >= len(self.buffer):
+            data, self.buffer = self.buffer, ''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+def multipart_body(fields):
+    """Build a StreamingBody for a multipart/form-data request
+
+    Fields is a list of (name, chunks, length) tuples where chunks is a
+    callable returning an iterator over the strings making up the value
+    of the field and length is their total length. Unlike urlencoding
+    a form, multipart encoding sends values unaltered so the '+', '/' 
+    and '=' characters of base64 data cost one byte each on the wire.
+    A field given as (name, chunks, length, filename) is sent as a file
+    upload of binary data.
+    """
+
+    boundary = 'LaBLogBoundary' + uuid.uuid4().hex
+
+    headers = []
+    length = len('--' + boundary + '--\r\n')
+    for field in fields:
+        name, chunks, fieldlength = field[:3]
+        header = ('--' + boundary + '\r\n' +
+                  'Content-Disposition: form-data; name="' + name + '"')
+        if len(field) > 3:
+            header += ('; filename="' + field[3] + '"\r\n' +
+                       'Content-Type: application/octet-stream')
+        header += '\r\n\r\n'
+        headers.append(header)
+        length += len(header) + fieldlength + len('\r\n')
+
+    def chunks():
+        for header, field in zip(headers, fields):
+            fieldchunks = field[1]
+            yield header
+            for chunk in fieldchunks():
+                yield chunk
+            yield '\r\n'
+        yield '--' + boundary + '--\r\n'
+
+    return StreamingBody(chunks, length, 
+                         'multipart/form-data; boundary=' + boundary)
 
 class LaBLogObject(dict):
     """A subclass of dictionary representing LaBLog Objects
@@ -87,6 +277,67 @@ class LaBLogObject(dict):
             return
 
         self.title = title
+
+    def request(self, requesturl, body, client = None, retry = None,
+                timeout = None, deadline = None):
+        """Send a request body to the LaBLog and parse the response
+
+        The request is made with client, a lablogtransport.Transport,
+        by default the one returned by default_client(), and waits for 
+        the LaBLog for timeout seconds, by default the read timeout of
+        client. If retry, a lablogretry.RetryPolicy, is given failed
+        requests, including those the LaBLog answers with a 5xx status
+        code, are retried according to the policy. If deadline, a 
+        lablogretry.Deadline, is given no attempt runs past it. The 
+        LaBLog status code is stored in self.post_status_code and the
+        parsed response returned.
+        """
+
+        if client == None:
+            client = default_client()
+
+        if timeout == None:
+            timeout = client.read_timeout
+
+        if retry == None:
+            return self.sendRequest(requesturl, body, client, timeout,
+                                    deadline)
+
+        return retry.call(self.sendRequest, (requesturl, body, client,
+                                             timeout, deadline),
+                          retry_result = lambda parsedresponse:
+                                   self.post_status_code.startswith('5'))
+
+    def sendRequest(self, requesturl, body, client, timeout, 
+                    deadline = None):
+        """Make a single attempt at a request for request()"""
+
+        if deadline != None:
+            timeout = deadline.limit(timeout)
+
+        # Start the body from the beginning for a retry
+        if hasattr(body, 'rewind'):
+            body.rewind()
+
+        span = lablogtrace.span(type(self).__name__, url = requesturl,
+                                bytes = len(body))
+        try:
+            response = client.post(requesturl, body, timeout = timeout)
+            parsedresponse = self.readResponse(response)
+        except Exception, e:
+            span.finish(error = e)
+            raise
+        span.finish(status = self.post_status_code)
+        return parsedresponse
+
+    def readResponse(self, response):
+        """Parse a response from the LaBLog and get the status code"""
+
+        parsedresponse = ET.parse(response)
+        self.post_status_code = parsedresponse.find('status_code').text
+        self.post_response = response.read(100)
+
+        return parsedresponse
         
 
 class LaBLogData(LaBLogObject):
@@ -108,6 +359,18 @@ class LaBLogData(LaBLogObject):
     of the required entities in the form of a dictionary or as arguments
     filename and title. Variables self.main defaults to '1' and self.type 
     defaults to 'local', which is the only method currently implemented.
+
+    Files larger than MAX_MEM are not read into self.data. Instead the
+    path is held in self.datapath and the encoded data is produced in
+    chunks by iter_data() when it is needed, so memory use does not
+    grow with the size of the file.
+
+    By default (TRANSFER_INLINE) the file is sent base64 encoded as the
+    text of the <dataitem> element. With self.transfer set to 
+    TRANSFER_MULTIPART the raw bytes of the file are instead streamed 
+    from disk as a separate 'datafile' part of the multipart request,
+    which the <dataitem> names in its 'part' attribute, avoiding the
+    third added by base64 and the time spent encoding and decoding.
     """
 
     def __init__(self, filename = None, title = None):
@@ -115,11 +378,13 @@ class LaBLogData(LaBLogObject):
         self.type = None
         self.main = '1'
         self.data = None
+        self.datapath = None
         self.filename = filename
         self.url = None
         self.title = title
         self.etree = ET.ElementTree()
         self.postxml = None
+        self.transfer = TRANSFER_INLINE
 
     def set_type(self, locationtype):
         if type(locationtype) != str:
@@ -132,7 +397,15 @@ class LaBLogData(LaBLogObject):
             raise ValueError('Type must be one "inline", "url", or "local"')
 
 
-    def set_data(self, filename, dir=None, usefilename=True):
+    def set_data(self, filename, dir=None, usefilename=True, stream=None):
+        """Method for setting the file to be posted as data
+
+        By default files of up to MAX_MEM bytes are encoded straight
+        away and held in self.data while larger files are streamed,
+        that is only their path is recorded and they are encoded chunk
+        by chunk by iter_data() at posting time. Setting stream to True
+        or False overrides this choice.
+        """
 
         # If filename looks like a full or relative path
         if os.path.split(filename) != filename:
@@ -170,16 +443,36 @@ class LaBLogData(LaBLogObject):
         else:
             self.ext = None
 
-        # Open and encode the file
-        f = open(fullpath)
-        # TODO:should possibly append file in chunks?
-        # Add base64 encoded file to data object
-        self.data = base64.standard_b64encode(f.read(MAX_MEM))
+        # Decide whether to hold the encoded file in memory
+        self.datapath = fullpath
+        if stream == None:
+            stream = os.path.getsize(fullpath) > MAX_MEM
+
+        # Either leave encoding to iter_data or add the base64 
+        # encoded file to the data object now
+        if stream:
+            self.data = None
+        else:
+            self.data = ''.join(b64encode_file(fullpath))
 
         # If usefilename = True then set title to be the filename
         if usefilename == True:
             self.set_title(filename.split('.')[0])
 
+    def iter_data(self):
+        """Generator yielding the base64 encoded data in chunks
+
+        If the data is held in memory it is yielded as a single chunk,
+        otherwise the file at self.datapath is encoded as it is read.
+        """
+
+        if self.data != None:
+            yield self.data
+
+        else:
+            assert self.datapath != None, 'No data has been set'
+            for chunk in b64encode_file(self.datapath):
+                yield chunk
 
     def serialize(self):
         """Method for serializing the datapost object
@@ -194,13 +487,28 @@ class LaBLogData(LaBLogObject):
         The init method takes a dictionary and returns the ElementTree object 
         ready for conversion to an XML file for posting.
         """
-        # Test for presence of required elements in the data object
         assert self.postxml == None
+
+        dataset = self.build_dataset(''.join(self.iter_data()))
+        self.etree._setroot(dataset)
+        self.postxml = ET.tostring(dataset)
+
+    def build_dataset(self, text, part = None):
+        """Method for building the <dataset> element for serialization
+
+        Checks that the required elements are present and returns the
+        <dataset> Element with text as the content of the data item, or
+        if part is given with the data item referring to the request
+        part of that name.
+        """
+
+        # Test for presence of required elements in the data object
         assert self.title != None and type(self.title) == str
         assert self.filename != None and type(self.filename) == str
         assert self.ext != None and type(self.ext) == str
         assert self.main == '1'
-        assert self.data != None and type(self.data) == str
+        assert ((self.data != None and type(self.data) == str) or
+                self.datapath != None)
 
         # Create the <post> element as a subelement of the root
         dataset = ET.Element("dataset")
@@ -214,16 +522,63 @@ class LaBLogData(LaBLogObject):
             dataitem.set('filename', self.filename)
             dataitem.set('ext', self.ext)
             dataitem.set('main', self.main)
-            # Assumes an incoming base64 encoded string
-            dataitem.text = self.data
+            if part != None:
+                dataitem.set('part', part)
+            else:
+                # Assumes an incoming base64 encoded string
+                dataitem.text = text
 
         # TODO: setup for online files
 
-        self.etree._setroot(dataset)
-        self.postxml = ET.tostring(dataset)
-        
+        return dataset
+
+    def serialize_body(self):
+        """Method for serializing the data object as a request body
+
+        Returns a StreamingBody that writes the <dataset> XML envelope
+        around the encoded data as it is read, so that the XML for the
+        whole file is never built in memory. The envelope is generated
+        by ElementTree around a placeholder and then split, so the XML 
+        sent is identical to that produced by serialize().
+        """
+
+        placeholder = 'LaBLogDataPlaceholder'
+        envelope = ET.tostring(self.build_dataset(placeholder))
+        head, tail = envelope.rsplit(placeholder, 1)
 
-    def doPost(self, url=DEFAULT_URL, uid=DEFAULT_UID):
+        if self.data != None:
+            datalength = len(self.data)
+        else:
+            datalength = b64encoded_size(os.path.getsize(self.datapath))
+
+        def chunks():
+            yield head
+            for chunk in self.iter_data():
+                yield chunk
+            yield tail
+
+        return multipart_body([('request', chunks, 
+                                len(head) + datalength + len(tail))])
+
+    def serialize_multipart_body(self):
+        """Method for serializing the data object with raw file data
+
+        Returns a StreamingBody holding the <dataset> XML as the 
+        'request' part and the unencoded contents of the file at 
+        self.datapath, read as the body is sent, as the 'datafile' part.
+        """
+
+        assert self.datapath != None, 'Multipart transfer needs a file'
+
+        request = ET.tostring(self.build_dataset(None, 'datafile'))
+        return multipart_body([('request', lambda: [request], len(request)),
+                               ('datafile', 
+                                lambda: read_file(self.datapath),
+                                os.path.getsize(self.datapath),
+                                self.filename)])
+
+    def doPost(self, url=DEFAULT_URL, uid=DEFAULT_UID, client=None,
+               retry=None, deadline=None):
         """Method for posting the data object. Returns the post ID.
 
         doPost checks that required information is present and then
@@ -232,8 +587,53 @@ class LaBLogData(LaBLogObject):
         self.returned_post_status. XML is not generated until this 
         function is called as this is the first point where the 
         presence of all the required objects is explicitly tested.
+        The request is made with client, retried according to retry 
+        and limited by deadline as described for request(). Its 
+        timeout grows with the size of the data, see upload_timeout.
+
+        Multipart transfers are only made to servers that have said
+        they accept them in an earlier response. If a multipart
+        transfer is refused by the server with one of the
+        MULTIPART_REFUSED status codes, or the server stores fewer
+        bytes than the file holds, the data is sent again inline, and
+        inline transfers are used for that server from then on.
         """
 
+        self.checkPost()
+        requesturl = url + '/api/rest/adddata/uid/' + uid
+        parsedresponse = None
+        if client == None:
+            client = default_client()
+
+        # Try sending the file unencoded if the server may accept it
+        if self.useMultipart(url):
+            body = self.serialize_multipart_body()
+            try:
+                parsedresponse = self.request(requesturl, body, client, 
+                                    retry, upload_timeout(client, len(body)),
+                                    deadline)
+            except urllib2.HTTPError, e:
+                if str(e.code) not in MULTIPART_REFUSED:
+                    raise
+                self.post_status_code = str(e.code)
+
+            if not self.acceptedMultipart(parsedresponse):
+                self.refuseMultipart(url)
+                parsedresponse = None
+
+        # Otherwise serialize the data object as a streamed request body
+        if parsedresponse == None:
+            body = self.serialize_body()
+            parsedresponse = self.request(requesturl, body, client, retry,
+                                          upload_timeout(client, len(body)),
+                                          deadline)
+
+        self.noteServer(url, parsedresponse)
+        return self.postResult(parsedresponse)
+
+    def checkPost(self):
+        """Check that the data object is ready to post"""
+
         # Check that self.posted is False
         assert self.posted == False
 
@@ -242,27 +642,62 @@ class LaBLogData(LaBLogObject):
         assert self.type != None and type(self.type) == str
 
         if self.type == 'inline':
-            assert self.data != None and type(self.data) == str
+            assert ((self.data != None and type(self.data) == str) or
+                    self.datapath != None)
 
         if self.type == 'url': # TODO actually implement url method
             assert self.dataurl != None and type(self.dataurl) == str
-            
-        # Serialize the data object to generate the data post XML
-        self.serialize()
 
-        # Set up the Request object
-        requesturl = url + '/api/rest/adddata/uid/' + uid
-        request = urllib.urlencode({'request':self.postxml})
-        post = urllib2.Request(requesturl, data=request)
+    def useMultipart(self, url):
+        """Return whether to try a multipart transfer to url"""
 
-        response = urllib2.urlopen(post)
-              
-        # Parse the response and get the status code
-        parsedresponse = ET.parse(response)
-        statuscode = parsedresponse.find('status_code').text
+        return (self.transfer == TRANSFER_MULTIPART and 
+                self.datapath != None and url in _multipart_servers and
+                url not in _inline_only_servers)
+
+    def acceptedMultipart(self, parsedresponse):
+        """Return whether the server took the whole of a multipart transfer
+
+        The transfer was not accepted if the server refused it with one
+        of the MULTIPART_REFUSED status codes, or if it succeeded but
+        the size the server gives for the data differs from the size
+        of the file.
+        """
+
+        if self.post_status_code in MULTIPART_REFUSED:
+            return False
+        if (self.post_status_code != '200' or 
+            parsedresponse.findtext('success') != 'true'):
+            return True
+
+        size = parsedresponse.findtext('size')
+        if size == str(os.path.getsize(self.datapath)):
+            return True
+        logging.warning('Multipart transfer of ' + self.datapath + 
+                        ' stored as ' + str(size) + ' bytes with data ID ' +
+                        str(parsedresponse.findtext('data_id')))
+        return False
+
+    def noteServer(self, url, parsedresponse):
+        """Remember whether the server at url accepts multipart transfers"""
+
+        if (parsedresponse.findtext('multipart') == 'true' and
+            url not in _inline_only_servers):
+            _multipart_servers.add(url)
+
+    def refuseMultipart(self, url):
+        """Use inline transfers for url from now on"""
+
+        logging.info('Multipart transfer refused by ' + url +
+                     ', sending data inline')
+        _inline_only_servers.add(url)
+        _multipart_servers.discard(url)
+
+    def postResult(self, parsedresponse):
+        """Return the data ID from a parsed response, or False"""
+
+        statuscode = self.post_status_code
         success = parsedresponse.find('success').text
-        self.post_status_code = statuscode
-        self.post_response = response.read(100)
 
         # If statuscode is ok then return the post ID
         if success == 'true' and statuscode == '200':
@@ -443,9 +878,22 @@ class LaBLogPost(LaBLogObject):
         # Clean up and put the ElementTree and XML post in the right places
         self.etree._setroot(post)
         self.postxml = ET.tostring(post)
+
+    def serialize_body(self):
+        """Method for serializing the post object as a request body
+
+        Returns a StreamingBody holding the post XML as the request
+        field of a multipart/form-data request.
+        """
+
+        self.serialize()
+        postxml = self.postxml
+        return multipart_body([('request', lambda: [postxml], 
+                                len(postxml))])
         
 
-    def doPost(self, url=DEFAULT_URL, uid=DEFAULT_UID):
+    def doPost(self, url=DEFAULT_URL, uid=DEFAULT_UID, client=None,
+               retry=None, deadline=None):
         """Method for posting the Post object. Returns the post ID.
 
         doPost checks that required information is present and then
@@ -453,37 +901,41 @@ class LaBLogPost(LaBLogObject):
         to self.returned_post_status. XML is not generated until this 
         function is called as this is the first point where the 
         presence of all the required objects is explicitly tested.
+        The request is made with client, retried according to retry 
+        and limited by deadline as described for request().
         """
 
+        self.checkPost()
+            
+        # Serialize the post to generate etree, XML string and body
+        body = self.serialize_body()
+
+        # Make the request and get the status code
+        requesturl = url + '/api/rest/addpost/uid/' + uid
+        logging.debug('Post XML: %s', lablogtrace.Truncated(self.postxml))
+        parsedresponse = self.request(requesturl, body, client, retry,
+                                      deadline = deadline)
+        return self.postResult(parsedresponse)
+
+    def checkPost(self):
+        """Check that the post is ready to post"""
+
         # Check that self.posted is False
         assert self.posted == False
 
-        logging.debug(self.title)
-        logging.debug(type(self.title))
+        logging.debug('Checking post: %r', self.title)
         # First check that the required elements are there
         assert self.title != None and type(self.title) == str
         assert self.username != None and type (self.title) == str
         assert self.blog_id or self.blog_sname != None
         assert self.content != None and type(self.content) == str
         assert self.section != None and type(self.section) == str
-            
-        # Serialize the post to generate etree and XML string
-        self.serialize()
 
-        # Set up the Request object
-        requesturl = url + '/api/rest/addpost/uid/' + uid
-        request = urllib.urlencode({'request':self.postxml})
-        logging.debug(request)
-        post = urllib2.Request(requesturl, data=request)
+    def postResult(self, parsedresponse):
+        """Return the post ID from a parsed response, or None"""
 
-        response = urllib2.urlopen(post)
-               
-        # Parse the response and get the status code
-        parsedresponse = ET.parse(response)
-        statuscode = parsedresponse.find('status_code').text
+        statuscode = self.post_status_code
         success = parsedresponse.find('success').text
-        self.post_status_code = statuscode
-        self.post_response = response.read(100)
 
         # If statuscode is ok then return the data ID
         if success == 'true' and statuscode == '200':
@@ -498,13 +950,302 @@ class LaBLogPost(LaBLogObject):
         else:
             return None
 
+class LaBLogCatalogue(LaBLogObject):
+    """The getcatalogue API call for the catalogue of a LaBLog server
+
+    The request optionally carries the etag of the catalogue already
+    held and the LaBLog answers with a status_code of 304 and no
+    catalogue if that is still current, otherwise with the catalogue:
+
+    <catalogue etag="...">
+      <blog sname="..."><section>...</section>...</blog>
+      <username>...</username>
+      <metadata key="..."><value>...</value>...</metadata>
+    </catalogue>
+    """
+
+    def doRequest(self, url = DEFAULT_URL, uid = DEFAULT_UID, etag = None,
+                  client = None, retry = None):
+        """Fetch the catalogue, returning an entry or None if unchanged
+
+        The entry is a dictionary as kept by the ServerCatalogue of
+        lablogcatalogue. Raises ValueError if the LaBLog refuses the
+        request.
+        """
+
+        request = ET.Element('request')
+        if etag:
+            ET.SubElement(request, 'etag').text = etag
+        requestxml = ET.tostring(request)
+        body = multipart_body([('request', lambda: [requestxml],
+                                len(requestxml))])
+
+        requesturl = url + '/api/rest/getcatalogue/uid/' + uid
+        parsedresponse = self.request(requesturl, body, client, retry)
+
+        if self.post_status_code == '304':
+            return None
+        catalogue = parsedresponse.find('catalogue')
+        if self.post_status_code != '200' or catalogue == None:
+            raise ValueError('Catalogue refused with status ' +
+                             str(self.post_status_code))
+
+        blogs = []
+        for blog in catalogue.findall('blog'):
+            blogs.append([blog.get('sname'),
+                          [section.text for section in
+                           blog.findall('section')]])
+        metadata = []
+        for key in catalogue.findall('metadata'):
+            metadata.append([key.get('key'),
+                             [value.text for value in key.findall('value')]])
+
+        return {'blogs'     : blogs,
+                'usernames' : [username.text for username in
+                               catalogue.findall('username')],
+                'metadata'  : metadata,
+                'etag'      : catalogue.get('etag')}
+
+class PostTemplate(object):
+    """A set of LaBLog posts that differ only in their title
+
+    The template is made with the same arguments as a LaBLogPost, 
+    apart from the title. The shared parts of the post are checked 
+    and serialized once when the template is made, raising the
+    AssertionError or ValueError that serializing a LaBLogPost would, 
+    and post(title) then returns a TemplatedPost whose XML is made by
+    splicing the escaped title into the serialized template. This 
+    makes creating many similar posts, such as a post for each of a
+    set of samples, much cheaper than building each from scratch.
+    """
+
+    def __init__(self, **kwargs):
+        assert 'title' not in kwargs, 'Titles are given to post()'
+
+        # Serialize a post with a placeholder for the title
+        placeholder = 'title-' + uuid.uuid4().hex
+        self.prototype = LaBLogPost(title = placeholder, **kwargs)
+        self.prototype.checkPost()
+        self.prototype.serialize()
+
+        postxml = self.prototype.postxml
+        assert postxml.count(placeholder) == 1
+        self.head, self.tail = postxml.split(placeholder)
+
+    def render(self, title):
+        """Return the post XML for a post with the given title"""
+
+        if type(title) != str:
+            raise TypeError('Title must be a string')
+        return self.head + saxutils.escape(title) + self.tail
+
+    def post(self, title, metadata = None):
+        """Return a TemplatedPost with the given title
+
+        Metadata, a dictionary, is added to that of the template.
+        """
+
+        return TemplatedPost(self, title, metadata)
+
+class TemplatedPost(LaBLogPost):
+    """A LaBLogPost made from a PostTemplate
+
+    Only the title of the post is checked before posting, the rest
+    having been checked by the template, and serialize() sets 
+    self.postxml from the template without building self.etree.
+    Posts given metadata of their own are checked and serialized in
+    full as any other LaBLogPost.
+    """
+
+    def __init__(self, template, title, metadata = None):
+        prototype = template.prototype
+        self.templated = not metadata
+        if metadata:
+            metadata = dict(prototype.metadata or {}, **metadata)
+        else:
+            metadata = prototype.metadata
+
+        LaBLogPost.__init__(self, prototype.username, prototype.content,
+                            prototype.blog_id, prototype.section,
+                            prototype.blog_sname, metadata,
+                            prototype.attached_data)
+        self.set_title(title)
+        self.template = template
+
+    def checkPost(self):
+        if not self.templated:
+            LaBLogPost.checkPost(self)
+        assert self.posted == False
+        assert self.title != None and type(self.title) == str
+
+    def serialize(self):
+        if not self.templated:
+            LaBLogPost.serialize(self)
+        else:
+            self.postxml = self.template.render(self.title)
+
+def read_manifest(manifest):
+    """Yield (title, metadata) rows from a CSV manifest of posts
+
+    Manifest is a path or an open file. Its first row names the 
+    columns, one of which must be 'title'. Each other column that is 
+    not empty in a row gives a metadata value under the column name,
+    or metadata is None if there are none. Rows with no title, 
+    because they are too short to reach the title column or the title
+    is blank, are skipped with a warning. Rows are read one at a time
+    so a manifest of any length can be used with create_posts.
+    """
+
+    if isinstance(manifest, basestring):
+        manifestfile = open(manifest, 'rb')
+    else:
+        manifestfile = manifest
+
+    try:
+        reader = csv.reader(manifestfile)
+        try:
+            header = reader.next()
+        except StopIteration:
+            return
+        assert 'title' in header, 'Manifest has no title column'
+
+        for row in reader:
+            if not row:
+                continue
+            title = None
+            metadata = {}
+            for name, value in zip(header, row):
+                if name == 'title':
+                    title = value
+                elif value:
+                    metadata[name] = value
+            if not (title and title.strip()):
+                logging.warning('Manifest line ' + str(reader.line_num) +
+                                ' has no title, skipped')
+                continue
+            yield title, metadata or None
+
+    finally:
+        if manifestfile is not manifest:
+            manifestfile.close()
+
+def create_posts(rows, template, url=DEFAULT_URL, uid=DEFAULT_UID,
+                 client=None, retry=None, concurrency=1, deadline=None):
+    """Create a post from template for each row, yielding the results
+
+    Rows is an iterable of titles or of (title, metadata) pairs, such
+    as read_manifest returns, and template a PostTemplate. For each
+    post (index, title, post_id, error) is yielded as it finishes,
+    where index counts the rows from 1 and post_id is None if the post
+    failed. Network errors and unreadable responses are logged and 
+    returned as error, which is otherwise None. Requests are made as
+    described for LaBLogPost.doPost.
+
+    If concurrency is greater than one that many worker threads create
+    posts in parallel and results are yielded in the order they finish.
+    Rows are only read as posts are started, at most two per worker
+    ahead of the results, so memory use does not grow with the number
+    of posts. Closing the generator stops further posts being started.
+    """
+
+    def make(row):
+        if isinstance(row, tuple):
+            return template.post(*row)
+        return template.post(row)
+
+    def send(index, post):
+        try:
+            post_id = post.doPost(url, uid, client, retry, deadline)
+        except REQUEST_ERRORS, e:
+            logging.warning('Post ' + post.title + ' failed: ' + str(e))
+            return index, post.title, None, e
+        return index, post.title, post_id, None
+
+    if concurrency <= 1:
+        index = 0
+        for row in rows:
+            index += 1
+            yield send(index, make(row))
+        return
+
+    tasks = Queue.Queue()
+    results = Queue.Queue()
+    stopped = threading.Event()
+
+    def worker():
+        while not stopped.isSet():
+            task = tasks.get()
+            if task == None:
+                return
+            try:
+                results.put(send(*task))
+            except Exception, e:
+                results.put(e)
+
+    workers = []
+    for n in range(concurrency):
+        workers.append(threading.Thread(target = worker))
+        workers[-1].setDaemon(True)
+        workers[-1].start()
+
+    def finished():
+        result = results.get()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    try:
+        inflight = 0
+        index = 0
+        for row in rows:
+            index += 1
+            tasks.put((index, make(row)))
+            inflight += 1
+
+            # Wait for a post to finish before reading too far ahead
+            if inflight >= 2 * concurrency:
+                yield finished()
+                inflight -= 1
+
+        while inflight:
+            yield finished()
+            inflight -= 1
+
+    finally:
+        stopped.set()
+        for thread in workers:
+            tasks.put(None)
+
 class MultiDataFileUpload(object):
-    """Class for creating multiple posts with single attached files"""
+    """Class for creating multiple posts with single attached files
+
+    All the data and post requests are made with client, a 
+    lablogtransport.Transport by default the one returned by 
+    default_client(), so that the whole upload runs over a few 
+    persistent connections. Concurrency sets 
+    the number of files that doUpload uploads in parallel.
+
+    If progress is given it is called as progress(index, path, result)
+    as each file finishes, where result is as returned by uploadFile.
+    With concurrent uploads it is called from the worker threads. An
+    upload in progress can be stopped from another thread by calling
+    cancel(), after which no further files are started.
+
+    Files are sent with the given transfer mode, TRANSFER_INLINE or
+    TRANSFER_MULTIPART, see LaBLogData. If deadline is given each 
+    doUpload must finish within that many seconds; requests are cut
+    short when it passes and the files not yet uploaded count as 
+    failed.
+    """
 
     def __init__(self, filelist = [], postnames = None, posttext = None,
                        metadata = None, server_url = None, blog_id = None,
-                       username = None, section = None, uid = None,
-                       blog_sname = None, usefilename = False):
+                       username = None, section = '', uid = None,
+                       blog_sname = None, usefilename = False,
+                       client = None, concurrency = 1, progress = None,
+                       journal = None, resume = False, cache = None,
+                       retry = None, transfer = TRANSFER_INLINE,
+                       deadline = None):
         self.filelist = filelist
         self.postnames = postnames
         self.posttext = posttext
@@ -512,10 +1253,21 @@ class MultiDataFileUpload(object):
         self.server_url = server_url
         self.blog_id = blog_id
         self.username = username
-        self.section = ''
+        self.section = section
         self.uid = uid
         self.blog_sname = blog_sname
         self.usefilename = usefilename
+        self.client = client
+        self.concurrency = concurrency
+        self.progress = progress
+        self.journal = journal
+        self.resume = resume
+        self.cache = cache
+        self.retry = retry
+        self.transfer = transfer
+        self.deadline = deadline
+        self.batch_deadline = None
+        self.cancelled = threading.Event()
 
     def addFile(self, path):
         """Add paths to the list of files for upload"""
@@ -543,8 +1295,29 @@ class MultiDataFileUpload(object):
 
         self.posttext = text
 
-    def doUpload(self):
-        """Upload method for multiple posts with single files attached"""
+    def doUpload(self, concurrency = None):
+        """Upload method for multiple posts with single files attached
+
+        Files are uploaded in sorted order and the post for each file 
+        is numbered by the position of the file in that order, so the
+        numbering is the same however the uploads complete. If 
+        concurrency (by default self.concurrency) is greater than one
+        a pool of that many worker threads uploads files in parallel,
+        so that reading and encoding, data posts and post creation for
+        different files overlap. Returns the number of failed data 
+        posts, the number of failed blog posts and the number of files.
+
+        The filelist may also be any other iterable of paths, such as
+        a lablogscan.DirectoryScanner, in which case the files are
+        uploaded in the order given as they are produced, so that the 
+        upload starts before the whole list is known.
+
+        An unexpected exception from uploading a file stops the upload
+        and is raised once the workers have finished, as it would be
+        without concurrency. A cancel() made before the upload starts
+        is kept, so that no files are uploaded, and cleared once the
+        upload finishes.
+        """
 
         # Check for presence of required elements
         try:
@@ -555,58 +1328,252 @@ class MultiDataFileUpload(object):
         except AssertionError, e:
             return str(e)  
 
-        # Sort the list into alphabetical/numeric order by filename
-        self.filelist.sort()
+        if concurrency == None:
+            concurrency = self.concurrency
+
+        # Sort a list into alphabetical/numeric order by filename
+        if isinstance(self.filelist, list):
+            self.filelist.sort()
+            concurrency = min(concurrency, len(self.filelist))
+
+        # Hand out the files numbered in order, one worker at a time
+        files = enumerate(self.filelist, 1)
+        self.count = 0
+
+        # Set up tracking variables shared between the workers
+        self.data_fail = 0
+        self.post_fail = 0
+        lock = threading.Lock()
+        errors = []
+
+        self.batch_deadline = None
+        if self.deadline != None:
+            self.batch_deadline = lablogretry.Deadline(self.deadline)
+
+        def worker():
+            while not self.cancelled.isSet() and not errors:
+                lock.acquire()
+                try:
+                    try:
+                        index, path = files.next()
+                    except StopIteration:
+                        return
+                    self.count = index
+                finally:
+                    lock.release()
+
+                result = self.uploadFile(index, path)
+
+                lock.acquire()
+                if result == None:
+                    self.data_fail = self.data_fail + 1
+                elif result == False:
+                    self.post_fail = self.post_fail + 1
+                lock.release()
+
+                if self.progress:
+                    self.progress(index, path, result)
+
+        def pooled():
+            try:
+                worker()
+            except Exception:
+                errors.append(sys.exc_info())
+
+        # Run in this thread or start the pool of workers and wait
+        try:
+            if concurrency <= 1:
+                worker()
+            else:
+                workers = []
+                for n in range(concurrency):
+                    workers.append(threading.Thread(target = pooled))
+                    workers[-1].setDaemon(True)
+                    workers[-1].start()
+                for thread in workers:
+                    thread.join()
+                if errors:
+                    info = errors[0]
+                    raise info[0], info[1], info[2]
+        finally:
+            self.cancelled.clear()
+
+        if isinstance(self.filelist, list):
+            return self.data_fail, self.post_fail, len(self.filelist)
+        if self.count == 0:
+            return 'Filelist is empty'
+        return self.data_fail, self.post_fail, self.count
+
+    def doWatch(self, watcher):
+        """Upload the files handed out by a directory watcher
+
+        Watcher is a lablogwatch.DirectoryWatcher, or anything else
+        with files(stop) and done(path) methods. Files are uploaded one
+        at a time as they are handed out, numbered from one in the order
+        they arrive, and each file uploaded is marked done so that it is
+        not handed out again. This runs until cancel() is called and the
+        filelist is ignored. If deadline is given each file must be
+        uploaded within that many seconds. Returns the number of failed
+        data posts, the number of failed blog posts and the number of 
+        files.
+        """
 
-        # Set up tracking variables for sequential upload
-        i = 1
-        data_fail = 0
-        post_fail = 0
+        assert self.postnames or self.usefilename, \
+                                  'No name given for post title'
 
-        # For each path in the filelist
-        for path in self.filelist:
-            data = LaBLogData() # Build data object
-            data.set_type('inline')
-            data.set_data(path)
+        self.data_fail = 0
+        self.post_fail = 0
 
-            # Attempt to do the data object post
-            if data.doPost(url = self.server_url, uid = self.uid) == None:
-                data_fail = data_fail + 1
+        count = 0
+        try:
+            for path in watcher.files(self.cancelled):
+                count = count + 1
+                self.batch_deadline = None
+                if self.deadline != None:
+                    self.batch_deadline = lablogretry.Deadline(self.deadline)
+
+                result = self.uploadFile(count, path)
+                if result == None:
+                    self.data_fail = self.data_fail + 1
+                elif result == False:
+                    self.post_fail = self.post_fail + 1
+                else:
+                    watcher.done(path)
 
-            # Only build and do the post if the data post succeeds
-            else:
-                # Build the post object
-                post = LaBLogPost()
-                
-                # Set up the post name for the data post
-                # If self.usefilename is set to True then get the filename
-                if self.usefilename:
-                    post.set_title = os.path.basename(path)
-                # Otherwise use the postname that is set plus increment
-                elif self.usefilename == False:
-                    post.set_title(self.postnames + ' ' + str(i))
-
-                post.set_username(self.username)
-                post.set_section(self.section)
-                post.set_content(self.posttext)
-                if self.blog_id:
-                    post.set_blog_id(self.blog_id)
-                if self.blog_sname:
-                    post.set_blog_sname(self.blog_sname)
-                if self.metadata:
-                    post.set_metadata(self.metadata)
-                post.set_attached_data([data.data_id])
-                i = i + 1
-
-                # Attempt to do the blog post
-                if post.doPost(url = self.server_url, uid = self.uid) == None:
-                    post_fail = postfail + 1
+                if self.progress:
+                    self.progress(count, path, result)
+        finally:
+            self.cancelled.clear()
 
-                else:
-                    pass
-               
-        return data_fail, post_fail, len(self.filelist)
-                
+        return self.data_fail, self.post_fail, count
+
+    def cancel(self):
+        """Stop a running doUpload once the files in progress finish"""
+
+        self.cancelled.set()
+
+    def uploadFile(self, index, path):
+        """Upload a single file and create the post it is attached to
+
+        Returns None if the data post fails, False if the blog post 
+        fails and otherwise the post ID. Network errors and unreadable
+        files or responses are logged and count as failures. Index is
+        the number appended to self.postnames for the post title.
+        """
+
+        # Look up how far a previous upload of the file got
+        state = None
+        if self.journal and self.resume:
+            entry = self.journal.get(self.server_url, path)
+            if entry:
+                state, data_id, post_id = entry
+
+        if state == lablogjournal.POST_CREATED:
+            return post_id
+
+        if state != lablogjournal.DATA_POSTED:
+            data_id = self.uploadData(path)
+
+        # Only build and do the post if the data post succeeds
+        if not data_id:
+            return None
+
+        post = self.buildPost(index, path, data_id)
+
+        # Attempt to do the blog post
+        try:
+            post_id = post.doPost(url = self.server_url, uid = self.uid,
+                                  client = self.client, retry = self.retry,
+                                  deadline = self.batch_deadline)
+        except REQUEST_ERRORS, e:
+            logging.warning('Post failed for ' + path + ': ' + str(e))
+            post_id = None
+
+        if not post_id:
+            return False
+
+        if self.journal:
+            self.journal.record(self.server_url, path, 
+                                lablogjournal.POST_CREATED, data_id, post_id)
+        return post_id
+
+    def uploadData(self, path):
+        """Upload a file as a data object and return the data ID
+
+        Returns None if the data post fails.
+        """
+
+        if self.journal:
+            self.journal.record(self.server_url, path, 
+                                lablogjournal.PENDING)
+
+        # Reuse the data ID if the same contents have been uploaded
+        data_id = None
+        if self.cache:
+            try:
+                data_id = self.cache.lookup(self.server_url, path)
+            except EnvironmentError, e:
+                logging.warning('Could not hash ' + path + ': ' + str(e))
+
+        if data_id:
+            if self.journal:
+                self.journal.record(self.server_url, path,
+                                    lablogjournal.DATA_POSTED, data_id)
+            return data_id
+
+        data = LaBLogData() # Build data object
+        data.set_type('inline')
+        data.transfer = self.transfer
+
+        # Multipart transfers send the file as it is so don't encode it
+        stream = None
+        if self.transfer == TRANSFER_MULTIPART:
+            stream = True
+
+        # Attempt to do the data object post
+        try:
+            data.set_data(path, stream = stream)
+            data_id = data.doPost(url = self.server_url, uid = self.uid,
+                                  client = self.client, retry = self.retry,
+                                  deadline = self.batch_deadline)
+        except REQUEST_ERRORS, e:
+            logging.warning('Data post failed for ' + path + ': ' + str(e))
+            return None
+
+        if not data_id:
+            return None
+
+        if self.journal:
+            self.journal.record(self.server_url, path, 
+                                lablogjournal.DATA_POSTED, data_id)
+        if self.cache:
+            self.cache.store(self.server_url, path, data_id)
+        return data_id
+
+    def buildPost(self, index, path, data_id):
+        """Build the post object for a file with the given data ID"""
+
+        post = LaBLogPost(attached_data = [data_id])
+        
+        # Set up the post name for the data post
+        # If self.usefilename is set to True then get the filename
+        if self.usefilename:
+            post.set_title(os.path.basename(path))
+        # Otherwise use the postname that is set plus increment
+        elif self.usefilename == False:
+            post.set_title(self.postnames + ' ' + str(index))
+
+        post.set_username(self.username)
+        post.set_section(self.section)
+        post.set_content(self.posttext)
+        if self.blog_id:
+            post.set_blog_id(self.blog_id)
+        if self.blog_sname:
+            post.set_blog_sname(self.blog_sname)
+        if self.metadata:
+            post.set_metadata(self.metadata)
+
+        return post
                 
                 
 class BlogTable(object):
@@ -628,7 +1595,7 @@ class BlogTable(object):
         """Method for checking that input is ok for table creation"""
 
         # Check input is a list
-        if type input != list:
+        if type(input) != list:
             raise TypeError("Need a list for creation of table")
             return False
 
@@ -668,301 +1635,3 @@ class BlogTable(object):
             table.append("[/row]\n")
         table.append("[/table]\n")
         return table        
-        
-
-
-###############################################
-#
-# TESTS
-#
-###############################################
-
-class TestDataObjectCreator(unittest.TestCase):
-
-    def setUp(self):
-        self.testemptydataobject = LaBLogData()
-        self.title = 'Test title'
-        self.faketitle = 'Not the test title'
-        self.testint = 1
-        self.testfloat = 5.4
-        self.testfile = 'ai.gif'
-        self.extension = 'gif'
-        self.base64 = base64.standard_b64encode(
-                                    open('ai.gif').read(3000))
-        self.directory = '/Users/Cameron/Documents/Python/LaBLog/Testing/'
-        self.fullpath = os.path.join(self.directory, self.testfile)
-
-    def test_init_empty_object(self):
-        self.assertTrue(self.testemptydataobject.title == None)
-        self.assertTrue(self.testemptydataobject.type == None)
-        self.assertEqual(self.testemptydataobject.main, '1')
-
-    def test_set_title(self):
-        self.testemptydataobject.set_title(self.title)
-        self.assertEqual(self.testemptydataobject.title, self.title)
-        self.assertNotEqual(self.testemptydataobject.title, self.faketitle)
-
-    def test_set_title_Exceptions(self):
-        self.assertRaises(TypeError, 
-                            self.testemptydataobject.set_title, self.testint)
-        self.assertRaises(TypeError, 
-                            self.testemptydataobject.set_title, self.testfloat)
-
-    def test_set_type_inline(self):
-        self.testemptydataobject.set_type('inline')
-        self.assertEqual(self.testemptydataobject.type, 'inline')
-
-    def test_set_type_url(self):
-        self.testemptydataobject.set_type('url')
-        self.assertEqual(self.testemptydataobject.type, 'url')
-
-    def test_set_type_local(self):
-        self.testemptydataobject.set_type('local')
-        self.assertEqual(self.testemptydataobject.type, 'local')
-
-    def test_set_type_Exceptions(self):
-        self.assertRaises(ValueError, 
-                            self.testemptydataobject.set_type, self.title)
-        self.assertRaises(TypeError, 
-                            self.testemptydataobject.set_type, self.testint)
-        self.assertRaises(TypeError, 
-                            self.testemptydataobject.set_type, self.testfloat)
-
-    def test_set_data_local_path(self):
-        self.testemptydataobject.set_data(self.testfile)
-        self.assertEqual(self.testemptydataobject.ext, self.extension)
-        self.assertEqual(self.testemptydataobject.data, self.base64)
-        self.assertEqual(self.testemptydataobject.title, 'ai')
-
-    def test_set_data_full_path(self):
-        self.testemptydataobject.set_data(self.fullpath)
-        self.assertEqual(self.testemptydataobject.ext, self.extension)
-        self.assertEqual(self.testemptydataobject.data, self.base64)
-
-    def test_set_data_file_and_path(self):
-        self.testemptydataobject.set_data(self.testfile, self.directory)
-        self.assertEqual(self.testemptydataobject.ext, self.extension)
-        self.assertEqual(self.testemptydataobject.data, self.base64)
-
-    def test_set_data_no_filename(self):
-        self.testemptydataobject.set_data(self.testfile, usefilename=False)
-        self.assertEqual(self.testemptydataobject.title, None)
-
-class TestDataPoster(unittest.TestCase):
-    def setUp(self):
-        self.testemptydataobject = LaBLogData()
-        self.title = 'Test title'
-        self.faketitle = 'Not the test title'
-        self.testint = 1
-        self.testfloat = 5.4
-        self.testfile = 'ai.gif'
-        self.extension = 'gif'
-        self.base64 = base64.standard_b64encode(
-                                    open('ai.gif').read(3000))
-        self.directory = '/Users/Cameron/Documents/Python/LaBLog/Testing/'
-        self.fullpath = os.path.join(self.directory, self.testfile)
-
-    def testInlineDataPost(self):
-        testdataobject = LaBLogData()
-        testdataobject.set_title(self.title)
-        testdataobject.set_type('inline')
-        testdataobject.set_data(self.testfile)
-
-        testdataobject.doPost()
-        self.assertEqual(testdataobject.posted, True)
-        self.assertEqual(testdataobject.post_status_code, '200')
-
-class TestPostObjectCreator(unittest.TestCase):
-    def setUp(self):
-        self.testemptypostobject = LaBLogPost()
-        self.title = 'Test title'
-        self.faketitle = 'Not the test title'
-        self.testint = 1
-        self.testfloat = 10.6
-        self.testusername = DEFAULT_USERNAME
-        self.testblog_id = '16'
-        self.testcontent = 'Blah blah blah'
-        self.testblog_sname = 'testing_sandpit'
-        self.testmetadata = {'key1':'value1', 'key2':'value2'}
-
-    def test_init_empty_post(self):
-        self.assertTrue(self.testemptypostobject.title == None)
-        self.assertTrue(self.testemptypostobject.username == None)
-        self.assertTrue(self.testemptypostobject.blog_id == None)
-        
-    def test_set_title(self):
-        self.testemptypostobject.set_title(self.title)
-        self.assertEqual(self.testemptypostobject.title, self.title)
-        self.assertNotEqual(self.testemptypostobject.title, self.faketitle)
-
-    def test_set_title_Exceptions(self):
-        self.assertRaises(TypeError, 
-                            self.testemptypostobject.set_title, self.testint)
-        self.assertRaises(TypeError, 
-                            self.testemptypostobject.set_title, self.testfloat)
-
-    def test_set_metadata(self):
-        self.testemptypostobject.set_metadata(self.testmetadata)
-        self.assertEqual(self.testemptypostobject.metadata, self.testmetadata)
-
-    def test_append_metadata(self):
-        self.testemptypostobject.append_metadata(self.testmetadata)
-        self.assertEqual(self.testemptypostobject.metadata, self.testmetadata)
-
-        # Now try and add metadata again and should raise ValueError
-        self.assertRaises(ValueError, 
-                          self.testemptypostobject.append_metadata, {'key1':'value3'})
-
-        # But the following should succeed using overwrite=True option
-        self.testemptypostobject.append_metadata({'key1':'value3'}, overwrite = True)
-        self.assertEqual(self.testemptypostobject.metadata, {'key1':'value3',
-                                                             'key2':'value2'})
-
-
-class TestXMLSerializors(unittest.TestCase):
-
-    def setUp(self):
-        self.testpost = LaBLogPost()
-        self.testpost.title = 'title'
-        self.testpost.username = DEFAULT_USERNAME
-        self.testpost.section = 'API testing'
-        self.testpost.content = 'test text content'
-        self.testpost.blog_id = '16'
-        self.testpost.blog_sname =  'testing_sandpit'
-        self.testpost.metadata = {'key1':'value1',
-                                  'key2':'value2',
-                                  'key3':'value3'}
-        self.testpost.attached_data = ['1', '2', '3']
-
-        self.testxml = """<post><title>title</title><section>API testing</section><author><username>cameronneylon.net</username></author><content>test text content</content><blog_id>16</blog_id><blog_sname>testing_sandpit</blog_sname><metadata><key3>value3</key3><key2>value2</key2><key1>value1</key1></metadata><attached_data><data type="local">1</data><data type="local">2</data><data type="local">3</data></attached_data></post>""" 
-
-        f = open('ai.gif')
-        testbinary = f.read(3000)
-        testbase64 = base64.standard_b64encode(testbinary)
-
-        self.testdata = LaBLogData()
-        self.testdata.title = 'title'
-        self.testdata.type = 'inline'
-        self.testdata.filename = 'filename.gif'
-        self.testdata.ext = 'gif'
-        self.testdata.main = '1'
-        self.testdata.data =  testbase64
-
-        self.testdataxml1 = """<dataset><title>title</title><data><dataitem ext="gif" filename="filename.gif" main="1" type="inline">R0lGODlhIAAgAOZmAP/elM6MY8Z7CEIxGOeUWv/OjHtKObVjENalUv/OY8aEMd57AP/vrTkhEOeMEKVrGNaUOeeMAK1jQmM5CM6EGL1rAJRSQpxaAIxjUlI5MbVzWq2lrd6UKe+lMeecGIRSEBAIAKWUjJx7Y71zGOecc7WtnHu11nNzezE5OSkYCJTG3tbGnM57Uv/erb21rUpKSsatpWtCMfeMECEICFpKQpyMe1JaWr2ljK2clKVrAIwICM7e50Jja73O1pR7c4RrQtaUlM6lc3taStbOxsa1tYyUnMbW3rWEc961pa17Ka21vfe9hEIpQhgYGHNjWs7GzqVjUoyMlN4pKSEYIXOMtWtSSs6tjP+1Ob21vYycrSkpKf+tKVIpGLVzSq1KMfe1c5RrMf+9UmsxIcZrOYRCKQAAAP///wAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAACH5BAEAAGYALAAAAAAgACAAAAf/gGaCg4SFhoeIiYqEAQQri5CCLYJdCgoBkSEGYGBdAZ+EX2ZBYwSdj4kbGWJkXl5jCh0dCg+dYGRkY7pgN4IFX8DAYA0GZGLHZAdeD69jyrgHugShHRDWMWIDxwMDXBNc3dsTYhO4EwoIhGEcJiZCyAZiGZxcKTNczWBeuGJeCqiCwkAwEUXHh3JduhAIwwDBGDEzBuTS9QBXrUJfBhrIgWtMpYUAGDBIAAZEAy5cWEGDQGKSoC8cflz40E/XxzAhRcYo04BbMQMHwCxRR+HCBInNEi4UGTLBgAYqXR0AUSjMAhsoO8JSSCAAgi8hJZjkwm9CiqocuOgoN9FjFy9e/78CSGAgBatSB8pUFcDlgzZcubogCIOADBgJAQAgOAnmgYwOegkhqDCGjJZjmMeESUBmAAqvBRJkI/Ogw4LIgwgIYGGBSQZ+3QgACCCBBdhfw8REc4Ba0GROBl57jjcmAYDQBY5/8dLg1YEIvc0goHDCwI8xYAwYkNAvgXfvv76UzLXgdCEIFKhgwCAhgxdOrMKEWQhMfhcQZMtHh5AkiwgNVaCwiRdicEHAW2HUN58BTQxwgXmEQDCCFUeIgMEL82QHjhchhVZfFw1M8YEA0SkggAslBKABBjQIYUF2YiSEQAAkHBdGF0/lQGIhJiKhxCcarGjBiwVeIMUYYH1BgNEXKF1QQYkjPIHFBiGI8B8UFkjgygVjJAfAF12QgQ8FT/I4ggpobuDDCSIEQIMFXXCCAADHHQgGFzeEwVshHIzQQw9U4oBDDSc4wR5iBSSKAAEJ2MBDETLsSUifO+wAQwkluLDBCT58EgALXSSIEwAv8DBGBJIOIkAFQxhBxKVAABFCCEGQQEKCiRbAQA0NfOCFA9AVcoAADzxwwLAUOECBAMl6sMUV8sl3gLEHABtdBQJkK0B5EXTLLaoehOuBA9hmu8COhZSh7rrstutuu4QEAgA7</dataitem></data></dataset>"""
-
-        self.emptydata = LaBLogData()
-        self.emptypost = LaBLogPost()
-        self.require_for_postxml = ['title', 'section', 'username', 'content']
-        self.require_for_dataxml = ['title', 'filename', 'type', 'data']
-
-
-    def testpostxmlserialization(self):
-        self.testpost.serialize()
-        self.assertEqual(ET.tostring(self.testpost.etree.getroot()), 
-                                          self.testxml)
-        self.assertEqual(self.testpost.postxml, self.testxml)
-
-    def testdataxmlserialization(self):
-        self.testdata.serialize()
-        self.assertEqual(ET.tostring(self.testdata.etree.getroot()), 
-                                          self.testdataxml1)
-        self.assertEqual(self.testdata.postxml, self.testdataxml1)
-
-    def testxml_empty(self):
-        self.assertRaises(AssertionError, self.emptydata.serialize)
-        self.assertRaises(AssertionError, self.emptypost.serialize)
-        
-class TestPostPoster(unittest.TestCase):
-    def setUp(self):
-        self.testemptypostobject = LaBLogPost()
-        self.title = 'Test title'
-        self.faketitle = 'Not the test title'
-        self.testint = 1
-        self.testfloat = 10.6
-        self.testsection = 'API testing'
-        self.testusername = DEFAULT_USERNAME
-        self.testblog_id = '16'
-        self.testcontent = 'Blah blah blah'
-        self.testblog_sname = 'testing_sandpit'
-        self.testmetadata = {'key1':'value1', 'key2':'value2'}
-
-
-    def testBlogPost(self):
-        testpostobject = LaBLogPost()
-        testpostobject.set_title(self.title)
-        testpostobject.set_username(self.testusername)
-        testpostobject.set_section(self.testsection)
-        testpostobject.set_blog_id(self.testblog_id)
-        testpostobject.set_blog_sname(self.testblog_sname)
-        testpostobject.set_content(self.testcontent)
-
-        testpostobject.doPost()
-        self.assertEqual(testpostobject.posted, True)
-        self.assertEqual(testpostobject.post_status_code, '200')
-
-class TestMultiDataFileUpload(unittest.TestCase):
-    def setUp(self):
-        self.testfilelist = ['ai.gif', 'ai2.gif']
-        self.testfile = 'ai.gif'
-        self.testfile2 = 'ai2.gif'
-        self.testpostnames = 'test'
-        self.testposttext = 'Some new test text'
-        self.testmetadata = {'key1':'value1', 'key2':'value2'}
-        self.testserver_url = DEFAULT_URL
-        self.testblog_id = '17'
-        self.testusername = DEFAULT_USERNAME
-        self.testblog_sname = 'testing_sandpit'
-        self.testsection = ''
-        self.testuid = DEFAULT_UID
-        self.test = MultiDataFileUpload()
-
-    def tearDown(self):
-        self.test.filelist = []
-        self.test = None
-
-    def testEmptyMultiCreation(self):
-        self.test.addFile(self.testfile)
-        self.test.addFile(self.testfile2)
-        self.test.setPostNames(self.testpostnames)
-        self.test.setPostText(self.testposttext)
-
-        self.assertEqual(self.test.filelist, self.testfilelist)
-        self.assertEqual(self.test.postnames, self.testpostnames)
-        self.assertEqual(self.test.posttext, self.testposttext)
-
-    def testErrorCatching(self):
-        self.assertEqual(self.test.addFile('nonexistentfile'), 'Path not found')
-        self.assertRaises(AssertionError, self.test.setPostNames, None)
-        self.assertRaises(AssertionError, self.test.setPostNames, 1)
-        self.assertRaises(AssertionError, self.test.setPostText, None)
-        self.assertRaises(AssertionError, self.test.setPostText, 3)
-
-        self.test.filelist = []
-        self.assertEqual(self.test.doUpload(), 'Filelist is empty')
-        self.test.addFile(self.testfile)
-        self.assertEqual(self.test.doUpload(), 'No name given for post title')
-
-    def testMultiPost(self):
-        self.test = MultiDataFileUpload(
-                  **{'filelist'   : self.testfilelist,
-                     'postnames'  : self.testpostnames,
-                     'posttext'   : self.testposttext,
-                     'metadata'   : self.testmetadata,
-                     'server_url' : self.testserver_url,
-                     'blog_id'    : self.testblog_id,
-                     'username'   : self.testusername,
-                     'section'    : self.testsection,
-                     'uid'        : self.testuid,
-                     'blog_sname' : self.testblog_sname})
-
-        data_fail, post_fail, length = self.test.doUpload()
-        self.assertEqual(data_fail, 0)
-        self.assertEqual(post_fail, 0)
-        self.assertEqual(length, len(self.testfilelist))
-
-
-if __name__ == '__main__':
-    if set_proxy(False) == False:
-        set_proxy(True)
-
-    unittest.main()        
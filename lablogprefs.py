@@ -0,0 +1,208 @@
+# LaBLogPrefs: Persistent preferences for the LaBLog desktop app
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to lablogprefs.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Dependencies: The module requires the os, json, copy and logging
+# modules of the Python 2.6 standard library. It is loaded at
+# application startup so it imports nothing heavier.
+
+import os
+import os.path
+import copy
+import json
+import logging
+
+# Global Variables
+
+DEFAULT_PREFS = os.path.join(os.path.expanduser('~'), '.lablog-prefs.json')
+SCHEMA_VERSION = 1
+
+DEFAULTS = {'servers'   : ['http://biolab.isis.rl.ac.uk'],
+            'blogs'     : {},       # Blogs chosen for each server
+            'usernames' : {},       # Usernames chosen for each server
+            'server'    : 'http://biolab.isis.rl.ac.uk',
+            'blog'      : '',
+            'username'  : '',
+            'directory' : '',       # Last data directory uploaded
+            'presets'   : {}}       # Named section and metadata choices
+
+def migrate_0(values):
+    """Preferences written before the schema had a version
+
+    Entries the schema does not know are dropped, the defaults are
+    used for any missing and a single username or blog given as a
+    string for a server becomes a list. A preset given as just its
+    metadata gets an empty section.
+    """
+
+    migrated = {}
+    for name in DEFAULTS:
+        if name in values:
+            migrated[name] = values[name]
+    for name in ['blogs', 'usernames']:
+        for server, items in migrated.get(name, {}).items():
+            if isinstance(items, basestring):
+                migrated[name][server] = [items]
+    for name, preset in migrated.get('presets', {}).items():
+        if 'metadata' not in preset:
+            migrated['presets'][name] = {'section' : '', 'metadata' : preset}
+    return migrated
+
+# Migrations from each version to the next
+MIGRATIONS = {0 : migrate_0}
+
+def byte_strings(value):
+    """Return value with the unicode strings json gives encoded as str
+
+    The rest of the application, lablogpost in particular, expects
+    names, blogs and paths to be str.
+    """
+
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, list):
+        return [byte_strings(item) for item in value]
+    if isinstance(value, dict):
+        converted = {}
+        for key, item in value.items():
+            converted[byte_strings(key)] = byte_strings(item)
+        return converted
+    return value
+
+def write_atomically(path, content):
+    """Replace the file at path with content in a single step
+
+    The content is written to a temporary file alongside path which
+    is then renamed over it, so that a crash leaves either the old or
+    the new file and never part of one.
+    """
+
+    import tempfile
+
+    directory = os.path.dirname(path) or '.'
+    handle, temppath = tempfile.mkstemp(dir = directory, prefix = '.tmp')
+    try:
+        tempfile_ = os.fdopen(handle, 'wb')
+        try:
+            tempfile_.write(content)
+            tempfile_.flush()
+            os.fsync(tempfile_.fileno())
+        finally:
+            tempfile_.close()
+
+        # Windows will not rename over an existing file
+        try:
+            os.rename(temppath, path)
+        except OSError:
+            os.remove(path)
+            os.rename(temppath, path)
+    except:
+        if os.path.exists(temppath):
+            os.remove(temppath)
+        raise
+
+
+class Preferences(object):
+    """The preferences of the desktop app, kept in a small JSON file
+
+    The preferences are the entries of DEFAULTS: the servers offered,
+    the blogs and usernames chosen for each server, the server, blog
+    and username last used, the last data directory and the metadata
+    presets. get() returns the value of an entry and set() changes it
+    and writes the file at once, atomically, so that preferences are
+    never lost or half written. The presets are named choices of post
+    section and metadata, handled with the preset methods.
+
+    Strings are given as str, encoded as UTF-8.
+
+    The file records the SCHEMA_VERSION it was written with. Files
+    written with an earlier version are brought up to date with the
+    MIGRATIONS when they are loaded. Files from a later version are
+    used as far as possible but not written over. An unreadable file
+    is logged and the defaults used instead.
+    """
+
+    def __init__(self, path = DEFAULT_PREFS):
+        self.path = path
+        self.values = copy.deepcopy(DEFAULTS)
+        self.writable = True
+
+        if not path or not os.path.exists(path):
+            return
+        try:
+            prefsfile = open(path, 'rb')
+            try:
+                values = byte_strings(json.load(prefsfile))
+            finally:
+                prefsfile.close()
+            assert isinstance(values, dict), 'Preferences must be an object'
+        except (EnvironmentError, ValueError, AssertionError), e:
+            logging.warning('Preferences unreadable, using defaults: ' +
+                            str(e))
+            return
+
+        version = values.pop('version', 0)
+        if version > SCHEMA_VERSION:
+            logging.warning('Preferences are from a newer version and '
+                            'will not be saved')
+            self.writable = False
+        while version < SCHEMA_VERSION:
+            values = MIGRATIONS[version](values)
+            version = version + 1
+
+        for name in DEFAULTS:
+            if name in values:
+                self.values[name] = values[name]
+
+    def get(self, name):
+        assert name in DEFAULTS, 'Unknown preference: ' + name
+        return self.values[name]
+
+    def set(self, name, value):
+        """Change a preference and save the preferences"""
+
+        assert name in DEFAULTS, 'Unknown preference: ' + name
+        if self.values[name] == value:
+            return
+        self.values[name] = value
+        self.save()
+
+    def presetNames(self):
+        """Return the names of the saved presets in order"""
+
+        return sorted(self.values['presets'])
+
+    def getPreset(self, name):
+        """Return the (section, metadata) saved as preset name"""
+
+        preset = self.values['presets'][name]
+        return preset['section'], dict(preset['metadata'])
+
+    def savePreset(self, name, section, metadata):
+        """Save a named section and metadata for reuse"""
+
+        presets = dict(self.values['presets'])
+        presets[name] = {'section' : section, 'metadata' : dict(metadata)}
+        self.set('presets', presets)
+
+    def deletePreset(self, name):
+        presets = dict(self.values['presets'])
+        if presets.pop(name, None) != None:
+            self.set('presets', presets)
+
+    def save(self):
+        if not self.path or not self.writable:
+            return
+
+        values = dict(self.values)
+        values['version'] = SCHEMA_VERSION
+        try:
+            write_atomically(self.path, json.dumps(values, indent = 1,
+                                                   sort_keys = True))
+        except EnvironmentError, e:
+            logging.warning('Preferences not saved: ' + str(e))
@@ -0,0 +1,241 @@
+# LaBLogRetry: Retry policies for the LaBLogPost request path
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to lablogretry.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Dependencies: The module requires a range of modules from the
+# Python 2.6 standard library.
+
+import sys
+import time
+import random
+import socket
+import httplib
+import urllib2
+import logging
+import threading
+
+# Global Variables
+
+DEFAULT_ATTEMPTS = 4
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30.0
+DEFAULT_BUDGET = 100
+DEFAULT_THRESHOLD = 5
+DEFAULT_PAUSE = 30.0
+
+class RetryBudget(object):
+    """A limit on the number of retries made across a whole batch
+
+    Each retry takes one from the budget and once it is used up
+    failures are no longer retried, so that a batch against a server
+    that is failing most requests does not multiply its load.
+    """
+
+    def __init__(self, retries = DEFAULT_BUDGET):
+        self.retries = retries
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Take a retry from the budget, returning False if none left"""
+
+        self.lock.acquire()
+        try:
+            if self.retries <= 0:
+                return False
+            self.retries -= 1
+            return True
+        finally:
+            self.lock.release()
+
+
+class DeadlineExceeded(socket.timeout):
+    """Raised for requests that would run past a Deadline"""
+
+    pass
+
+
+class Deadline(object):
+    """A time by which a whole batch of requests must finish
+
+    Requests made against a deadline are given a timeout no longer
+    than the time remaining and are not started, or retried, once it
+    has passed.
+    """
+
+    def __init__(self, seconds, clock = time.time):
+        self.clock = clock
+        self.expires = clock() + seconds
+
+    def remaining(self):
+        return max(0, self.expires - self.clock())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def limit(self, timeout):
+        """Return timeout cut down to the time remaining
+
+        Raises DeadlineExceeded if the deadline has passed.
+        """
+
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded('Batch deadline passed')
+        return min(timeout, remaining)
+
+
+class CircuitBreaker(object):
+    """Pauses requests after a run of consecutive failures
+
+    After threshold failures in a row, with no success between them,
+    the circuit opens and every call to wait() blocks until pause
+    seconds have passed since the last failure. Requests then go
+    through again; one more failure reopens the circuit straight
+    away while a success closes it.
+    """
+
+    def __init__(self, threshold = DEFAULT_THRESHOLD,
+                 pause = DEFAULT_PAUSE, sleep = time.sleep,
+                 clock = time.time):
+        self.threshold = threshold
+        self.pause = pause
+        self.sleep = sleep
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def is_open(self):
+        self.lock.acquire()
+        try:
+            return (self.opened_at != None and
+                    self.clock() - self.opened_at < self.pause)
+        finally:
+            self.lock.release()
+
+    def wait(self):
+        """Block while the circuit is open"""
+
+        while True:
+            self.lock.acquire()
+            try:
+                if self.opened_at == None:
+                    return
+                remaining = self.pause - (self.clock() - self.opened_at)
+            finally:
+                self.lock.release()
+
+            if remaining <= 0:
+                return
+            self.sleep(remaining)
+
+    def success(self):
+        self.lock.acquire()
+        try:
+            self.failures = 0
+            self.opened_at = None
+        finally:
+            self.lock.release()
+
+    def failure(self):
+        self.lock.acquire()
+        try:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                if self.opened_at == None:
+                    logging.warning('%d consecutive failures, pausing '
+                                    'requests for %.0f s',
+                                    self.failures, self.pause)
+                self.opened_at = self.clock()
+        finally:
+            self.lock.release()
+
+
+class RetryPolicy(object):
+    """Retries failed requests with capped exponential backoff
+
+    call() makes up to max_attempts attempts. Before retry n it sleeps
+    for a random time between zero and min(max_delay, base_delay * 2**n)
+    ('full jitter') so that the retries of many clients, or many
+    worker threads, do not arrive at the server together. Retries are
+    also limited by budget, a RetryBudget shared by the batch, and
+    wait while breaker, a CircuitBreaker, is open.
+
+    Network errors, HTTP 5xx and 429 errors and responses that cannot
+    be parsed are retried. Other errors, such as HTTP 4xx or a passed
+    Deadline, are raised at once.
+    """
+
+    def __init__(self, max_attempts = DEFAULT_ATTEMPTS,
+                 base_delay = DEFAULT_BASE_DELAY,
+                 max_delay = DEFAULT_MAX_DELAY, budget = None,
+                 breaker = None, sleep = time.sleep,
+                 random = random.random):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.breaker = breaker
+        self.sleep = sleep
+        self.random = random
+
+    def delay(self, attempt):
+        """Return the time to wait before retry number attempt"""
+
+        return self.random() * min(self.max_delay,
+                                   self.base_delay * 2 ** attempt)
+
+    def is_retryable(self, error):
+        if isinstance(error, DeadlineExceeded):
+            return False
+        if isinstance(error, urllib2.HTTPError):
+            return error.code >= 500 or error.code == 429
+        return isinstance(error, (urllib2.URLError, socket.error,
+                                  httplib.HTTPException, SyntaxError))
+
+    def call(self, func, args = (), retry_result = None):
+        """Call func(*args) retrying it on failure
+
+        A failure is a retryable exception or, if retry_result is
+        given, a result for which retry_result(result) is True. If the
+        attempts or budget run out the last exception is raised or the
+        last result returned.
+        """
+
+        attempt = 0
+        while True:
+            if self.breaker:
+                self.breaker.wait()
+
+            try:
+                result = func(*args)
+                error = None
+            except Exception, e:
+                if not self.is_retryable(e):
+                    raise
+                error = e
+                info = sys.exc_info()
+
+            if error == None and not (retry_result and
+                                      retry_result(result)):
+                if self.breaker:
+                    self.breaker.success()
+                return result
+
+            if self.breaker:
+                self.breaker.failure()
+
+            attempt += 1
+            if (attempt >= self.max_attempts or
+                (self.budget and not self.budget.take())):
+                if error != None:
+                    raise info[0], info[1], info[2]
+                return result
+
+            logging.info('Retrying after failure: %s', error)
+            self.sleep(self.delay(attempt))
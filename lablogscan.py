@@ -0,0 +1,194 @@
+# LaBLogScan: Streaming scans of data directories for upload
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to lablogscan.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Dependencies: The module requires a range of modules from the
+# Python 2.6 standard library. The scandir module, the backport of
+# os.scandir, is used if it is installed and os.scandir itself on
+# Python 3.5 and later, otherwise directories are read with os.listdir.
+
+import os
+import os.path
+import re
+import stat
+import fnmatch
+
+try:
+    from os import scandir
+except ImportError:
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+# Global Variables
+
+DEFAULT_BATCH_SIZE = 1000
+
+class ListdirEntry(object):
+    """The parts of os.DirEntry used here, for when scandir is missing"""
+
+    def __init__(self, directory, name):
+        self.name = name
+        self.path = os.path.join(directory, name)
+        self.stat_result = None
+
+    def stat(self):
+        if self.stat_result == None:
+            self.stat_result = os.stat(self.path)
+        return self.stat_result
+
+    def is_dir(self, follow_symlinks = True):
+        if not follow_symlinks and os.path.islink(self.path):
+            return False
+        try:
+            return stat.S_ISDIR(self.stat().st_mode)
+        except OSError:
+            return False
+
+    def is_file(self):
+        try:
+            return stat.S_ISREG(self.stat().st_mode)
+        except OSError:
+            return False
+
+def iter_entries(directory):
+    """Return an iterator over the entries of a directory
+
+    The entries have the name and path attributes and is_dir, is_file
+    and stat methods of os.DirEntry. With scandir the entries are read
+    as they are needed and the type of each usually comes from the
+    directory listing itself, without a stat call for each. OSError is
+    raised straight away if the directory cannot be opened.
+    """
+
+    if scandir != None:
+        return scandir(directory)
+    return iter([ListdirEntry(directory, name) 
+                 for name in os.listdir(directory)])
+
+def natural_key(name):
+    """Sort key that orders the numbers within names by value
+
+    So 'run2.dat' comes before 'run10.dat'.
+    """
+
+    parts = re.split(r'(\d+)', name)
+    for i in range(1, len(parts), 2):
+        parts[i] = int(parts[i])
+    return parts
+
+
+class DirectoryScanner(object):
+    """Streams the paths of the files in a data directory
+
+    Iterating over the scanner yields the paths of the regular files
+    in directory, and with recursive set those in its subdirectories,
+    while the directory is still being read, so that uploading can
+    start straight away however large the directory. Entries are read
+    in batches of batch_size and the files of each batch are given in
+    natural order (see natural_key). Each directory's subdirectories
+    are scanned, in natural order, after its files. Symbolic links to
+    directories are not followed.
+
+    Include and exclude are lists of glob patterns matched against
+    file names, or against the path relative to directory for patterns
+    containing a '/'. If include is given only files matching one of
+    its patterns are given. Files and subdirectories matching an
+    exclude pattern are left out. Files smaller than min_size or
+    larger than max_size bytes are left out. Hidden files and
+    directories, such as the upload journal, are always left out.
+    """
+
+    def __init__(self, directory, recursive = False, include = None,
+                 exclude = None, min_size = None, max_size = None,
+                 batch_size = DEFAULT_BATCH_SIZE):
+        assert batch_size > 0, 'Batch size must be positive'
+        self.directory = directory
+        self.recursive = recursive
+        self.include = include or []
+        self.exclude = exclude or []
+        self.min_size = min_size
+        self.max_size = max_size
+        self.batch_size = batch_size
+
+    def __iter__(self):
+        for batch in self.batches():
+            for path in batch:
+                yield path
+
+    def matches(self, patterns, name, relpath):
+        for pattern in patterns:
+            if '/' in pattern:
+                if fnmatch.fnmatch(relpath, pattern):
+                    return True
+            elif fnmatch.fnmatch(name, pattern):
+                return True
+        return False
+
+    def accept(self, entry, relpath):
+        """Return whether a file entry passes the filters"""
+
+        if self.include and not self.matches(self.include, entry.name,
+                                             relpath):
+            return False
+        if self.matches(self.exclude, entry.name, relpath):
+            return False
+        if self.min_size != None or self.max_size != None:
+            size = entry.stat().st_size
+            if self.min_size != None and size < self.min_size:
+                return False
+            if self.max_size != None and size > self.max_size:
+                return False
+        return True
+
+    def batches(self):
+        """Yield lists of the paths of files, each list naturally sorted"""
+
+        pending = [('', self.directory)]
+        while pending:
+            prefix, directory = pending.pop(0)
+            subdirectories = []
+            batch = []
+            try:
+                entries = iter_entries(directory)
+            except OSError:
+                if directory == self.directory:
+                    raise
+                continue # Removed while being scanned
+
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue
+                relpath = prefix + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks = False):
+                        if (self.recursive and not
+                            self.matches(self.exclude, entry.name, relpath)):
+                            subdirectories.append((relpath + '/',
+                                                   entry.path))
+                        continue
+                    if not entry.is_file() or not self.accept(entry,
+                                                              relpath):
+                        continue
+                except OSError:
+                    continue # Removed while being scanned
+
+                batch.append((natural_key(entry.name), entry.path))
+                if len(batch) == self.batch_size:
+                    batch.sort()
+                    yield [path for key, path in batch]
+                    batch = []
+
+            if batch:
+                batch.sort()
+                yield [path for key, path in batch]
+
+            # Scan the subdirectories depth first
+            subdirectories.sort(key = lambda item: natural_key(item[0]))
+            pending[0:0] = subdirectories
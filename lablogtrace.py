@@ -0,0 +1,132 @@
+# LaBLogTrace: Tracing of the requests made to a LaBLog
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to lablogtrace.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Dependencies: The module requires the os, re, json, time and logging
+# modules of the Python 2.6 standard library. logging.handlers is only
+# imported when tracing is turned on.
+
+import os
+import os.path
+import re
+import json
+import time
+import logging
+
+# Global Variables
+
+DEFAULT_TRACE = os.path.join(os.path.expanduser('~'), '.lablog-trace.log')
+DEFAULT_MAX_BYTES = 1 << 20
+DEFAULT_BACKUPS = 3
+MAX_FIELD = 200             # Characters kept of a traced or logged value
+
+# The API user ID in request URLs is a credential and is not traced
+UID_PATTERN = re.compile(r'(/uid/)[^/?]+')
+
+# Spans are written to their own logger so they stay out of the
+# application log
+logger = logging.getLogger('lablog.trace')
+logger.propagate = False
+
+# Set by enable(). Nothing is timed or formatted for a span unless set
+enabled = False
+
+class Truncated(object):
+    """A value cut down to limit characters when it is formatted
+
+    Passing Truncated(payload) as an argument of a logging call,
+    rather than formatting the payload into the message, means that
+    nothing is formatted unless the message is written, and that a
+    large payload such as an encoded data object is not written whole.
+    """
+
+    def __init__(self, value, limit = MAX_FIELD):
+        self.value = value
+        self.limit = limit
+
+    def __str__(self):
+        text = str(self.value)
+        if len(text) <= self.limit:
+            return text
+        return '%s... [%d characters]' % (text[:self.limit], len(text))
+
+def redact_url(url):
+    """Return url with the API user ID left out"""
+
+    return UID_PATTERN.sub(r'\1...', url)
+
+
+class Span(object):
+    """The timing and outcome of a single request
+
+    The span is timed from its creation until finish(), when it is
+    written to the trace as one JSON object holding its name, start
+    time, seconds taken and fields, such as the url, which is redacted,
+    the number of bytes sent and the status code returned, along with
+    any error.
+    """
+
+    def __init__(self, name, fields):
+        self.name = name
+        self.fields = fields
+        self.start = time.time()
+
+    def finish(self, error = None, **fields):
+        seconds = time.time() - self.start
+        self.fields.update(fields)
+        if 'url' in self.fields:
+            self.fields['url'] = redact_url(self.fields['url'])
+        if error != None:
+            self.fields['error'] = str(Truncated('%s: %s' % (
+                                       type(error).__name__, error)))
+        self.fields['span'] = self.name
+        self.fields['start'] = round(self.start, 3)
+        self.fields['seconds'] = round(seconds, 4)
+        logger.debug(json.dumps(self.fields, sort_keys = True))
+
+class NullSpan(object):
+    """The span returned while tracing is off, which does nothing"""
+
+    def finish(self, error = None, **fields):
+        pass
+
+NULL_SPAN = NullSpan()
+
+def span(name, **fields):
+    """Start timing a request, returning a Span or the NULL_SPAN"""
+
+    if not enabled:
+        return NULL_SPAN
+    return Span(name, fields)
+
+def enable(path = DEFAULT_TRACE, max_bytes = DEFAULT_MAX_BYTES,
+           backups = DEFAULT_BACKUPS):
+    """Write spans to path, which is rotated once it reaches max_bytes
+
+    The backups most recent rotated files are kept as path.1 and so on.
+    """
+
+    global enabled
+    import logging.handlers
+
+    handler = logging.handlers.RotatingFileHandler(path,
+                                                   maxBytes = max_bytes,
+                                                   backupCount = backups)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    enabled = True
+
+def disable():
+    """Stop tracing and close the trace files"""
+
+    global enabled
+    enabled = False
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
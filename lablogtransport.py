@@ -0,0 +1,150 @@
+# LaBLogTransport: Transports for the LaBLogPost request path
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to lablogtransport.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Dependencies: The module requires a range of modules from the
+# Python 2.6 standard library.
+
+import errno
+import socket
+import urllib2
+import urlparse
+import tempfile
+import BaseHTTPServer
+from StringIO import StringIO
+
+# Global Variables
+
+BLOCK_SIZE = 65536
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 30.0
+
+class Transport(object):
+    """The interface through which LaBLog requests are sent
+
+    A transport sends the body of a request to a LaBLog URL with
+    post() and returns the response as a file-like object. The body
+    may be a string or a file-like object providing read() and len(),
+    such as a lablogpost.StreamingBody whose content_type is sent as
+    the Content-Type unless one is given in headers.
+
+    Errors are raised as for urllib2.urlopen: urllib2.HTTPError for
+    responses with an HTTP error status and urllib2.URLError when no
+    response is received. Transports may be shared between threads.
+
+    A request waits at most read_timeout seconds for the server at any
+    point, unless a timeout for that request is given to post(). The
+    timeouts only apply to the transport's own sockets.
+    """
+
+    read_timeout = DEFAULT_READ_TIMEOUT
+
+    def post(self, url, body, headers = None, timeout = None):
+        raise NotImplementedError
+
+    def close(self):
+        """Release any connections or other resources held"""
+
+        pass
+
+    def request_headers(self, body, headers = None):
+        """Return the headers to send with body"""
+
+        requestheaders = {'Content-Length' : str(len(body))}
+        if hasattr(body, 'content_type'):
+            requestheaders['Content-Type'] = body.content_type
+        if headers:
+            requestheaders.update(headers)
+        return requestheaders
+
+
+class Response(StringIO):
+    """A fully read response to a request made by a transport"""
+
+    def __init__(self, content, status, reason, url):
+        StringIO.__init__(self, content)
+        self.status = status
+        self.reason = reason
+        self.url = url
+
+
+class Urllib2Transport(Transport):
+    """Sends each request with urllib2 on a new connection
+
+    Requests go through the opener installed with urllib2.install_opener
+    unless proxies, a dictionary mapping a URL scheme to a proxy URL,
+    are given in which case an opener using those proxies is built.
+    urllib2 uses the same timeout for connecting as for reading.
+    """
+
+    def __init__(self, proxies = None, read_timeout = DEFAULT_READ_TIMEOUT):
+        self.read_timeout = read_timeout
+        self.opener = None
+        if proxies != None:
+            self.opener = urllib2.build_opener(urllib2.ProxyHandler(proxies))
+
+    def post(self, url, body, headers = None, timeout = None):
+        if timeout == None:
+            timeout = self.read_timeout
+        request = urllib2.Request(url, body, self.request_headers(body,
+                                                                  headers))
+        if self.opener:
+            return self.opener.open(request, timeout = timeout)
+        return urllib2.urlopen(request, timeout = timeout)
+
+
+class InMemoryTransport(Transport):
+    """Hands requests straight to a handler in the same process
+
+    The handler is called as handler(path, headers, body) with the
+    request path, the request headers in a dictionary with lower case
+    keys and the body as a file. It returns (status, content) for the
+    HTTP response, or None to act as a server resetting the connection.
+    No sockets are used, which makes the transport useful for tests
+    and for benchmarks without network overhead, for example with a
+    lablogmock.MockLaBLogApp as the handler.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    def post(self, url, body, headers = None, timeout = None):
+        requestheaders = {}
+        for name, value in self.request_headers(body, headers).items():
+            requestheaders[name.lower()] = value
+
+        # Spool the body as a server would receive it
+        bodyfile = tempfile.TemporaryFile()
+        if hasattr(body, 'read'):
+            block = body.read(BLOCK_SIZE)
+            while block:
+                bodyfile.write(block)
+                block = body.read(BLOCK_SIZE)
+        else:
+            bodyfile.write(body)
+        bodyfile.seek(0)
+
+        scheme, netloc, path, query, fragment = urlparse.urlsplit(url)
+        if query:
+            path = path + '?' + query
+        try:
+            result = self.handler(path, requestheaders, bodyfile)
+        finally:
+            bodyfile.close()
+
+        if result == None:
+            raise urllib2.URLError(socket.error(errno.ECONNRESET,
+                                                'Connection reset by peer'))
+
+        status, content = result
+        reason = BaseHTTPServer.BaseHTTPRequestHandler.responses.get(status,
+                                                                  ('',))[0]
+        if status >= 400:
+            raise urllib2.HTTPError(url, status, reason, {},
+                                    StringIO(content))
+        return Response(content, status, reason, url)
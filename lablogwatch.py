@@ -0,0 +1,317 @@
+# LaBLogWatch: Watching a data directory for new files to upload
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to lablogwatch.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Dependencies: The module requires a range of modules from the
+# Python 2.6 standard library and the lablogprefs module, whose atomic
+# writes are used for the cursor. inotify is used through ctypes on
+# Linux and directories are polled elsewhere.
+
+import os
+import os.path
+import sys
+import json
+import time
+import errno
+import select
+import struct
+import logging
+import threading
+import ctypes
+import ctypes.util
+import lablogprefs
+
+# Global Variables
+
+CURSOR_FILENAME = '.lablog-watch-cursor'
+DEFAULT_SETTLE = 0.5
+DEFAULT_POLL_INTERVAL = 1.0
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct('iIII')
+
+class WatchCursor(object):
+    """The names of the files in a directory that have been handled
+
+    The names are kept in a file in the directory, one JSON string per
+    line, which is appended to as each file is handled so that a
+    watcher restarted later does not hand the same files out again.
+    Names of files no longer in the directory are dropped when the
+    cursor is opened.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.names = set()
+        if os.path.exists(path):
+            cursorfile = open(path, 'rb')
+            try:
+                for line in cursorfile:
+                    try:
+                        self.names.add(json.loads(line))
+                    except ValueError:
+                        pass # A line cut short by a crash
+            finally:
+                cursorfile.close()
+            self.compact()
+        self.cursorfile = open(path, 'ab')
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_directory(cls, directory):
+        """Open the cursor kept in a data directory"""
+
+        return cls(os.path.join(directory, CURSOR_FILENAME))
+
+    def compact(self):
+        """Rewrite the cursor with only the names still present"""
+
+        directory = os.path.dirname(self.path)
+        present = set(os.listdir(directory or '.'))
+        self.names = self.names & present
+        lablogprefs.write_atomically(self.path, ''.join(
+                        [json.dumps(name) + '\n' for name in self.names]))
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def add(self, name):
+        """Record that the file called name has been handled"""
+
+        self.lock.acquire()
+        try:
+            if name not in self.names:
+                self.names.add(name)
+                self.cursorfile.write(json.dumps(name) + '\n')
+                self.cursorfile.flush()
+        finally:
+            self.lock.release()
+
+    def close(self):
+        self.cursorfile.close()
+
+
+def load_libc():
+    """Return the C library if it provides inotify, otherwise None"""
+
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                           use_errno = True)
+        libc.inotify_init1
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+class InotifyBackend(object):
+    """Reports the names of files changed in a directory with inotify"""
+
+    def __init__(self, directory, libc):
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if libc.inotify_add_watch(self.fd, directory, WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(error, 'inotify_add_watch failed: ' + directory)
+
+    def wait(self, timeout):
+        """Wait up to timeout seconds for changes
+
+        Returns the set of names changed, or None if the directory
+        must be scanned again in full.
+        """
+
+        try:
+            readable = select.select([self.fd], [], [], timeout)[0]
+        except select.error, e:
+            if e.args[0] == errno.EINTR:
+                return set()
+            raise
+        if not readable:
+            return set()
+
+        try:
+            buffer = os.read(self.fd, 65536)
+        except OSError, e:
+            if e.errno == errno.EAGAIN:
+                return set()
+            raise
+
+        names = set()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(buffer):
+            wd, mask, cookie, length = EVENT_HEADER.unpack_from(buffer,
+                                                                offset)
+            offset += EVENT_HEADER.size
+            if mask & IN_Q_OVERFLOW:
+                return None
+            if length:
+                names.add(buffer[offset:offset + length].rstrip('\0'))
+            offset += length
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingBackend(object):
+    """Asks for the directory to be scanned every interval seconds"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.last = 0
+
+    def wait(self, timeout):
+        remaining = self.last + self.interval - time.time()
+        if remaining > timeout:
+            time.sleep(timeout)
+            return set()
+        if remaining > 0:
+            time.sleep(remaining)
+        self.last = time.time()
+        return None
+
+    def close(self):
+        pass
+
+
+class DirectoryWatcher(object):
+    """Hands out the files in a directory once they are complete
+
+    files() is a generator yielding the path of each file in the
+    directory, first those already there and then new files as they
+    appear, once its size and modification time have not changed for
+    settle seconds. Hidden files, such as the upload journal or the
+    partial files of rsync, are ignored. Changes are seen at once with
+    inotify on Linux and otherwise by scanning the directory every
+    poll_interval seconds.
+
+    Files are handed out one at a time and the caller calls done(path)
+    for each file it has dealt with, which records it in cursor, by
+    default the WatchCursor kept in the directory, so that it is not
+    handed out again, even after a restart. Files that are not done
+    are handed out again after a restart.
+    """
+
+    def __init__(self, directory, settle = DEFAULT_SETTLE,
+                 poll_interval = DEFAULT_POLL_INTERVAL, cursor = None,
+                 use_inotify = True):
+        self.directory = directory
+        self.settle = settle
+        self.poll_interval = poll_interval
+        if cursor == None:
+            cursor = WatchCursor.for_directory(directory)
+        self.cursor = cursor
+        self.pending = {}
+        self.handed_out = set()
+
+        self.backend = None
+        libc = None
+        if use_inotify:
+            libc = load_libc()
+        if libc:
+            try:
+                self.backend = InotifyBackend(directory, libc)
+            except OSError, e:
+                logging.warning('Polling for new files, inotify '
+                                'unavailable: ' + str(e))
+        if self.backend == None:
+            self.backend = PollingBackend(poll_interval)
+
+    def track(self, name):
+        """Start waiting for the file called name to settle"""
+
+        if (name.startswith('.') or name in self.cursor or
+            name in self.handed_out):
+            return
+
+        path = os.path.join(self.directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.pending.pop(name, None)
+            return
+        if not os.path.isfile(path):
+            return
+
+        state = (stat.st_size, stat.st_mtime)
+        if name not in self.pending or self.pending[name][0] != state:
+            self.pending[name] = (state, time.time())
+
+    def scan(self):
+        for name in os.listdir(self.directory):
+            self.track(name)
+
+    def settled(self):
+        """Return the paths of the pending files that have settled
+
+        The paths are returned oldest first.
+        """
+
+        now = time.time()
+        ready = []
+        for name, (state, since) in self.pending.items():
+            self.track(name)
+            if name in self.pending and self.pending[name][1] == since:
+                if now - since >= self.settle:
+                    ready.append((state[1], name))
+
+        ready.sort()
+        paths = []
+        for mtime, name in ready:
+            del self.pending[name]
+            self.handed_out.add(name)
+            paths.append(os.path.join(self.directory, name))
+        return paths
+
+    def files(self, stop = None):
+        """Yield the paths of complete files until stop is set
+
+        Stop is a threading.Event that is checked at least every
+        poll_interval seconds.
+        """
+
+        self.scan()
+        while stop == None or not stop.isSet():
+            for path in self.settled():
+                yield path
+                if stop != None and stop.isSet():
+                    return
+
+            # Check on pending files often enough to notice them settle
+            timeout = self.poll_interval
+            if self.pending:
+                timeout = min(timeout, self.settle / 5.0)
+
+            changed = self.backend.wait(timeout)
+            if changed == None:
+                self.scan()
+            else:
+                for name in changed:
+                    self.track(name)
+
+    def done(self, path):
+        """Record that a file handed out has been dealt with"""
+
+        name = os.path.basename(path)
+        self.cursor.add(name)
+        self.handed_out.discard(name)
+
+    def close(self):
+        self.backend.close()
+        self.cursor.close()
@@ -0,0 +1,372 @@
+# LaBLog Poster: A desktop App for interacting with the University of 
+# Southampton LaBLog system as an electronic laboratory notebook
+#
+# Copyright (C) 2010 Cameron Neylon
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Dependencies: The tests require PyQt and Qt to be installed and the
+# TestingConnectionBox module available with this source distribution.
+#
+# Usage: python test_desktopAppDoc.py
+
+import unittest
+from PyQt4.QtCore import *
+from desktopAppDoc import *
+from TestingConnectionBox import *
+
+class AbstractTestCase(unittest.TestCase):
+    """An abstract test case that contains all the setup variables"""
+
+    def setUp(self):
+        self.doc = MultiPostDoc()
+        self.connectionBox = ConnectionBox()
+        self.types = [int, str, bool]
+        self.testint = 1
+        self.teststring = 'a test string'
+        self.testbool = True
+        self.testparams = [self.testint, self.teststring, self.testbool]
+        self.doc = MultiPostDoc()
+
+        self.signals = [{'signal'     : 'sigDocCurrentBlogServerSet',
+                         'function'   : self.doc.setCurrentBlogServer,
+                         'getmethod'  : self.doc.getCurrentBlogServer,
+                         'funcparams' : 1,
+                         'testparam'  : [self.testint],
+                         'returnexp'  : 'http://blogs.chem.soton.ac.uk',
+                         'funcptype'  : int,
+                         'returnspar' : 1,
+                         'returntype' : str},
+
+                        {'signal'     : 'sigDocCurrentBlogSet',
+                         'function'   : self.doc.setCurrentBlog,
+                         'getmethod'  : self.doc.getCurrentBlog,
+                         'funcparams' : 1,
+                         'testparam'  : [0],
+                         'returnexp'  : 'camerons_labblog',
+                         'funcptype'  : int,
+                         'returnspar' : 1,
+                         'returntype' : str},
+
+                        {'signal'     : 'sigDocCurrentUsernameSet',
+                         'function'   : self.doc.setCurrentUsername,
+                         'getmethod'  : self.doc.getCurrentUsername,
+                         'funcparams' : 1,
+                         'testparam'  : [0],
+                         'returnexp'  : 'cameron.neylon.myopenid.com',
+                         'funcptype'  : int,
+                         'returnspar' : 1,
+                         'returntype' : str},
+
+                        {'signal'     : 'sigDocPostTitleSet',
+                         'function'   : self.doc.setPostTitle,
+                         'getmethod'  : self.doc.getPostTitle,
+                         'funcparams' : 1,
+                         'testparam'  : ['test_title'],
+                         'funcptype'  : str,
+                         'returnexp'  : self.teststring,
+                         'returnspar' : 1,
+                         'returntype' : str},
+
+                        {'signal'     : 'sigDocUseFilenameChanged',
+                         'function'   : self.doc.setUseFilename,
+                         'getmethod'  : self.doc.getUseFilename,
+                         'funcparams' : 1,
+                         'testparam'  : [True],
+                         'returnexp'  : self.testbool,
+                         'funcptype'  : bool,
+                         'returnspar' : 1,
+                         'returntype' : bool},
+
+                        {'signal'     : 'sigDocPostContentChanged',
+                         'function'   : self.doc.setPostContent,
+                         'getmethod'  : self.doc.getPostContent,
+                         'funcparams' : 1,
+                         'testparam'  : ['some text content'],
+                         'returnexp'  : self.teststring,
+                         'funcptype'  : str,
+                         'returnspar' : 1,
+                         'returntype' : str},
+
+                        {'signal'     : 'sigDocDataDirectoryChanged',
+                         'function'   : self.doc.setDataDirectory,
+                         'getmethod'  : self.doc.getDataDirectory,
+                         'funcparams' : 1,
+                         'testparam'  : ['some string'],
+                         'returnexp'  : self.teststring,
+                         'funcptype'  : str,
+                         'returnspar' : 1,
+                         'returntype' : str}
+                        ] 
+
+    def tearDown(self):
+        self.doc = None
+        self.connectionBox = None
+
+class InitTestCase(unittest.TestCase):
+    """Check that documents initialize properly
+    """
+
+    def checkInitialisation(self):
+        """Check that documents initialize properly as expected
+        """
+
+        self.doc = MultiPostDoc()
+
+        self.assertEqual(self.doc.blogserverlist, [
+                               'http://biolab.isis.rl.ac.uk',
+                               'http://blogs.chem.soton.ac.uk',
+                               'http://blog_dev.sidious.chem.soton.ac.uk'])
+        self.assertEqual(self.doc.currentblogserver, 
+                               'http://biolab.isis.rl.ac.uk')
+        self.assertEqual(self.doc.currentblog, 'testing_sandpit')
+        self.assertEqual(self.doc.currentusername, 'cameronneylon.net')
+        self.assertEqual(self.doc.posttitle, '')
+        self.assertEqual(self.doc.usefilename, False)
+        self.assertEqual(self.doc.postcontent, '')
+
+class ErrorCatchingTestCase(AbstractTestCase):
+    """Check that all set functions fire errors as expected
+    """
+
+
+    def checkErrors(self):
+        """Test case that tries all parameters against all functions
+
+        The test case loops over each of the functions registered and
+        then within each function calls the set Function with the
+        registered test parameters of each type. For the incorrect
+        parameter types it checks that the error catching method is
+        triggered, that the correct error message is provided, and that
+        the sigDocumentError is emitted. For the correct type the
+        set value is compared to what it was meant to be set to.
+        """
+
+        self.connectionBox.connect(self.doc,
+                                   SIGNAL('sigDocumentError'),
+                                   self.connectionBox.slotSlot)
+                                         
+        # Loop over all the functions defined
+        i = 0
+        while i < len(self.signals):
+            j = 0
+
+            # Loop over all registered types to be passed to functions
+            while j < len(self.types):
+
+                # If the type doesn't match required type should return False
+                # provide the correct error message and emit the 
+                # sigDocumentError signal
+                if self.types[j] != self.signals[i]['funcptype']:
+                    test = self.signals[i]['function'](self.testparams[j])
+                    self.assertEqual(test, False)
+                    self.connectionBox.assertSignalArrived('sigDocumentError')
+
+                # If it does match, should work and return correct param
+                elif self.types[j] == self.signals[i]['funcptype']:
+                    self.signals[i]['function'](self.testparams[j])
+                    self.assertEqual(self.signals[i]['getmethod'](),
+                                     self.signals[i]['returnexp'])
+
+                j = j + 1
+
+            # Need to initialise everything before next signal test
+            self.doc.__init__()
+
+            i = i + 1
+
+
+                
+class SignalsTestCase(AbstractTestCase):
+    """Test the signals for the document
+    """
+
+    def tearDown(self):
+        self.doc = None
+        self.connectionBox = None
+
+    def runSignalArrives(self, index):
+        self.connectionBox.connect(self.doc, 
+                                   SIGNAL(self.signals[index]['signal']), 
+                                   self.connectionBox.slotSlot)
+
+        args = self.signals[index]['testparam']
+        self.signals[index]['function'](*args)
+        self.connectionBox.assertSignalArrived(self.signals[index]['signal'])
+        self.connectionBox.disconnect(self.doc, 
+                                   SIGNAL(self.signals[index]['signal']), 
+                                   self.connectionBox.slotSlot)
+
+    def checkSignalArrives(self):
+        """Check that the correct signals arrive as expected
+        """
+
+        index = 0
+        while index < len(self.signals):
+            self.runSignalArrives(index)
+            index = index + 1
+
+    def runSignalDoesNotArrive(self, index):
+        """Check whether the sigDocModifiedXXX signal does not arrive"""
+
+        self.connectionBox.connect(self.doc, 
+                                   SIGNAL(self.signals[index]['signal']+'XXX'),
+                                   self.connectionBox.slotSlot)
+        args = self.signals[index]['testparam']
+        self.signals[index]['function'](*args)
+        
+
+        self.assertRaises(AssertionError,
+                          self.connectionBox.assertSignalArrived,
+                          signal = self.signals[index-1]['signal']+'XXX')
+
+        # Disconnect ConnectionBox before running next test
+        self.connectionBox.disconnect(self.doc, 
+                                   SIGNAL(self.signals[index]['signal']+'XXX'), 
+                                   self.connectionBox.slotSlot)
+        self.doc.__init__()
+
+
+    def checkSignalDoesNotArrive(self):
+        """Check whether the sigDocModifiedXXX signal does not arrive"""
+
+        index = 0
+        while index < len(self.signals):
+            self.runSignalDoesNotArrive(index)
+            index = index + 1
+
+    def runArgumentToSignal(self, index):
+        """Check whether the sigDocModified signal has the right
+           number of arguments
+        """
+        self.connectionBox.connect(self.doc, 
+                                   SIGNAL(self.signals[index]['signal']),
+                                   self.connectionBox.slotSlot)
+        args = self.signals[index]['testparam']
+        self.signals[index]['function'](*args)
+        self.connectionBox.assertNumberOfArguments(
+                                   self.signals[index]['returnspar'])
+
+        # Disconnect ConnectionBox before running next test
+        self.connectionBox.disconnect(self.doc, 
+                                   SIGNAL(self.signals[index]['signal']), 
+                                   self.connectionBox.slotSlot)
+        self.doc.__init__()
+
+    def checkArgumentToSignal(self):
+        """Check whether the sigDocModified signal has the right
+           number of arguments
+        """
+        index = 0
+        while index < len(self.signals):
+            self.runArgumentToSignal(index)
+            index = index + 1
+
+    def runArgumentTypes(self, index):
+        """Check whether the sigDocModified signal has the right 
+           type of arguments.
+        """
+        self.connectionBox.connect(self.doc,                                   
+                                   SIGNAL(self.signals[index]['signal']),
+                                   self.connectionBox.slotSlot)
+        args = self.signals[index]['testparam']
+        self.signals[index]['function'](*args)
+        self.connectionBox.assertArgumentTypes(
+                                   self.signals[index]['returntype'])
+
+        self.connectionBox.disconnect(self.doc, 
+                                   SIGNAL(self.signals[index]['signal']), 
+                                   self.connectionBox.slotSlot)
+        self.doc.__init__()
+
+
+    def checkArgumentTypes(self):
+        """Check whether the sigDocModified signal has the right 
+           type of arguments.
+        """
+
+        index = 0
+        while index < len(self.signals):
+            self.runArgumentTypes(index)
+            index+=1
+
+class UploadWorkerTestCase(unittest.TestCase):
+    """Check that the upload worker runs jobs and passes on cancels
+    """
+
+    def checkResultAndProgress(self):
+        """Check the job result is kept and progress is signalled
+        """
+
+        def job(worker):
+            worker.reportProgress(True)
+            worker.reportProgress(False)
+            return 'done'
+
+        worker = UploadWorker(job)
+        connectionBox = ConnectionBox()
+        connectionBox.connect(worker, SIGNAL('sigWorkerProgress'),
+                              connectionBox.slotSlot)
+        worker.run()
+        self.assertEqual(worker.result, 'done')
+        self.assertEqual(worker.error, None)
+        connectionBox.assertSignalArrived('sigWorkerProgress')
+        connectionBox.assertNumberOfArguments(1)
+
+    def checkError(self):
+        """Check that an exception in the job is caught and kept
+        """
+
+        def job(worker):
+            raise ValueError('failed')
+
+        worker = UploadWorker(job)
+        worker.run()
+        self.assertEqual(worker.result, None)
+        self.assertTrue(isinstance(worker.error, ValueError))
+
+    def checkCancel(self):
+        """Check that cancelling sets the flag and calls the callback
+        """
+
+        cancelled = []
+        worker = UploadWorker(lambda worker: None, 
+                              lambda: cancelled.append(True))
+        worker.cancel()
+        self.assertEqual(worker.cancelled, True)
+        self.assertEqual(cancelled, [True])
+
+def suite():
+    signalsTestSuite=unittest.makeSuite(SignalsTestCase, 'check')
+    initTestSuite = unittest.makeSuite(InitTestCase, 'check')
+    errorTestSuite = unittest.makeSuite(ErrorCatchingTestCase, 'check')
+    workerTestSuite = unittest.makeSuite(UploadWorkerTestCase, 'check')
+    testSuite = unittest.TestSuite([signalsTestSuite, 
+                                    initTestSuite,
+                                    errorTestSuite,
+                                    workerTestSuite])
+    return testSuite
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+    
+        
+if __name__ == '__main__':
+    main()
+
+        
+        
+        
+        
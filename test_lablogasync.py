@@ -0,0 +1,193 @@
+# Tests for lablogasync
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to test_lablogasync.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Usage: python test_lablogasync.py [TestCase[.test_method]]
+
+import os
+import json
+import time
+import shutil
+import socket
+import urllib2
+import tempfile
+import unittest
+import lablogmock
+import lablogpost
+import lablogtrace
+from lablogasync import *
+
+class TestAsyncLaBLogClient(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.server = lablogmock.MockLaBLog()
+        self.server.start()
+        lablogpost._inline_only_servers.clear()
+        lablogpost._multipart_servers.clear()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tempdir)
+        lablogpost._inline_only_servers.clear()
+        lablogpost._multipart_servers.clear()
+
+    def makeData(self, name, transfer = lablogpost.TRANSFER_INLINE):
+        path = os.path.join(self.tempdir, name)
+        f = open(path, 'wb')
+        f.write(name * 1000)
+        f.close()
+
+        data = lablogpost.LaBLogData()
+        data.set_type('inline')
+        data.transfer = transfer
+        data.set_data(path, stream = True)
+        return data
+
+    def makePost(self, title, data_id):
+        post = lablogpost.LaBLogPost(attached_data = [data_id])
+        post.set_title(title)
+        post.set_username('user')
+        post.set_section('')
+        post.set_content('Some test text')
+        post.set_blog_sname('testing_sandpit')
+        return post
+
+    def test_data_then_posts(self):
+        client = AsyncLaBLogClient(concurrency = 5)
+        posts = []
+        def data_posted(result):
+            title = 'post ' + result.get()
+            posts.append(client.doPost(self.makePost(title, result.get()),
+                                       self.server.url))
+
+        datasets = []
+        for i in range(20):
+            datasets.append(client.doPost(self.makeData('file%d.dat' % i),
+                                          self.server.url,
+                                          callback = data_posted))
+        client.run()
+
+        self.assertEqual(len(self.server.datasets), 20)
+        self.assertEqual(len(self.server.posts), 20)
+        for result in datasets:
+            self.assertTrue(result.get() in self.server.datasets)
+
+        for result in posts:
+            title, attached = self.server.posts[result.get()]
+            self.assertEqual(title, 'post ' + attached[0])
+
+    def test_trace(self):
+        path = os.path.join(self.tempdir, 'trace.log')
+        lablogtrace.enable(path)
+        try:
+            client = AsyncLaBLogClient()
+            client.doPost(self.makeData('file.dat'), self.server.url,
+                          uid = 'secret')
+            client.run()
+        finally:
+            lablogtrace.disable()
+        f = open(path)
+        spans = [json.loads(line) for line in f]
+        f.close()
+        self.assertEqual(len(spans), 1)
+        self.assertEqual(spans[0]['span'], 'AsyncRequest')
+        self.assertFalse('error' in spans[0])
+        self.assertFalse('secret' in spans[0]['url'])
+
+    def test_matches_sync_results(self):
+        client = AsyncLaBLogClient()
+        data = self.makeData('a.dat')
+        result = client.doPost(data, self.server.url)
+        client.run()
+        self.assertEqual(result.get(), data.data_id)
+        self.assertTrue(data.posted)
+        self.assertEqual(data.post_status_code, '200')
+
+        # Posting again is refused as it is by doPost
+        self.assertRaises(AssertionError, client.doPost, data,
+                          self.server.url)
+
+        # A rejected post gives None
+        post = self.makePost('', data.data_id)
+        result = client.doPost(post, self.server.url)
+        client.run()
+        self.assertEqual(result.get(), None)
+        self.assertEqual(post.post_status_code, '400')
+
+    def test_multipart_after_offered(self):
+        client = AsyncLaBLogClient()
+        for name in ['a.dat', 'b.dat']:
+            data = self.makeData(name, lablogpost.TRANSFER_MULTIPART)
+            multipart = data.useMultipart(self.server.url)
+            result = client.doPost(data, self.server.url)
+            client.run()
+            self.assertTrue(result.get())
+        # The second file is sent as multipart
+        self.assertTrue(multipart)
+        self.assertEqual(self.server.datasets[result.get()][2], 5000)
+
+    def test_multipart_falls_back_to_inline(self):
+        lablogpost._multipart_servers.add(self.server.url)
+        self.server.multipart = False
+        client = AsyncLaBLogClient()
+        results = [client.doPost(self.makeData(name,
+                                               lablogpost.TRANSFER_MULTIPART),
+                                 self.server.url)
+                   for name in ['a.dat', 'b.dat']]
+        client.run()
+        for result in results:
+            self.assertTrue(result.get())
+        self.assertTrue(self.server.url in lablogpost._inline_only_servers)
+        self.assertFalse(self.server.url in lablogpost._multipart_servers)
+
+    def test_proxy_request(self):
+        proxy = self.server.url.replace('http://', 'http://user:word@')
+        client = AsyncLaBLogClient(proxies = {'http' : proxy})
+        request = RequestDispatcher(client, 'http://lablog/api', 'body', 5,
+                                    None)
+        request.close()
+        head = request.outgoing.split('\r\n')
+        self.assertEqual(head[0], 'POST http://lablog/api HTTP/1.0')
+        self.assertTrue('Host: lablog' in head)
+        self.assertTrue('Proxy-Authorization: Basic dXNlcjp3b3Jk' in head)
+
+    def test_https_proxy_refused(self):
+        client = AsyncLaBLogClient(proxies = {'https' : self.server.url})
+        self.assertRaises(urllib2.URLError, RequestDispatcher, client,
+                          'https://lablog/api', 'body', 5, None)
+
+    def test_errors(self):
+        self.server.error_rate = 1
+        client = AsyncLaBLogClient()
+        result = client.doPost(self.makeData('a.dat'), self.server.url)
+        client.run()
+        self.assertRaises(urllib2.HTTPError, result.get)
+
+        # Nothing listening
+        closed = socket.socket()
+        closed.bind(('127.0.0.1', 0))
+        url = 'http://127.0.0.1:%d' % closed.getsockname()[1]
+        closed.close()
+        result = client.doPost(self.makeData('b.dat'), url)
+        client.run()
+        self.assertRaises(urllib2.URLError, result.get)
+
+    def test_timeout(self):
+        self.server.latency = 1
+        client = AsyncLaBLogClient(read_timeout = 0.1)
+        post = self.makePost('a', '1')
+        result = client.doPost(post, self.server.url)
+        start = time.time()
+        client.run()
+        self.assertTrue(time.time() - start < 0.9)
+        self.assertRaises(urllib2.URLError, result.get)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+# Tests for lablogbench
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to test_lablogbench.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Usage: python test_lablogbench.py [TestCase[.test_method]]
+
+import os
+import sys
+import json
+import time
+import subprocess
+import unittest
+import lablogmock
+import lablogpost
+from lablogbench import *
+
+class TestBenchmarks(unittest.TestCase):
+
+    def setUp(self):
+        self.server = lablogmock.MockLaBLog()
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_phase_timer_nesting(self):
+        timer = PhaseTimer()
+        timer.call('network', timer.call, 'read', time.sleep, 0.05)
+        self.assertTrue(timer.totals['read'] >= 0.05)
+        self.assertTrue(timer.totals['network'] < 0.05)
+
+    def test_peak_rss_not_inherited(self):
+        ballast = ' ' * (100 << 20)
+        child = subprocess.Popen([sys.executable, '-c',
+                                  'import lablogbench\n'
+                                  'print lablogbench.peak_rss_mb()'],
+                                 stdout = subprocess.PIPE,
+                                 cwd = os.path.dirname(
+                                           os.path.abspath(__file__)))
+        output = child.communicate()[0]
+        del ballast
+        self.assertTrue(float(output) < 100)
+
+    def test_instrument_restores(self):
+        original = lablogpost.LaBLogData.__dict__['serialize_body']
+        restore = instrument(PhaseTimer())
+        self.assertNotEqual(lablogpost.LaBLogData.__dict__['serialize_body'],
+                            original)
+        restore()
+        self.assertEqual(lablogpost.LaBLogData.__dict__['serialize_body'],
+                         original)
+
+    def test_scenario_results(self):
+        SCENARIOS['tiny'] = [(4, 1000), (1, 200000)]
+        lablogpost._multipart_servers.clear()
+        try:
+            multipart = run_scenario('tiny', self.server.url,
+                                     lablogpost.TRANSFER_MULTIPART,
+                                     concurrency = 2)
+            inline = run_scenario('tiny', self.server.url)
+        finally:
+            del SCENARIOS['tiny']
+
+        self.assertEqual(inline['data']['files'], 5)
+        self.assertEqual(inline['data']['bytes'], 204000)
+        for phase in PHASES:
+            self.assertTrue(inline['data']['phases'][phase] > 0)
+        self.assertEqual(multipart['upload']['phases']['encode'], 0)
+        for stage in ['data', 'upload']:
+            self.assertTrue(inline[stage]['request_bytes'] >
+                            multipart[stage]['request_bytes'] > 204000)
+        self.assertEqual(len(self.server.posts), 10)
+        json.dumps(inline)
+
+    def test_transports(self):
+        SCENARIOS['tiny'] = [(2, 1000)]
+        try:
+            for name in TRANSPORTS:
+                result = run_scenario('tiny', self.server.url,
+                                      client = make_transport(name))
+                self.assertEqual(result['upload']['files'], 2)
+        finally:
+            del SCENARIOS['tiny']
+        self.assertEqual(result['transport'], 'InMemoryTransport')
+        self.assertEqual(len(self.server.posts), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
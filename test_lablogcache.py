@@ -0,0 +1,91 @@
+# Tests for lablogcache
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to test_lablogcache.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Usage: python test_lablogcache.py [TestCase[.test_method]]
+
+import os
+import time
+import tempfile
+import unittest
+from lablogcache import *
+
+class TestDataCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.cache = DataCache(os.path.join(self.tempdir, 'cache.sqlite'))
+        self.server = 'http://lablog'
+        self.testfile = self.writeFile('a.dat', 'some data')
+
+    def tearDown(self):
+        self.cache.close()
+        for filename in os.listdir(self.tempdir):
+            os.remove(os.path.join(self.tempdir, filename))
+        os.rmdir(self.tempdir)
+
+    def writeFile(self, name, content):
+        path = os.path.join(self.tempdir, name)
+        f = open(path, 'wb')
+        f.write(content)
+        f.close()
+        return path
+
+    def test_store_and_lookup(self):
+        self.assertEqual(self.cache.lookup(self.server, self.testfile), None)
+        self.cache.store(self.server, self.testfile, '12')
+        self.assertEqual(self.cache.lookup(self.server, self.testfile), '12')
+        self.assertEqual(self.cache.lookup('http://other', self.testfile),
+                         None)
+
+    def test_same_contents_other_path(self):
+        self.cache.store(self.server, self.testfile, '12')
+        copy = self.writeFile('b.dat', 'some data')
+        self.assertEqual(self.cache.lookup(self.server, copy), '12')
+
+    def test_changed_file_rehashed(self):
+        self.cache.store(self.server, self.testfile, '12')
+        self.writeFile('a.dat', 'other data')
+        os.utime(self.testfile, (0, 0))
+        self.assertEqual(self.cache.lookup(self.server, self.testfile), None)
+
+    def test_eviction(self):
+        self.cache.max_entries = 2
+        for i in range(4):
+            path = self.writeFile(str(i) + '.dat', str(i))
+            self.cache.store(self.server, path, str(i))
+        self.cache.evict()
+        self.assertEqual(self.cache.lookup(self.server, path), '3')
+        count = self.cache.connection.execute(
+                              'SELECT COUNT(*) FROM data').fetchone()[0]
+        self.assertEqual(count, 2)
+
+    def test_eviction_keeps_hashes_in_use(self):
+        self.cache.max_entries = 2
+        paths = [self.writeFile(str(i) + '.dat', str(i)) for i in range(3)]
+        for path in paths[:2]:
+            self.cache.file_hash(path)
+            time.sleep(0.01)
+
+        # Using the oldest stored hash makes the other the one to go
+        self.cache.file_hash(paths[0])
+        time.sleep(0.01)
+        self.cache.file_hash(paths[2])
+        self.cache.evict()
+        kept = [row[0] for row in self.cache.connection.execute(
+                                      'SELECT path FROM files ORDER BY path')]
+        self.assertEqual(kept, [paths[0], paths[2]])
+
+    def test_invalidate(self):
+        self.cache.store(self.server, self.testfile, '12')
+        self.assertEqual(self.cache.invalidate(self.server), 1)
+        self.assertEqual(self.cache.lookup(self.server, self.testfile), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# Tests for lablogcatalogue
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to test_lablogcatalogue.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Usage: python test_lablogcatalogue.py [TestCase[.test_method]]
+
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+import subprocess
+import lablogmock
+import lablogtransport
+from lablogcatalogue import *
+
+class TestServerCatalogue(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'catalogue.json')
+        self.app = lablogmock.MockLaBLogApp()
+        self.app.catalogue = {
+            'blogs'     : [['testing_sandpit', ['Data', 'Notes']],
+                           ['lab_materials', []]],
+            'usernames' : ['ethem.myopenid.com', 'cameronneylon.net'],
+            'metadata'  : [['Instrument', ['x1', 'x2']]]}
+        self.client = lablogtransport.InMemoryTransport(self.app.dispatch)
+        self.now = 1000.0
+        self.catalogue = self.newCatalogue()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def newCatalogue(self):
+        return ServerCatalogue(self.path, ttl = 60,
+                               clock = lambda: self.now)
+
+    def refresh(self, catalogue, **kwargs):
+        return catalogue.refresh('http://lablog', client = self.client,
+                                 **kwargs)
+
+    def test_defaults_without_network(self):
+        self.assertEqual(self.catalogue.servers(),
+                         ['http://biolab.isis.rl.ac.uk'])
+        self.assertEqual(self.catalogue.blogs('http://biolab.isis.rl.ac.uk'),
+                         ['ibrahim', 'lab_materials', 'testing_sandpit'])
+        self.assertEqual(self.catalogue.usernames('http://lablog'), [])
+        self.assertTrue(self.catalogue.is_stale('http://lablog'))
+
+    def test_fetch_and_reload(self):
+        self.assertTrue(self.refresh(self.catalogue))
+        self.assertEqual(self.catalogue.blogs('http://lablog'),
+                         ['testing_sandpit', 'lab_materials'])
+        self.assertEqual(self.catalogue.sections('http://lablog',
+                                                 'testing_sandpit'),
+                         ['Data', 'Notes'])
+        self.assertEqual(self.catalogue.metadata('http://lablog'),
+                         [('Instrument', ['x1', 'x2'])])
+
+        catalogue = self.newCatalogue()
+        self.assertEqual(catalogue.servers(), ['http://biolab.isis.rl.ac.uk',
+                                               'http://lablog'])
+        self.assertEqual(catalogue.usernames('http://lablog'),
+                         ['ethem.myopenid.com', 'cameronneylon.net'])
+        self.assertFalse(catalogue.is_stale('http://lablog'))
+
+    def test_ttl_and_revalidation(self):
+        self.refresh(self.catalogue)
+        requests = self.app.requests
+
+        # Fresh entries are not revalidated
+        self.assertFalse(self.refresh(self.catalogue))
+        self.assertEqual(self.app.requests, requests)
+
+        # Stale but unchanged entries are revalidated without a catalogue
+        self.now += 60
+        self.assertFalse(self.refresh(self.catalogue))
+        self.assertEqual(self.app.requests, requests + 1)
+        self.assertEqual(self.app.catalogues_sent, 1)
+        self.assertFalse(self.catalogue.is_stale('http://lablog'))
+
+        # Changed catalogues are sent again
+        self.app.catalogue['usernames'].append('new.user')
+        self.assertTrue(self.refresh(self.catalogue, force = True))
+        self.assertEqual(self.catalogue.usernames('http://lablog')[-1],
+                         'new.user')
+
+    def test_unreadable_file(self):
+        f = open(self.path, 'wb')
+        f.write('{not json')
+        f.close()
+        catalogue = self.newCatalogue()
+        self.assertEqual(catalogue.blogs('http://lablog'), [])
+        self.refresh(catalogue)
+        self.assertEqual(len(self.newCatalogue().blogs('http://lablog')), 2)
+
+    def test_refused(self):
+        self.app.catalogue = None
+        self.assertRaises(ValueError, self.refresh, self.catalogue)
+
+    def test_light_import(self):
+        # Reading the catalogue at startup must not load the network code
+        self.refresh(self.catalogue)
+        script = ('import sys, lablogcatalogue; '
+                  'lablogcatalogue.ServerCatalogue(%r).blogs("http://lablog"); '
+                  'print "lablogpost" in sys.modules or '
+                  '"xml.etree" in sys.modules' % self.path)
+        output = subprocess.Popen([sys.executable, '-c', script],
+                                  stdout = subprocess.PIPE,
+                                  cwd = os.path.dirname(__file__) or '.'
+                                  ).communicate()[0].split()
+        self.assertEqual(output, ['False'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,171 @@
+# Tests for lablogcli
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to test_lablogcli.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Usage: python test_lablogcli.py [TestCase[.test_method]]
+
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import tempfile
+import threading
+import unittest
+import lablogmock
+import lablogpost
+from StringIO import StringIO
+from lablogcli import *
+
+class TestCommandLine(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        for name in ['a.dat', 'b.dat', 'c.dat']:
+            f = open(os.path.join(self.tempdir, name), 'wb')
+            f.write(name * 100)
+            f.close()
+        self.server = lablogmock.MockLaBLog()
+        self.server.start()
+        lablogpost._inline_only_servers.clear()
+        lablogpost._multipart_servers.clear()
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tempdir)
+        lablogpost._inline_only_servers.clear()
+        lablogpost._multipart_servers.clear()
+
+    def run_cli(self, *extra):
+        out = StringIO()
+        args = ['--server', self.server.url, '--blog', 'testing_sandpit',
+                '--username', 'user', '--title', 'Run', '--text', 'Data',
+                '--metadata', 'instrument=x1', '--no-cache']
+        status = main(args + list(extra) + [self.tempdir], out)
+        events = [json.loads(line) for line in out.getvalue().splitlines()]
+        return status, events
+
+    def test_upload(self):
+        status, events = self.run_cli('--concurrency', '2')
+        self.assertEqual(status, EXIT_OK)
+        self.assertEqual([event['event'] for event in events],
+                         ['start', 'file', 'file', 'file', 'done'])
+        self.assertEqual(events[-1]['files'], 3)
+        self.assertEqual(sorted([event['index'] for event in events[1:4]]),
+                         [1, 2, 3])
+        for event in events[1:4]:
+            self.assertEqual(event['status'], 'posted')
+            self.assertTrue(event['post_id'] in self.server.posts)
+        self.assertEqual(events[-1]['data_failed'], 0)
+        self.assertEqual(len(self.server.posts), 3)
+
+    def test_resume(self):
+        self.run_cli()
+        requests = self.server.requests
+        status, events = self.run_cli('--resume', '--transfer', 'multipart')
+        self.assertEqual(status, EXIT_OK)
+        self.assertEqual(self.server.requests, requests)
+        self.assertEqual(len(self.server.posts), 3)
+
+    def test_trace(self):
+        tracedir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tracedir, 'trace.log')
+            status, events = self.run_cli('--trace', path, '--uid', 'secret')
+            self.assertEqual(status, EXIT_OK)
+            f = open(path)
+            trace = f.read()
+            f.close()
+        finally:
+            shutil.rmtree(tracedir)
+        spans = [json.loads(line) for line in trace.splitlines()]
+        self.assertEqual(sorted([span['span'] for span in spans]),
+                         ['LaBLogData'] * 3 + ['LaBLogPost'] * 3)
+        for span in spans:
+            self.assertEqual(span['status'], '200')
+            self.assertTrue(span['bytes'] > 0)
+        self.assertFalse('secret' in trace)
+
+    def test_failures(self):
+        self.server.error_rate = 1
+        status, events = self.run_cli('--attempts', '1')
+        self.assertEqual(status, EXIT_FAILURES)
+        self.assertEqual(events[-1]['data_failed'], 3)
+        self.assertEqual(events[1]['status'], 'data_failed')
+
+    def test_watch(self):
+        # Interrupt the upload once a file written later is posted
+        def interrupt():
+            while len(self.server.posts) < 3:
+                time.sleep(0.05)
+            f = open(os.path.join(self.tempdir, 'd.dat'), 'wb')
+            f.write('d.dat')
+            f.close()
+            while len(self.server.posts) < 4:
+                time.sleep(0.05)
+            os.kill(os.getpid(), signal.SIGINT)
+        thread = threading.Thread(target = interrupt)
+        thread.setDaemon(True)
+        thread.start()
+
+        status, events = self.run_cli('--watch', '--settle', '0.1')
+        self.assertEqual(status, EXIT_INTERRUPTED)
+        self.assertEqual([event['event'] for event in events],
+                         ['start', 'file', 'file', 'file', 'file', 'done'])
+        self.assertTrue(events[0]['watch'])
+        self.assertEqual(events[4]['path'], 
+                         os.path.join(self.tempdir, 'd.dat'))
+        self.assertEqual(events[-1]['files'], 4)
+
+        # Files already uploaded are not uploaded again
+        requests = self.server.requests
+        thread = threading.Timer(0.5, os.kill, [os.getpid(), signal.SIGINT])
+        thread.start()
+        status, events = self.run_cli('--watch', '--settle', '0.1')
+        self.assertEqual(self.server.requests, requests)
+        self.assertEqual(events[-1]['files'], 0)
+
+    def test_filters(self):
+        os.mkdir(os.path.join(self.tempdir, 'sub'))
+        for name in ['sub/d.dat', 'sub/e.txt']:
+            f = open(os.path.join(self.tempdir, name), 'wb')
+            f.write(name)
+            f.close()
+        status, events = self.run_cli('--recursive', '--include', '*.dat',
+                                      '--exclude', 'b.*', '--max-size', '200')
+        self.assertEqual(status, EXIT_OK)
+        self.assertEqual([os.path.basename(event['path']) 
+                          for event in events[1:-1]], ['d.dat'])
+
+    def test_empty_directory(self):
+        for name in os.listdir(self.tempdir):
+            os.remove(os.path.join(self.tempdir, name))
+        status, events = self.run_cli()
+        self.assertEqual(status, EXIT_OK)
+        self.assertEqual(events[-1]['files'], 0)
+
+    def test_usage(self):
+        stderr = sys.stderr
+        sys.stderr = StringIO()
+        try:
+            try:
+                main([self.tempdir])
+            except SystemExit, e:
+                self.assertEqual(e.code, EXIT_USAGE)
+            else:
+                self.fail('Missing arguments accepted')
+            self.assertRaises(SystemExit, main, ['--blog', 'b',
+                              '--username', 'u', '--title', 't',
+                              '--metadata', 'novalue', self.tempdir])
+        finally:
+            sys.stderr = stderr
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+# Tests for lablogjournal
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to test_lablogjournal.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Usage: python test_lablogjournal.py [TestCase[.test_method]]
+
+import os
+import tempfile
+import unittest
+from lablogjournal import *
+
+class TestUploadJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.journal = UploadJournal.for_directory(self.tempdir)
+        self.server = 'http://lablog'
+
+    def tearDown(self):
+        self.journal.close()
+        for filename in os.listdir(self.tempdir):
+            os.remove(os.path.join(self.tempdir, filename))
+        os.rmdir(self.tempdir)
+
+    def test_record_and_get(self):
+        self.assertEqual(self.journal.get(self.server, 'a.dat'), None)
+        self.journal.record(self.server, 'a.dat', PENDING)
+        self.assertEqual(self.journal.get(self.server, 'a.dat'),
+                         (PENDING, None, None))
+        self.journal.record(self.server, 'a.dat', DATA_POSTED, '12')
+        self.journal.record(self.server, 'a.dat', POST_CREATED, '12', '3')
+        self.assertEqual(self.journal.get(self.server, 'a.dat'),
+                         (POST_CREATED, '12', '3'))
+        self.assertEqual(self.journal.count(self.server, POST_CREATED), 1)
+
+    def test_servers_kept_separate(self):
+        self.journal.record(self.server, 'a.dat', DATA_POSTED, '12')
+        self.assertEqual(self.journal.get('http://other', 'a.dat'), None)
+
+    def test_persists_when_reopened(self):
+        self.journal.record(self.server, 'a.dat', DATA_POSTED, '12')
+        self.journal.close()
+        self.journal = UploadJournal.for_directory(self.tempdir)
+        self.assertEqual(self.journal.get(self.server, 'a.dat'),
+                         (DATA_POSTED, '12', None))
+
+    def test_is_journal_file(self):
+        self.assertTrue(is_journal_file(self.journal.path))
+        self.assertTrue(is_journal_file(self.journal.path + '-journal'))
+        self.assertFalse(is_journal_file('data.csv'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+# Tests for lablogmock
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to test_lablogmock.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Usage: python test_lablogmock.py [TestCase[.test_method]]
+
+import os
+import time
+import base64
+import urllib2
+import tempfile
+import unittest
+import lablogclient
+import lablogpost
+from StringIO import StringIO
+from lablogmock import *
+
+class TestRequestParser(unittest.TestCase):
+
+    def parse(self, text):
+        parser = RequestParser()
+        return parser.parse(StringIO('<dataset><title>test</title><data>'
+                                     '<dataitem type="inline">' + text +
+                                     '</dataitem></data></dataset>')), \
+               parser.data
+
+    def test_inline_data_decoded(self):
+        content = os.urandom(3 * BLOCK_SIZE + 1)
+        encoded = base64.standard_b64encode(content)
+        request, data = self.parse(encoded[:1001] + '\n' + encoded[1001:])
+        self.assertEqual(request.findtext('title'), 'test')
+        self.assertEqual(request.findtext('data/dataitem'), '')
+        data.seek(0)
+        self.assertEqual(data.read(), content)
+
+    def test_invalid_data(self):
+        self.assertRaises(TypeError, self.parse, 'AAA')
+
+class TestMockLaBLog(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.testfile = os.path.join(self.tempdir, 'test.dat')
+        f = open(self.testfile, 'wb')
+        f.write('\x00\x01 some test data' * 100)
+        f.close()
+        self.client = lablogclient.LaBLogClient()
+        lablogpost._inline_only_servers.clear()
+        lablogpost._multipart_servers.clear()
+
+    def tearDown(self):
+        self.server.stop()
+        self.client.close()
+        lablogpost._inline_only_servers.clear()
+        lablogpost._multipart_servers.clear()
+        os.remove(self.testfile)
+        os.rmdir(self.tempdir)
+
+    def startServer(self, **kwargs):
+        self.server = MockLaBLog(**kwargs)
+        self.server.start()
+
+    def postData(self, transfer = None):
+        data = lablogpost.LaBLogData()
+        data.set_type('inline')
+        data.set_data(self.testfile)
+        if transfer:
+            data.transfer = transfer
+        return data.doPost(url = self.server.url, uid = '',
+                           client = self.client)
+
+    def test_data_and_post(self):
+        self.startServer()
+        data_id = self.postData()
+        self.assertEqual(self.server.datasets[data_id],
+                         ('test', 'test.dat', 1700))
+
+        post = lablogpost.LaBLogPost(title = 'title', username = 'user',
+                                     section = '', content = 'text',
+                                     blog_sname = 'testing_sandpit',
+                                     attached_data = [data_id])
+        post_id = post.doPost(url = self.server.url, uid = '',
+                              client = self.client)
+        self.assertEqual(self.server.posts[post_id], ('title', [data_id]))
+        self.assertEqual(post.url,
+                         self.server.url + '/post/' + post_id + '.html')
+
+    def test_unknown_data_refused(self):
+        self.startServer()
+        post = lablogpost.LaBLogPost(title = 'title', username = 'user',
+                                     section = '', content = 'text',
+                                     blog_sname = 'testing_sandpit',
+                                     attached_data = ['12'])
+        self.assertEqual(post.doPost(url = self.server.url, uid = '',
+                                     client = self.client), None)
+        self.assertEqual(post.post_status_code, '400')
+
+    def test_multipart(self):
+        self.startServer()
+        self.postData(lablogpost.TRANSFER_MULTIPART)
+        self.assertTrue(self.server.url in lablogpost._multipart_servers)
+        data_id = self.postData(lablogpost.TRANSFER_MULTIPART)
+        self.assertEqual(self.server.datasets[data_id][2], 1700)
+
+    def test_multipart_not_offered(self):
+        self.startServer(multipart = False)
+        self.postData(lablogpost.TRANSFER_MULTIPART)
+        self.assertEqual(self.server.requests, 1)
+        self.assertEqual(lablogpost._multipart_servers, set())
+
+    def test_multipart_refused(self):
+        self.startServer(multipart = False)
+        lablogpost._multipart_servers.add(self.server.url)
+        data_id = self.postData(lablogpost.TRANSFER_MULTIPART)
+        self.assertEqual(self.server.datasets[data_id][2], 1700)
+        self.assertEqual(self.server.requests, 2)
+
+    def test_errors(self):
+        self.startServer(error_rate = 1)
+        try:
+            self.postData()
+            self.fail('No error raised')
+        except urllib2.HTTPError, e:
+            self.assertEqual(e.code, 503)
+
+    def test_resets(self):
+        self.startServer(reset_rate = 1)
+        self.assertRaises(urllib2.URLError, self.postData)
+        self.assertEqual(self.server.datasets, {})
+
+    def test_latency_and_bandwidth(self):
+        self.startServer(latency = 0.2, bandwidth = 10000)
+        start = time.time()
+        self.postData()
+        # 2.3 kB of encoded data at 10 kB/s plus the latency
+        self.assertTrue(time.time() - start > 0.4)
+
+
+if __name__ == '__main__':
+    unittest.main()
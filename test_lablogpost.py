@@ -0,0 +1,938 @@
+# Tests for lablogpost
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to test_lablogpost.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Usage: python test_lablogpost.py [TestCase[.test_method]]
+
+import os
+import re
+import sys
+import base64
+import socket
+import tempfile
+import threading
+import subprocess
+import unittest
+import lablogcache
+import lablogjournal
+import lablogmock
+import lablogretry
+import lablogscan
+import lablogtransport
+import lablogwatch
+from xml.etree import ElementTree as ET
+from StringIO import StringIO
+from lablogpost import *
+from lablogpost import _inline_only_servers, _multipart_servers
+from lablogpost import _proxy_resolver
+
+class TestDataObjectCreator(unittest.TestCase):
+
+    def setUp(self):
+        self.testemptydataobject = LaBLogData()
+        self.title = 'Test title'
+        self.faketitle = 'Not the test title'
+        self.testint = 1
+        self.testfloat = 5.4
+        self.testfile = 'ai.gif'
+        self.extension = 'gif'
+        self.base64 = base64.standard_b64encode(
+                                    open('ai.gif').read(3000))
+        self.directory = '/Users/Cameron/Documents/Python/LaBLog/Testing/'
+        self.fullpath = os.path.join(self.directory, self.testfile)
+
+    def test_init_empty_object(self):
+        self.assertTrue(self.testemptydataobject.title == None)
+        self.assertTrue(self.testemptydataobject.type == None)
+        self.assertEqual(self.testemptydataobject.main, '1')
+
+    def test_set_title(self):
+        self.testemptydataobject.set_title(self.title)
+        self.assertEqual(self.testemptydataobject.title, self.title)
+        self.assertNotEqual(self.testemptydataobject.title, self.faketitle)
+
+    def test_set_title_Exceptions(self):
+        self.assertRaises(TypeError, 
+                            self.testemptydataobject.set_title, self.testint)
+        self.assertRaises(TypeError, 
+                            self.testemptydataobject.set_title, self.testfloat)
+
+    def test_set_type_inline(self):
+        self.testemptydataobject.set_type('inline')
+        self.assertEqual(self.testemptydataobject.type, 'inline')
+
+    def test_set_type_url(self):
+        self.testemptydataobject.set_type('url')
+        self.assertEqual(self.testemptydataobject.type, 'url')
+
+    def test_set_type_local(self):
+        self.testemptydataobject.set_type('local')
+        self.assertEqual(self.testemptydataobject.type, 'local')
+
+    def test_set_type_Exceptions(self):
+        self.assertRaises(ValueError, 
+                            self.testemptydataobject.set_type, self.title)
+        self.assertRaises(TypeError, 
+                            self.testemptydataobject.set_type, self.testint)
+        self.assertRaises(TypeError, 
+                            self.testemptydataobject.set_type, self.testfloat)
+
+    def test_set_data_local_path(self):
+        self.testemptydataobject.set_data(self.testfile)
+        self.assertEqual(self.testemptydataobject.ext, self.extension)
+        self.assertEqual(self.testemptydataobject.data, self.base64)
+        self.assertEqual(self.testemptydataobject.title, 'ai')
+
+    def test_set_data_full_path(self):
+        self.testemptydataobject.set_data(self.fullpath)
+        self.assertEqual(self.testemptydataobject.ext, self.extension)
+        self.assertEqual(self.testemptydataobject.data, self.base64)
+
+    def test_set_data_file_and_path(self):
+        self.testemptydataobject.set_data(self.testfile, self.directory)
+        self.assertEqual(self.testemptydataobject.ext, self.extension)
+        self.assertEqual(self.testemptydataobject.data, self.base64)
+
+    def test_set_data_no_filename(self):
+        self.testemptydataobject.set_data(self.testfile, usefilename=False)
+        self.assertEqual(self.testemptydataobject.title, None)
+
+class TestStreamingEncoder(unittest.TestCase):
+    """Check chunked encoding of files and memory use for large files
+
+    The size of the large test file and the peak RSS budget it must 
+    be encoded and sent within can be set in megabytes with the 
+    environment variables LABLOG_TEST_LARGE_FILE_MB and 
+    LABLOG_TEST_RSS_BUDGET_MB.
+    """
+
+    large_file_mb = int(os.environ.get('LABLOG_TEST_LARGE_FILE_MB', 500))
+    rss_budget_mb = int(os.environ.get('LABLOG_TEST_RSS_BUDGET_MB', 64))
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.testbinary = ''.join([chr(i % 256) 
+                                   for i in range(MAX_MEM + 1001)])
+        self.testfile = os.path.join(self.tempdir, 'big.dat')
+        f = open(self.testfile, 'wb')
+        f.write(self.testbinary)
+        f.close()
+
+    def tearDown(self):
+        for filename in os.listdir(self.tempdir):
+            os.remove(os.path.join(self.tempdir, filename))
+        os.rmdir(self.tempdir)
+
+    def test_chunks_join_to_whole_encoding(self):
+        chunks = list(b64encode_file(self.testfile, chunksize = 300))
+        self.assertTrue(len(chunks) > 1)
+        self.assertEqual(''.join(chunks), 
+                         base64.standard_b64encode(self.testbinary))
+
+    def test_chunksize_not_multiple_of_three(self):
+        self.assertRaises(AssertionError, 
+                          list, b64encode_file(self.testfile, 1000))
+
+    def test_set_data_streams_large_file(self):
+        testdataobject = LaBLogData()
+        testdataobject.set_data(self.testfile)
+        self.assertEqual(testdataobject.data, None)
+        self.assertEqual(''.join(testdataobject.iter_data()),
+                         base64.standard_b64encode(self.testbinary))
+
+    def test_set_data_stream_override(self):
+        testdataobject = LaBLogData()
+        testdataobject.set_data(self.testfile, stream = False)
+        self.assertEqual(testdataobject.data,
+                         base64.standard_b64encode(self.testbinary))
+
+    def test_large_file_peak_rss(self):
+        largefile = os.path.join(self.tempdir, 'large.dat')
+        f = open(largefile, 'wb')
+        f.seek(self.large_file_mb * 1024 * 1024 - 1)
+        f.write('\0')
+        f.close()
+
+        # Post the file to a MockLaBLog from a fresh interpreter, so 
+        # that its peak RSS reflects only the encoding and sending of 
+        # the file and not the server reading it
+        server = lablogmock.MockLaBLog()
+        server.start()
+        try:
+            script = '\n'.join([
+                'import sys, resource',
+                'sys.path.insert(0, %r)' % os.path.dirname(
+                                                os.path.abspath(__file__)),
+                'import lablogclient, lablogpost',
+                'data = lablogpost.LaBLogData()',
+                'data.set_data(%r)' % largefile,
+                'data.set_type(\'inline\')',
+                'data_id = data.doPost(url = %r, uid = \'\',' % server.url,
+                '          client = lablogclient.LaBLogClient())',
+                'print data_id, resource.getrusage(',
+                '                   resource.RUSAGE_SELF).ru_maxrss'])
+            child = subprocess.Popen([sys.executable, '-c', script],
+                                     stdout = subprocess.PIPE)
+            data_id, maxrss = child.communicate()[0].split()
+        finally:
+            server.stop()
+
+        self.assertEqual(server.datasets[data_id],
+                         ('large', 'large.dat',
+                          self.large_file_mb * 1024 * 1024))
+        # ru_maxrss is reported in kilobytes on Linux
+        self.assertTrue(int(maxrss) < self.rss_budget_mb * 1024,
+                        'Peak RSS %s kB over budget' % maxrss)
+
+class TestStreamingBody(unittest.TestCase):
+
+    def setUp(self):
+        self.testdata = LaBLogData()
+        self.testdata.title = 'title'
+        self.testdata.type = 'inline'
+        self.testdata.filename = 'filename.dat'
+        self.testdata.ext = 'dat'
+        self.testdata.data = base64.standard_b64encode('some data+/=')
+
+    def readall(self, body, blocksize = 7):
+        blocks = []
+        block = body.read(blocksize)
+        while block:
+            blocks.append(block)
+            block = body.read(blocksize)
+        return ''.join(blocks)
+
+    def test_read_in_blocks(self):
+        body = StreamingBody(lambda: ['abc', '', 'defgh', 'ij'], 10, 
+                             'text/plain')
+        self.assertEqual(body.read(4), 'abcd')
+        self.assertEqual(body.read(4), 'efgh')
+        self.assertEqual(body.read(4), 'ij')
+        self.assertEqual(body.read(4), '')
+        body.rewind()
+        self.assertEqual(body.read(), 'abcdefghij')
+
+    def test_multipart_length(self):
+        body = multipart_body([('request', lambda: ['<a>', '</a>'], 7),
+                               ('other', lambda: ['x'], 1)])
+        content = self.readall(body)
+        self.assertEqual(len(content), len(body))
+        boundary = body.content_type.split('boundary=')[1]
+        self.assertTrue(content.startswith('--' + boundary + '\r\n'))
+        self.assertTrue(content.endswith('\r\n--' + boundary + '--\r\n'))
+        self.assertTrue('name="request"\r\n\r\n<a></a>\r\n' in content)
+
+    def test_data_body_matches_serialize(self):
+        content = self.readall(self.testdata.serialize_body())
+        self.testdata.serialize()
+        self.assertTrue('\r\n\r\n' + self.testdata.postxml + '\r\n' 
+                        in content)
+
+    def test_streamed_data_body_matches_serialize(self):
+        tempdir = tempfile.mkdtemp()
+        testfile = os.path.join(tempdir, 'big.dat')
+        f = open(testfile, 'wb')
+        f.write('x' * (3 * MAX_MEM))
+        f.close()
+        try:
+            self.testdata.set_data(testfile, usefilename = False)
+            body = self.testdata.serialize_body()
+            content = self.readall(body, 8192)
+            self.assertEqual(len(content), len(body))
+            self.testdata.serialize()
+            self.assertTrue(self.testdata.postxml in content)
+        finally:
+            os.remove(testfile)
+            os.rmdir(tempdir)
+
+    def test_multipart_transfer_body(self):
+        tempdir = tempfile.mkdtemp()
+        testfile = os.path.join(tempdir, 'raw.dat')
+        f = open(testfile, 'wb')
+        f.write('\x00\xff raw bytes\r\n')
+        f.close()
+        try:
+            self.testdata.set_data(testfile, usefilename = False)
+            body = self.testdata.serialize_multipart_body()
+            content = self.readall(body)
+            self.assertEqual(len(content), len(body))
+            self.assertTrue('part="datafile"' in content)
+            self.assertTrue('name="datafile"; filename="raw.dat"\r\n'
+                            'Content-Type: application/octet-stream\r\n'
+                            '\r\n\x00\xff raw bytes\r\n\r\n' in content)
+        finally:
+            os.remove(testfile)
+            os.rmdir(tempdir)
+
+class TestDataPoster(unittest.TestCase):
+    def setUp(self):
+        self.testemptydataobject = LaBLogData()
+        self.title = 'Test title'
+        self.faketitle = 'Not the test title'
+        self.testint = 1
+        self.testfloat = 5.4
+        self.testfile = 'ai.gif'
+        self.extension = 'gif'
+        self.base64 = base64.standard_b64encode(
+                                    open('ai.gif').read(3000))
+        self.directory = '/Users/Cameron/Documents/Python/LaBLog/Testing/'
+        self.fullpath = os.path.join(self.directory, self.testfile)
+        self.server = lablogmock.MockLaBLog()
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def testInlineDataPost(self):
+        testdataobject = LaBLogData()
+        testdataobject.set_title(self.title)
+        testdataobject.set_type('inline')
+        testdataobject.set_data(self.testfile)
+
+        testdataobject.doPost(url = self.server.url)
+        self.assertEqual(testdataobject.posted, True)
+        self.assertEqual(testdataobject.post_status_code, '200')
+
+class TestPostObjectCreator(unittest.TestCase):
+    def setUp(self):
+        self.testemptypostobject = LaBLogPost()
+        self.title = 'Test title'
+        self.faketitle = 'Not the test title'
+        self.testint = 1
+        self.testfloat = 10.6
+        self.testusername = DEFAULT_USERNAME
+        self.testblog_id = '16'
+        self.testcontent = 'Blah blah blah'
+        self.testblog_sname = 'testing_sandpit'
+        self.testmetadata = {'key1':'value1', 'key2':'value2'}
+
+    def test_init_empty_post(self):
+        self.assertTrue(self.testemptypostobject.title == None)
+        self.assertTrue(self.testemptypostobject.username == None)
+        self.assertTrue(self.testemptypostobject.blog_id == None)
+        
+    def test_set_title(self):
+        self.testemptypostobject.set_title(self.title)
+        self.assertEqual(self.testemptypostobject.title, self.title)
+        self.assertNotEqual(self.testemptypostobject.title, self.faketitle)
+
+    def test_set_title_Exceptions(self):
+        self.assertRaises(TypeError, 
+                            self.testemptypostobject.set_title, self.testint)
+        self.assertRaises(TypeError, 
+                            self.testemptypostobject.set_title, self.testfloat)
+
+    def test_set_metadata(self):
+        self.testemptypostobject.set_metadata(self.testmetadata)
+        self.assertEqual(self.testemptypostobject.metadata, self.testmetadata)
+
+    def test_append_metadata(self):
+        self.testemptypostobject.append_metadata(self.testmetadata)
+        self.assertEqual(self.testemptypostobject.metadata, self.testmetadata)
+
+        # Now try and add metadata again and should raise ValueError
+        self.assertRaises(ValueError, 
+                          self.testemptypostobject.append_metadata, {'key1':'value3'})
+
+        # But the following should succeed using overwrite=True option
+        self.testemptypostobject.append_metadata({'key1':'value3'}, overwrite = True)
+        self.assertEqual(self.testemptypostobject.metadata, {'key1':'value3',
+                                                             'key2':'value2'})
+
+
+class TestXMLSerializors(unittest.TestCase):
+
+    def setUp(self):
+        self.testpost = LaBLogPost()
+        self.testpost.title = 'title'
+        self.testpost.username = DEFAULT_USERNAME
+        self.testpost.section = 'API testing'
+        self.testpost.content = 'test text content'
+        self.testpost.blog_id = '16'
+        self.testpost.blog_sname =  'testing_sandpit'
+        self.testpost.metadata = {'key1':'value1',
+                                  'key2':'value2',
+                                  'key3':'value3'}
+        self.testpost.attached_data = ['1', '2', '3']
+
+        self.testxml = """<post><title>title</title><section>API testing</section><author><username>cameronneylon.net</username></author><content>test text content</content><blog_id>16</blog_id><blog_sname>testing_sandpit</blog_sname><metadata><key3>value3</key3><key2>value2</key2><key1>value1</key1></metadata><attached_data><data type="local">1</data><data type="local">2</data><data type="local">3</data></attached_data></post>""" 
+
+        f = open('ai.gif')
+        testbinary = f.read(3000)
+        testbase64 = base64.standard_b64encode(testbinary)
+
+        self.testdata = LaBLogData()
+        self.testdata.title = 'title'
+        self.testdata.type = 'inline'
+        self.testdata.filename = 'filename.gif'
+        self.testdata.ext = 'gif'
+        self.testdata.main = '1'
+        self.testdata.data =  testbase64
+
+        self.testdataxml1 = """<dataset><title>title</title><data><dataitem ext="gif" filename="filename.gif" main="1" type="inline">R0lGODlhIAAgAOZmAP/elM6MY8Z7CEIxGOeUWv/OjHtKObVjENalUv/OY8aEMd57AP/vrTkhEOeMEKVrGNaUOeeMAK1jQmM5CM6EGL1rAJRSQpxaAIxjUlI5MbVzWq2lrd6UKe+lMeecGIRSEBAIAKWUjJx7Y71zGOecc7WtnHu11nNzezE5OSkYCJTG3tbGnM57Uv/erb21rUpKSsatpWtCMfeMECEICFpKQpyMe1JaWr2ljK2clKVrAIwICM7e50Jja73O1pR7c4RrQtaUlM6lc3taStbOxsa1tYyUnMbW3rWEc961pa17Ka21vfe9hEIpQhgYGHNjWs7GzqVjUoyMlN4pKSEYIXOMtWtSSs6tjP+1Ob21vYycrSkpKf+tKVIpGLVzSq1KMfe1c5RrMf+9UmsxIcZrOYRCKQAAAP///wAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAACH5BAEAAGYALAAAAAAgACAAAAf/gGaCg4SFhoeIiYqEAQQri5CCLYJdCgoBkSEGYGBdAZ+EX2ZBYwSdj4kbGWJkXl5jCh0dCg+dYGRkY7pgN4IFX8DAYA0GZGLHZAdeD69jyrgHugShHRDWMWIDxwMDXBNc3dsTYhO4EwoIhGEcJiZCyAZiGZxcKTNczWBeuGJeCqiCwkAwEUXHh3JduhAIwwDBGDEzBuTS9QBXrUJfBhrIgWtMpYUAGDBIAAZEAy5cWEGDQGKSoC8cflz40E/XxzAhRcYo04BbMQMHwCxRR+HCBInNEi4UGTLBgAYqXR0AUSjMAhsoO8JSSCAAgi8hJZjkwm9CiqocuOgoN9FjFy9e/78CSGAgBatSB8pUFcDlgzZcubogCIOADBgJAQAgOAnmgYwOegkhqDCGjJZjmMeESUBmAAqvBRJkI/Ogw4LIgwgIYGGBSQZ+3QgACCCBBdhfw8REc4Ba0GROBl57jjcmAYDQBY5/8dLg1YEIvc0goHDCwI8xYAwYkNAvgXfvv76UzLXgdCEIFKhgwCAhgxdOrMKEWQhMfhcQZMtHh5AkiwgNVaCwiRdicEHAW2HUN58BTQxwgXmEQDCCFUeIgMEL82QHjhchhVZfFw1M8YEA0SkggAslBKABBjQIYUF2YiSEQAAkHBdGF0/lQGIhJiKhxCcarGjBiwVeIMUYYH1BgNEXKF1QQYkjPIHFBiGI8B8UFkjgygVjJAfAF12QgQ8FT/I4ggpobuDDCSIEQIMFXXCCAADHHQgGFzeEwVshHIzQQw9U4oBDDSc4wR5iBSSKAAEJ2MBDETLsSUifO+wAQwkluLDBCT58EgALXSSIEwAv8DBGBJIOIkAFQxhBxKVAABFCCEGQQEKCiRbAQA0NfOCFA9AVcoAADzxwwLAUOECBAMl6sMUV8sl3gLEHABtdBQJkK0B5EXTLLaoehOuBA9hmu8COhZSh7rrstutuu4QEAgA7</dataitem></data></dataset>"""
+
+        self.emptydata = LaBLogData()
+        self.emptypost = LaBLogPost()
+        self.require_for_postxml = ['title', 'section', 'username', 'content']
+        self.require_for_dataxml = ['title', 'filename', 'type', 'data']
+
+
+    def testpostxmlserialization(self):
+        self.testpost.serialize()
+        self.assertEqual(ET.tostring(self.testpost.etree.getroot()), 
+                                          self.testxml)
+        self.assertEqual(self.testpost.postxml, self.testxml)
+
+    def testdataxmlserialization(self):
+        self.testdata.serialize()
+        self.assertEqual(ET.tostring(self.testdata.etree.getroot()), 
+                                          self.testdataxml1)
+        self.assertEqual(self.testdata.postxml, self.testdataxml1)
+
+    def testxml_empty(self):
+        self.assertRaises(AssertionError, self.emptydata.serialize)
+        self.assertRaises(AssertionError, self.emptypost.serialize)
+        
+class TestPostPoster(unittest.TestCase):
+    def setUp(self):
+        self.server = lablogmock.MockLaBLog()
+        self.server.start()
+        self.testemptypostobject = LaBLogPost()
+        self.title = 'Test title'
+        self.faketitle = 'Not the test title'
+        self.testint = 1
+        self.testfloat = 10.6
+        self.testsection = 'API testing'
+        self.testusername = DEFAULT_USERNAME
+        self.testblog_id = '16'
+        self.testcontent = 'Blah blah blah'
+        self.testblog_sname = 'testing_sandpit'
+        self.testmetadata = {'key1':'value1', 'key2':'value2'}
+
+    def tearDown(self):
+        self.server.stop()
+
+    def testBlogPost(self):
+        testpostobject = LaBLogPost()
+        testpostobject.set_title(self.title)
+        testpostobject.set_username(self.testusername)
+        testpostobject.set_section(self.testsection)
+        testpostobject.set_blog_id(self.testblog_id)
+        testpostobject.set_blog_sname(self.testblog_sname)
+        testpostobject.set_content(self.testcontent)
+
+        testpostobject.doPost(url = self.server.url)
+        self.assertEqual(testpostobject.posted, True)
+        self.assertEqual(testpostobject.post_status_code, '200')
+
+class TestPostTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self.settings = {'username'   : 'user',
+                         'content'    : 'Some <b>test</b> text',
+                         'section'    : 'API testing',
+                         'blog_sname' : 'testing_sandpit',
+                         'metadata'   : {'key1' : 'value1'}}
+
+    def test_same_xml_as_post(self):
+        template = PostTemplate(**self.settings)
+        for title in ['Sample-1', 'Fish & <chips> "1"']:
+            post = LaBLogPost(title = title, **self.settings)
+            post.serialize()
+            templated = template.post(title)
+            templated.serialize()
+            self.assertEqual(templated.postxml, post.postxml)
+
+    def test_template_checked_once(self):
+        del self.settings['username']
+        self.assertRaises(AssertionError, PostTemplate, **self.settings)
+        self.settings['username'] = 'user'
+        self.assertRaises(TypeError, PostTemplate(**self.settings).post, 1)
+
+    def test_post(self):
+        server = lablogmock.MockLaBLog()
+        server.start()
+        try:
+            template = PostTemplate(**self.settings)
+            for i in range(3):
+                post = template.post('Sample-' + str(i))
+                post.doPost(url = server.url)
+                self.assertTrue(post.posted)
+            self.assertEqual(server.posts[post.post_id][0], 'Sample-2')
+        finally:
+            server.stop()
+
+class TestCreatePosts(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeLaBLogClient()
+        self.template = PostTemplate(username = 'user',
+                                     content = 'Sample post',
+                                     section = 'Samples',
+                                     blog_sname = 'testing_sandpit',
+                                     metadata = {'batch' : '7'},
+                                     attached_data = ['data-1'])
+        self.read = 0
+
+    def titles(self, count):
+        for i in range(1, count + 1):
+            self.read += 1
+            yield 'Sample-' + str(i)
+
+    def checkCreated(self, concurrency):
+        indexes = []
+        for index, title, post_id, error in create_posts(
+                            self.titles(100), self.template,
+                            client = self.client, concurrency = concurrency):
+            self.assertEqual(title, 'Sample-' + str(index))
+            self.assertTrue(post_id)
+            self.assertEqual(error, None)
+            indexes.append(index)
+
+            # Only a few rows are read ahead of the results
+            self.assertTrue(self.read - len(indexes) <= 2 * concurrency)
+
+        self.assertEqual(sorted(indexes), range(1, 101))
+        self.assertEqual(len(self.client.posts), 100)
+
+    def test_serial(self):
+        self.checkCreated(1)
+
+    def test_concurrent(self):
+        self.checkCreated(4)
+
+    def test_stop_early(self):
+        posts = create_posts(self.titles(1000), self.template,
+                             client = self.client, concurrency = 4)
+        # Results come in the order the posts finish, so stop after ten
+        finished = 0
+        for result in posts:
+            finished += 1
+            if finished == 10:
+                break
+        posts.close()
+        self.assertTrue(self.read <= 10 + 2 * 4)
+
+    def test_failures(self):
+        self.client.failures = 2
+        results = list(create_posts(self.titles(3), self.template,
+                                    client = self.client))
+        self.assertEqual([post_id for index, title, post_id, error 
+                          in results], [None, None, '1'])
+
+    def test_manifest(self):
+        manifest = StringIO('title,colour,size\r\n'
+                            'Sample-1,red,\r\n'
+                            '\r\n'
+                            'Sample-2,,large\r\n')
+        rows = list(read_manifest(manifest))
+        self.assertEqual(rows, [('Sample-1', {'colour' : 'red'}),
+                                ('Sample-2', {'size' : 'large'})])
+
+        post = self.template.post(*rows[0])
+        post.serialize()
+        self.assertTrue('<colour>red</colour>' in post.postxml)
+        self.assertTrue('<batch>7</batch>' in post.postxml)
+        self.assertEqual(self.template.prototype.metadata, {'batch' : '7'})
+
+        results = list(create_posts(rows, self.template,
+                                    client = self.client))
+        self.assertEqual(len(results), 2)
+
+        self.assertRaises(AssertionError, list, 
+                          read_manifest(StringIO('name\r\nSample\r\n')))
+
+    def test_manifest_rows_without_title(self):
+        manifest = StringIO('colour,title\r\n'
+                            'red\r\n'
+                            'green,\r\n'
+                            'yellow,  \r\n'
+                            'blue,Sample-2\r\n')
+        rows = list(read_manifest(manifest))
+        self.assertEqual(rows, [('Sample-2', {'colour' : 'blue'})])
+        results = list(create_posts(rows, self.template,
+                                    client = self.client))
+        self.assertEqual([post_id for index, title, post_id, error 
+                          in results], ['1'])
+
+class TestMultiDataFileUpload(unittest.TestCase):
+    def setUp(self):
+        self.server = lablogmock.MockLaBLog()
+        self.server.start()
+        self.testfilelist = ['ai.gif', 'ai2.gif']
+        self.testfile = 'ai.gif'
+        self.testfile2 = 'ai2.gif'
+        self.testpostnames = 'test'
+        self.testposttext = 'Some new test text'
+        self.testmetadata = {'key1':'value1', 'key2':'value2'}
+        self.testserver_url = self.server.url
+        self.testblog_id = '17'
+        self.testusername = DEFAULT_USERNAME
+        self.testblog_sname = 'testing_sandpit'
+        self.testsection = 'Data'
+        self.testuid = DEFAULT_UID
+        self.test = MultiDataFileUpload()
+
+    def tearDown(self):
+        self.server.stop()
+        self.test.filelist = []
+        self.test = None
+
+    def testEmptyMultiCreation(self):
+        self.test.addFile(self.testfile)
+        self.test.addFile(self.testfile2)
+        self.test.setPostNames(self.testpostnames)
+        self.test.setPostText(self.testposttext)
+
+        self.assertEqual(self.test.filelist, self.testfilelist)
+        self.assertEqual(self.test.postnames, self.testpostnames)
+        self.assertEqual(self.test.posttext, self.testposttext)
+        self.assertEqual(self.test.section, '')
+
+    def testErrorCatching(self):
+        self.assertEqual(self.test.addFile('nonexistentfile'), 'Path not found')
+        self.assertRaises(AssertionError, self.test.setPostNames, None)
+        self.assertRaises(AssertionError, self.test.setPostNames, 1)
+        self.assertRaises(AssertionError, self.test.setPostText, None)
+        self.assertRaises(AssertionError, self.test.setPostText, 3)
+
+        self.test.filelist = []
+        self.assertEqual(self.test.doUpload(), 'Filelist is empty')
+        self.test.addFile(self.testfile)
+        self.assertEqual(self.test.doUpload(), 'No name given for post title')
+
+    def testMultiPost(self):
+        self.test = MultiDataFileUpload(
+                  **{'filelist'   : self.testfilelist,
+                     'postnames'  : self.testpostnames,
+                     'posttext'   : self.testposttext,
+                     'metadata'   : self.testmetadata,
+                     'server_url' : self.testserver_url,
+                     'blog_id'    : self.testblog_id,
+                     'username'   : self.testusername,
+                     'section'    : self.testsection,
+                     'uid'        : self.testuid,
+                     'blog_sname' : self.testblog_sname})
+        self.assertEqual(self.test.section, self.testsection)
+
+        data_fail, post_fail, length = self.test.doUpload()
+        self.assertEqual(data_fail, 0)
+        self.assertEqual(post_fail, 0)
+        self.assertEqual(length, len(self.testfilelist))
+
+class FakeLaBLogClient(lablogtransport.Transport):
+    """Stand-in for LaBLogClient that answers requests from memory
+
+    Data posts are given the data ID 'data-' plus the filename and
+    data posts for files whose name contains 'fail' are refused. The
+    names of the files sent and the titles and attached data of the
+    posts created are recorded. The first self.failures requests are
+    answered with a 503 status code. Multipart transfers of raw file
+    data are refused with a 415 status code unless self.multipart is
+    set, the number received is counted in self.multipart_posts.
+    The timeout of each request is recorded in self.timeouts.
+    """
+
+    response = ('<response><status_code>%s</status_code>'
+                '<success>%s</success>%s</response>')
+
+    def __init__(self):
+        self.posts = {}
+        self.datafiles = []
+        self.failures = 0
+        self.multipart = True
+        self.multipart_posts = 0
+        self.short = 0
+        self.timeouts = []
+        self.lock = threading.Lock()
+
+    def post(self, url, body, headers = None, timeout = None):
+        self.timeouts.append(timeout)
+
+        # Fail the first self.failures requests with a server error
+        self.lock.acquire()
+        self.failures -= 1
+        failing = self.failures >= 0
+        self.lock.release()
+        if failing:
+            return StringIO(self.response % ('503', 'false', ''))
+
+        content = body.read()
+        multipart = 'name="datafile"' in content
+        if multipart:
+            self.lock.acquire()
+            self.multipart_posts += 1
+            self.lock.release()
+            if not self.multipart:
+                return StringIO(self.response % ('415', 'false', ''))
+
+        if '/api/rest/adddata/' in url:
+            filename = re.search('filename="([^"]*)"', content).group(1)
+            self.datafiles.append(filename)
+            if 'fail' in filename:
+                return StringIO(self.response % ('400', 'false', ''))
+
+            # Each file holds its own name
+            size = len(filename)
+            if multipart:
+                size -= self.short
+            stored = '<data_id>data-%s</data_id><size>%d</size>' % (filename,
+                                                                     size)
+            if self.multipart:
+                stored += '<multipart>true</multipart>'
+            return StringIO(self.response % ('200', 'true', stored))
+
+        title = re.search('<title>(.*?)</title>', content).group(1)
+        data_id = re.search('<data type="local">(.*?)</data>',
+                            content).group(1)
+        self.lock.acquire()
+        self.posts[title] = data_id
+        post_id = str(len(self.posts))
+        self.lock.release()
+        return StringIO(self.response % ('200', 'true',
+                        '<post_id>' + post_id + '</post_id>' +
+                        '<post_info>http://lablog/' + post_id + 
+                        '.xml</post_info>'))
+
+class TestConcurrentUpload(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.filelist = []
+        for name in ['d.dat', 'a.dat', 'bfail.dat', 'c.dat', 'b.dat']:
+            self.filelist.append(os.path.join(self.tempdir, name))
+            f = open(self.filelist[-1], 'wb')
+            f.write(name)
+            f.close()
+        self.client = FakeLaBLogClient()
+        self.test = MultiDataFileUpload(filelist = self.filelist,
+                                        postnames = 'test',
+                                        posttext = 'Some test text',
+                                        username = 'user',
+                                        blog_sname = 'testing_sandpit',
+                                        server_url = 'http://lablog',
+                                        uid = '',
+                                        client = self.client)
+        _inline_only_servers.clear()
+        _multipart_servers.clear()
+
+    def tearDown(self):
+        _inline_only_servers.clear()
+        _multipart_servers.clear()
+        for filename in os.listdir(self.tempdir):
+            os.remove(os.path.join(self.tempdir, filename))
+        os.rmdir(self.tempdir)
+
+    def checkUpload(self, concurrency):
+        data_fail, post_fail, length = self.test.doUpload(concurrency)
+        self.assertEqual((data_fail, post_fail, length), (1, 0, 5))
+        self.assertEqual(self.client.posts, {'test 1' : 'data-a.dat',
+                                             'test 2' : 'data-b.dat',
+                                             'test 4' : 'data-c.dat',
+                                             'test 5' : 'data-d.dat'})
+
+    def test_serial_upload(self):
+        self.checkUpload(1)
+
+    def test_concurrent_upload(self):
+        self.checkUpload(4)
+
+    def test_progress_and_cancel(self):
+        reported = []
+        def progress(index, path, result):
+            reported.append((index, result))
+            if index == 2:
+                self.test.cancel()
+
+        self.test.progress = progress
+        self.test.doUpload(1)
+        self.assertEqual(reported, [(1, '1'), (2, '2')])
+
+    def test_cancel_before_upload(self):
+        self.test.cancel()
+        self.test.doUpload(2)
+        self.assertEqual(self.client.datafiles, [])
+        self.assertFalse(self.test.cancelled.isSet())
+        self.checkUpload(2)
+
+    def test_concurrent_error_raised(self):
+        def progress(index, path, result):
+            if index == 3:
+                raise KeyError(path)
+
+        self.test.progress = progress
+        self.assertRaises(KeyError, self.test.doUpload, 2)
+        self.assertFalse(self.test.cancelled.isSet())
+
+    def test_resume_from_journal(self):
+        journal = lablogjournal.UploadJournal(':memory:')
+        self.test.journal = journal
+        self.test.doUpload(2)
+
+        # Only the failed file and the post that never got made should
+        # be uploaded when the upload is resumed
+        failed = os.path.join(self.tempdir, 'bfail.dat')
+        os.rename(failed, os.path.join(self.tempdir, 'bok.dat'))
+        self.test.filelist.remove(failed)
+        self.test.filelist.append(os.path.join(self.tempdir, 'bok.dat'))
+        journal.record('http://lablog', self.test.filelist[0], 
+                       lablogjournal.DATA_POSTED, 'data-a.dat')
+
+        self.client.posts = {}
+        self.test.resume = True
+        self.assertEqual(self.test.doUpload(2), (0, 0, 5))
+        self.assertEqual(self.client.posts, {'test 1' : 'data-a.dat',
+                                             'test 3' : 'data-bok.dat'})
+        self.assertEqual(journal.count('http://lablog', 
+                                       lablogjournal.POST_CREATED), 5)
+
+    def test_cached_data_not_uploaded_again(self):
+        cache = lablogcache.DataCache(os.path.join(self.tempdir, 
+                                                   'cache.sqlite'))
+        self.test.cache = cache
+        self.test.doUpload(2)
+
+        self.client.posts = {}
+        self.client.datafiles = []
+        self.assertEqual(self.test.doUpload(2), (1, 0, 5))
+        self.assertEqual(self.client.datafiles, ['bfail.dat'])
+        self.assertEqual(self.client.posts['test 4'], 'data-c.dat')
+        cache.close()
+
+    def test_data_timeout_scales(self):
+        f = open(self.filelist[0], 'wb')
+        f.write('x' * 3 * UPLOAD_RATE)
+        f.close()
+        self.test.filelist = self.filelist[:1]
+        self.assertEqual(self.test.doUpload(1), (0, 0, 1))
+        datatimeout, posttimeout = self.client.timeouts
+        self.assertTrue(datatimeout > self.client.read_timeout + 4)
+        self.assertEqual(posttimeout, self.client.read_timeout)
+
+    def test_deadline(self):
+        self.test.deadline = 0
+        self.assertEqual(self.test.doUpload(2), (5, 0, 5))
+        self.assertEqual(self.client.timeouts, [])
+        self.assertEqual(socket.getdefaulttimeout(), None)
+
+    def test_retry_server_errors(self):
+        self.client.failures = 3
+        self.test.retry = lablogretry.RetryPolicy(sleep = lambda delay: None)
+        self.checkUpload(2)
+
+    def test_server_errors_without_retry(self):
+        self.client.failures = 3
+        data_fail, post_fail, length = self.test.doUpload(1)
+        # a.dat, b.dat and bfail.dat fail, the rest are uploaded
+        self.assertEqual(data_fail, 3)
+        self.assertEqual(len(self.client.posts), 2)
+
+    def test_multipart_transfer(self):
+        self.test.transfer = TRANSFER_MULTIPART
+        self.checkUpload(1)
+        # The first file is sent inline, before the server says that 
+        # it accepts multipart transfers
+        self.assertEqual(self.client.multipart_posts, 4)
+
+    def test_multipart_not_offered(self):
+        self.client.multipart = False
+        self.test.transfer = TRANSFER_MULTIPART
+        self.checkUpload(1)
+        self.assertEqual(self.client.multipart_posts, 0)
+        self.assertEqual(_multipart_servers, set())
+
+    def test_multipart_falls_back_to_inline(self):
+        _multipart_servers.add('http://lablog')
+        self.client.multipart = False
+        self.test.transfer = TRANSFER_MULTIPART
+        self.checkUpload(1)
+        # Only the first file is tried as multipart
+        self.assertEqual(self.client.multipart_posts, 1)
+        self.assertTrue('http://lablog' in _inline_only_servers)
+        self.assertEqual(_multipart_servers, set())
+
+    def test_multipart_stored_short(self):
+        self.client.short = 1
+        self.test.transfer = TRANSFER_MULTIPART
+        self.checkUpload(1)
+        # The second file is tried as multipart and sent again inline
+        self.assertEqual(self.client.multipart_posts, 1)
+        self.assertTrue('http://lablog' in _inline_only_servers)
+        self.assertEqual(len(self.client.datafiles), 6)
+
+    def test_usefilename(self):
+        self.test.usefilename = True
+        self.test.doUpload(3)
+        self.assertEqual(self.client.posts['c.dat'], 'data-c.dat')
+
+    def test_scanned_files(self):
+        os.mkdir(os.path.join(self.tempdir, 'subdirectory'))
+        self.test.filelist = lablogscan.DirectoryScanner(self.tempdir)
+        self.checkUpload(2)
+        self.test.filelist = lablogscan.DirectoryScanner(self.tempdir,
+                                                    include = ['*.txt'])
+        self.assertEqual(self.test.doUpload(2), 'Filelist is empty')
+        os.rmdir(os.path.join(self.tempdir, 'subdirectory'))
+
+    def test_watch(self):
+        watcher = lablogwatch.DirectoryWatcher(self.tempdir, settle = 0.1,
+                                               poll_interval = 0.1)
+        reported = []
+        def progress(index, path, result):
+            reported.append(os.path.basename(path))
+            if len(reported) == 5:
+                f = open(os.path.join(self.tempdir, 'e.dat'), 'wb')
+                f.write('e.dat')
+                f.close()
+            elif len(reported) == 6:
+                self.test.cancel()
+
+        self.test.usefilename = True
+        self.test.progress = progress
+        timer = threading.Timer(5, self.test.cancel)
+        timer.start()
+        try:
+            self.assertEqual(self.test.doWatch(watcher), (1, 0, 6))
+        finally:
+            timer.cancel()
+            watcher.close()
+        self.assertEqual(sorted(reported[:5]), ['a.dat', 'b.dat',
+                         'bfail.dat', 'c.dat', 'd.dat'])
+        self.assertEqual(reported[5], 'e.dat')
+        self.assertEqual(self.client.posts['e.dat'], 'data-e.dat')
+
+        # Only the failed file is handed out to a new watcher
+        watcher = lablogwatch.DirectoryWatcher(self.tempdir, settle = 0)
+        self.assertEqual(watcher.files().next(), 
+                         os.path.join(self.tempdir, 'bfail.dat'))
+        watcher.close()
+
+
+class TestProxySettings(unittest.TestCase):
+
+    def tearDown(self):
+        set_proxy(None)
+
+    def test_set_proxy(self):
+        set_proxy(True)
+        self.assertEqual(_proxy_resolver.resolve(DEFAULT_URL),
+                         PROXIES['ral']['http'])
+        set_proxy(False)
+        self.assertEqual(_proxy_resolver.resolve(DEFAULT_URL), None)
+
+    def test_check_server(self):
+        server = lablogmock.MockLaBLog()
+        server.start()
+        try:
+            self.assertTrue(check_server(server.url))
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
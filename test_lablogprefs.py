@@ -0,0 +1,123 @@
+# Tests for lablogprefs
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to test_lablogprefs.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Usage: python test_lablogprefs.py [TestCase[.test_method]]
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+import unittest
+from lablogprefs import *
+
+class TestPreferences(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'prefs.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def write(self, values):
+        f = open(self.path, 'wb')
+        f.write(json.dumps(values))
+        f.close()
+
+    def test_defaults_and_persistence(self):
+        prefs = Preferences(self.path)
+        self.assertEqual(prefs.get('server'), 'http://biolab.isis.rl.ac.uk')
+        self.assertFalse(os.path.exists(self.path))
+
+        prefs.set('blog', 'testing_sandpit')
+        prefs = Preferences(self.path)
+        self.assertEqual(prefs.get('blog'), 'testing_sandpit')
+        self.assertEqual(json.load(open(self.path))['version'],
+                         SCHEMA_VERSION)
+        self.assertEqual(os.listdir(self.tempdir), ['prefs.json'])
+        self.assertRaises(AssertionError, prefs.set, 'colour', 'blue')
+
+    def test_round_trip_gives_str(self):
+        prefs = Preferences(self.path)
+        prefs.set('blog', 'testing_sandpit')
+        prefs.set('username', 'cameronneylon.net')
+        prefs.set('directory', '/data/gels')
+        prefs.set('blogs', {'http://lablog' : ['lab_materials']})
+
+        prefs = Preferences(self.path)
+        for name in ['blog', 'username', 'directory']:
+            self.assertEqual(type(prefs.get(name)), str)
+        self.assertEqual(type(prefs.get('blogs').keys()[0]), str)
+        self.assertEqual(type(prefs.get('blogs')['http://lablog'][0]), str)
+
+    def test_presets(self):
+        prefs = Preferences(self.path)
+        prefs.savePreset('gels', 'Data', {'Data_Type' : 'Gel_image'})
+        prefs.savePreset('notes', 'Notes', {})
+
+        prefs = Preferences(self.path)
+        self.assertEqual(prefs.presetNames(), ['gels', 'notes'])
+        section, metadata = prefs.getPreset('gels')
+        self.assertEqual((section, metadata),
+                         ('Data', {'Data_Type' : 'Gel_image'}))
+        self.assertEqual(type(section), str)
+        self.assertEqual(type(metadata.values()[0]), str)
+
+        prefs.deletePreset('gels')
+        prefs.deletePreset('unknown')
+        self.assertEqual(Preferences(self.path).presetNames(), ['notes'])
+
+    def test_migration(self):
+        self.write({'server' : 'http://lablog',
+                    'usernames' : {'http://lablog' : 'someone'},
+                    'presets' : {'gels' : {'Data_Type' : 'Gel_image'}},
+                    'window' : [100, 100]})
+        prefs = Preferences(self.path)
+        self.assertEqual(prefs.get('server'), 'http://lablog')
+        self.assertEqual(prefs.get('usernames'),
+                         {'http://lablog' : ['someone']})
+        self.assertEqual(prefs.get('directory'), '')
+        self.assertEqual(prefs.getPreset('gels'),
+                         ('', {'Data_Type' : 'Gel_image'}))
+
+    def test_newer_version_not_overwritten(self):
+        self.write({'version' : SCHEMA_VERSION + 1, 'blog' : 'lab',
+                    'colour' : 'blue'})
+        prefs = Preferences(self.path)
+        self.assertEqual(prefs.get('blog'), 'lab')
+        prefs.set('blog', 'other')
+        self.assertEqual(json.load(open(self.path))['colour'], 'blue')
+
+    def test_unreadable(self):
+        f = open(self.path, 'wb')
+        f.write('[1, 2')
+        f.close()
+        self.assertEqual(Preferences(self.path).get('blog'), '')
+
+    def test_startup_time(self):
+        # Loading in a fresh interpreter must be quick and light
+        Preferences(self.path).set('directory', '/data')
+        script = ('import sys, time; start = time.time(); '
+                  'import lablogprefs; '
+                  'lablogprefs.Preferences(%r).get("directory"); '
+                  'print time.time() - start; '
+                  'print "xml.etree" in sys.modules or '
+                  '"sqlite3" in sys.modules' % self.path)
+        output = subprocess.Popen([sys.executable, '-c', script],
+                                  stdout = subprocess.PIPE,
+                                  cwd = os.path.dirname(__file__) or '.'
+                                  ).communicate()[0].split()
+        self.assertTrue(float(output[0]) < 0.1)
+        self.assertEqual(output[1], 'False')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# Tests for lablogproxy
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to test_lablogproxy.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Usage: python test_lablogproxy.py [TestCase[.test_method]]
+
+import os
+import unittest
+import lablogmock
+from lablogproxy import *
+
+class TestProxyResolver(unittest.TestCase):
+
+    def setUp(self):
+        self.environ = os.environ.copy()
+        for name in os.environ.keys():
+            if name.lower().endswith('_proxy'):
+                del os.environ[name]
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+
+    def test_explicit_proxies(self):
+        os.environ['http_proxy'] = 'http://envproxy:3128'
+        resolver = ProxyResolver({'http' : 'http://wwwcache.rl.ac.uk:8080'})
+        self.assertEqual(resolver.resolve('http://biolab.isis.rl.ac.uk/api'),
+                         'http://wwwcache.rl.ac.uk:8080')
+        self.assertEqual(resolver.resolve('https://biolab.isis.rl.ac.uk/'),
+                         None)
+        resolver.set_proxies({})
+        self.assertEqual(resolver.resolve('http://biolab.isis.rl.ac.uk/'),
+                         None)
+
+    def test_environment(self):
+        os.environ['http_proxy'] = 'envproxy:3128'
+        os.environ['no_proxy'] = 'intranet.example.org'
+        resolver = ProxyResolver()
+        self.assertEqual(resolver.resolve('http://biolab.isis.rl.ac.uk/'),
+                         'http://envproxy:3128')
+        self.assertEqual(resolver.resolve('http://intranet.example.org/'),
+                         None)
+        self.assertEqual(resolver.resolve('http://127.0.0.1:8000/'), None)
+
+    def test_resolved_lazily_and_cached(self):
+        resolver = ProxyResolver()
+        os.environ['http_proxy'] = 'http://envproxy:3128'
+        self.assertEqual(resolver.resolve('http://biolab.isis.rl.ac.uk/'),
+                         'http://envproxy:3128')
+        os.environ['http_proxy'] = 'http://otherproxy:3128'
+        self.assertEqual(resolver.resolve('http://biolab.isis.rl.ac.uk/a'),
+                         'http://envproxy:3128')
+
+    def test_check(self):
+        server = lablogmock.MockLaBLog()
+        server.start()
+        try:
+            self.assertTrue(ProxyResolver().check(server.url))
+        finally:
+            server.stop()
+        self.assertFalse(ProxyResolver().check(server.url, timeout = 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+# Tests for lablogretry
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to test_lablogretry.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Usage: python test_lablogretry.py [TestCase[.test_method]]
+
+import sys
+import socket
+import urllib2
+import traceback
+import unittest
+from lablogretry import *
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.sleeps = []
+        self.calls = 0
+
+    def flaky(self, failures, error = None):
+        """Return a function that fails the given number of times"""
+
+        def func():
+            self.calls += 1
+            if self.calls <= failures:
+                if error:
+                    raise error
+                return None
+            return 'ok'
+        return func
+
+    def policy(self, **kwargs):
+        return RetryPolicy(sleep = self.sleeps.append,
+                           random = lambda: 1.0, **kwargs)
+
+    def test_backoff_is_capped(self):
+        policy = self.policy(base_delay = 1, max_delay = 5)
+        self.assertEqual([policy.delay(n) for n in range(5)],
+                         [1, 2, 4, 5, 5])
+
+    def test_retries_network_errors(self):
+        policy = self.policy(max_attempts = 4)
+        func = self.flaky(2, urllib2.URLError('down'))
+        self.assertEqual(policy.call(func), 'ok')
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(len(self.sleeps), 2)
+
+    def test_gives_up_after_max_attempts(self):
+        policy = self.policy(max_attempts = 3)
+        func = self.flaky(5, socket.timeout())
+        self.assertRaises(socket.timeout, policy.call, func)
+        self.assertEqual(self.calls, 3)
+
+    def test_traceback_kept(self):
+        policy = self.policy(max_attempts = 2)
+        try:
+            policy.call(self.flaky(5, socket.timeout()))
+            self.fail('No error raised')
+        except socket.timeout:
+            frames = traceback.extract_tb(sys.exc_info()[2])
+        # The traceback ends where the error was raised
+        self.assertEqual(frames[-1][2], 'func')
+
+    def test_client_errors_not_retried(self):
+        policy = self.policy()
+        error = urllib2.HTTPError('http://lablog', 404, 'Not Found', {},
+                                  None)
+        self.assertRaises(urllib2.HTTPError, policy.call,
+                          self.flaky(1, error))
+        self.assertEqual(self.calls, 1)
+
+    def test_retry_result(self):
+        policy = self.policy()
+        result = policy.call(self.flaky(2),
+                             retry_result = lambda result: result == None)
+        self.assertEqual(result, 'ok')
+
+    def test_budget(self):
+        policy = self.policy(budget = RetryBudget(1))
+        self.assertRaises(urllib2.URLError, policy.call,
+                          self.flaky(5, urllib2.URLError('down')))
+        self.assertEqual(self.calls, 2)
+
+    def test_deadline(self):
+        now = [0.0]
+        deadline = Deadline(10, clock = lambda: now[0])
+        self.assertEqual(deadline.limit(30), 10)
+        now[0] = 8
+        self.assertEqual(deadline.limit(1), 1)
+        self.assertEqual(deadline.limit(30), 2)
+        now[0] = 10
+        self.assertTrue(deadline.expired())
+        self.assertRaises(DeadlineExceeded, deadline.limit, 30)
+
+        # A passed deadline is not retried
+        def func():
+            self.calls += 1
+            deadline.limit(30)
+        self.assertRaises(DeadlineExceeded, self.policy().call, func)
+        self.assertEqual(self.calls, 1)
+
+    def test_circuit_breaker_pauses(self):
+        now = [0.0]
+        def sleep(seconds):
+            self.sleeps.append(seconds)
+            now[0] += seconds
+
+        breaker = CircuitBreaker(threshold = 2, pause = 10, sleep = sleep,
+                                 clock = lambda: now[0])
+        breaker.failure()
+        self.assertFalse(breaker.is_open())
+        breaker.failure()
+        self.assertTrue(breaker.is_open())
+        breaker.wait()
+        self.assertEqual(self.sleeps, [10])
+        self.assertFalse(breaker.is_open())
+
+        # One more failure reopens it, a success closes it
+        breaker.failure()
+        self.assertTrue(breaker.is_open())
+        breaker.success()
+        self.assertFalse(breaker.is_open())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+# Tests for lablogscan
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to test_lablogscan.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Usage: python test_lablogscan.py [TestCase[.test_method]]
+
+import os
+import shutil
+import tempfile
+import unittest
+import lablogscan
+from lablogscan import *
+
+class TestDirectoryScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        for name in ['run10.dat', 'run2.dat', 'run1.dat', 'notes.txt',
+                     '.hidden', 'sub/run3.dat', 'sub/deeper/run1.dat',
+                     'skip/run4.dat', 'big.dat']:
+            path = os.path.join(self.tempdir, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            f = open(path, 'wb')
+            if name == 'big.dat':
+                f.write('x' * 1000)
+            else:
+                f.write(name)
+            f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def names(self, scanner):
+        prefix = len(self.tempdir) + 1
+        return [path[prefix:] for path in scanner]
+
+    def test_top_level_files_only(self):
+        self.assertEqual(self.names(DirectoryScanner(self.tempdir)),
+                         ['big.dat', 'notes.txt', 'run1.dat', 'run2.dat',
+                          'run10.dat'])
+
+    def test_recursive_with_filters(self):
+        scanner = DirectoryScanner(self.tempdir, recursive = True,
+                                   include = ['*.dat'], exclude = ['skip'],
+                                   max_size = 100)
+        self.assertEqual(self.names(scanner),
+                         ['run1.dat', 'run2.dat', 'run10.dat',
+                          'sub/run3.dat', 'sub/deeper/run1.dat'])
+
+    def test_relative_path_patterns(self):
+        scanner = DirectoryScanner(self.tempdir, recursive = True,
+                                   include = ['sub/*'], min_size = 1)
+        self.assertEqual(self.names(scanner), ['sub/run3.dat',
+                                               'sub/deeper/run1.dat'])
+
+    def test_batches_sorted(self):
+        batches = list(DirectoryScanner(self.tempdir, batch_size = 2,
+                                        exclude = ['*.txt']).batches())
+        self.assertEqual([len(batch) for batch in batches], [2, 2])
+        for batch in batches:
+            self.assertEqual(batch, sorted(batch, key = lambda path:
+                                     natural_key(os.path.basename(path))))
+
+    def test_listdir_fallback(self):
+        saved = lablogscan.scandir
+        lablogscan.scandir = None
+        try:
+            self.test_recursive_with_filters()
+        finally:
+            lablogscan.scandir = saved
+
+    def test_streams(self):
+        # Subdirectories are only read once the files before are given
+        scanner = iter(DirectoryScanner(self.tempdir, recursive = True))
+        scanner.next()
+        shutil.rmtree(os.path.join(self.tempdir, 'sub'))
+        self.assertEqual(len(list(scanner)), 5)
+
+    def test_natural_key(self):
+        self.assertEqual(sorted(['a10b2', 'a2b10', 'a2b2', 'a'],
+                                key = natural_key),
+                         ['a', 'a2b2', 'a2b10', 'a10b2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# Tests for lablogtrace
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to test_lablogtrace.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Usage: python test_lablogtrace.py [TestCase[.test_method]]
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import lablogtrace
+from lablogtrace import *
+
+class TestTrace(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tempdir, 'trace.log')
+
+    def tearDown(self):
+        lablogtrace.disable()
+        shutil.rmtree(self.tempdir)
+
+    def read_spans(self, path = None):
+        f = open(path or self.path)
+        try:
+            return [json.loads(line) for line in f]
+        finally:
+            f.close()
+
+    def test_truncated(self):
+        self.assertEqual(str(Truncated('short')), 'short')
+        text = str(Truncated('x' * 1000, limit = 10))
+        self.assertEqual(text, 'x' * 10 + '... [1000 characters]')
+
+    def test_redact_url(self):
+        self.assertEqual(redact_url('http://lablog/api/rest/adddata/uid/abc'),
+                         'http://lablog/api/rest/adddata/uid/...')
+        self.assertEqual(redact_url('http://lablog/uid/abc?x=1'),
+                         'http://lablog/uid/...?x=1')
+
+    def test_disabled(self):
+        self.assertTrue(span('request', url = 'http://lablog') is NULL_SPAN)
+        span('request').finish(status = '200')
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_spans(self):
+        enable(self.path)
+        span('LaBLogData', url = 'http://lablog/uid/abc',
+             bytes = 10).finish(status = '200')
+        span('LaBLogPost').finish(error = ValueError('x' * 1000))
+        first, second = self.read_spans()
+        self.assertEqual(first['span'], 'LaBLogData')
+        self.assertEqual(first['url'], 'http://lablog/uid/...')
+        self.assertEqual(first['bytes'], 10)
+        self.assertEqual(first['status'], '200')
+        self.assertTrue(first['seconds'] >= 0)
+        self.assertTrue(second['error'].startswith('ValueError: xxx'))
+        self.assertTrue(len(second['error']) < 300)
+
+    def test_rotation(self):
+        enable(self.path, max_bytes = 1000, backups = 2)
+        for i in range(50):
+            span('request', index = i).finish()
+        self.assertTrue(os.path.getsize(self.path) <= 1000)
+        self.assertTrue(os.path.exists(self.path + '.2'))
+        self.assertFalse(os.path.exists(self.path + '.3'))
+        self.assertEqual(self.read_spans()[-1]['index'], 49)
+
+    def test_disable(self):
+        enable(self.path)
+        disable()
+        span('request').finish()
+        self.assertEqual(self.read_spans(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# Tests for lablogtransport
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to test_lablogtransport.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Usage: python test_lablogtransport.py [TestCase[.test_method]]
+
+import urllib2
+import unittest
+from lablogtransport import *
+
+# Imported here as lablogmock itself depends on this module
+import lablogmock
+
+class TestTransports(unittest.TestCase):
+
+    def setUp(self):
+        self.app = lablogmock.MockLaBLogApp()
+        self.server = lablogmock.MockLaBLog()
+        self.server.start()
+        self.body = ('--b\r\nContent-Disposition: form-data; name="request"'
+                     '\r\n\r\n<dataset><title>t</title><data><dataitem '
+                     'filename="a.dat">YWJj</dataitem></data></dataset>'
+                     '\r\n--b--\r\n')
+        self.headers = {'Content-Type' : 'multipart/form-data; boundary=b'}
+
+    def tearDown(self):
+        self.server.stop()
+
+    def checkDataPost(self, transport, url):
+        response = transport.post(url + '/api/rest/adddata/uid/', self.body,
+                                  self.headers)
+        self.assertTrue('<success>true</success>' in response.read())
+
+    def test_urllib2(self):
+        self.checkDataPost(Urllib2Transport(), self.server.url)
+        self.checkDataPost(Urllib2Transport(proxies = {}), self.server.url)
+        self.assertEqual(self.server.datasets['1'], ('t', 'a.dat', 3))
+
+    def test_in_memory(self):
+        transport = InMemoryTransport(self.app.dispatch)
+        self.checkDataPost(transport, 'http://lablog')
+        self.assertEqual(self.app.datasets['1'], ('t', 'a.dat', 3))
+
+    def test_in_memory_errors(self):
+        self.app.error_rate = 1
+        transport = InMemoryTransport(self.app.dispatch)
+        self.assertRaises(urllib2.HTTPError, self.checkDataPost, transport,
+                          'http://lablog')
+        self.app.error_rate = 0
+        self.app.reset_rate = 1
+        self.assertRaises(urllib2.URLError, self.checkDataPost, transport,
+                          'http://lablog')
+
+
+if __name__ == '__main__':
+    unittest.main()
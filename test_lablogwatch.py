@@ -0,0 +1,106 @@
+# Tests for lablogwatch
+#
+# Public Domain Waiver:
+# To the extent possible under law, Cameron Neylon has waived all
+# copyright and related or neighboring rights to test_lablogwatch.py
+# This work is published from United Kingdom.
+#
+# See http://creativecommons.org/publicdomain/zero/1.0/
+#
+# Usage: python test_lablogwatch.py [TestCase[.test_method]]
+
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from lablogwatch import *
+
+class TestDirectoryWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.stop = threading.Event()
+        self.sizes = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tempdir)
+
+    def write(self, name, content = 'data'):
+        f = open(os.path.join(self.tempdir, name), 'ab')
+        f.write(content)
+        f.close()
+
+    def collect(self, watcher, count, timeout = 5):
+        """Return the names of the first count files handed out"""
+
+        timer = threading.Timer(timeout, self.stop.set)
+        timer.start()
+        names = []
+        try:
+            for path in watcher.files(self.stop):
+                names.append(os.path.basename(path))
+                self.sizes.append(os.path.getsize(path))
+                watcher.done(path)
+                if len(names) == count:
+                    break
+        finally:
+            timer.cancel()
+        return names
+
+    def checkWatcher(self, use_inotify):
+        self.write('old.dat')
+        self.write('.hidden')
+        watcher = DirectoryWatcher(self.tempdir, settle = 0.2,
+                                   poll_interval = 0.1,
+                                   use_inotify = use_inotify)
+        self.assertEqual(self.collect(watcher, 1), ['old.dat'])
+
+        # A file being written is only handed out once it settles
+        def writer():
+            for i in range(4):
+                self.write('new.dat', 'x' * 100)
+                time.sleep(0.1)
+        thread = threading.Thread(target = writer)
+        thread.start()
+        start = time.time()
+        self.assertEqual(self.collect(watcher, 1), ['new.dat'])
+        thread.join()
+        self.assertEqual(self.sizes[-1], 400)
+        self.assertTrue(time.time() - start < 2)
+        watcher.close()
+
+        # Files done are not handed out again after a restart
+        self.write('later.dat')
+        watcher = DirectoryWatcher(self.tempdir, settle = 0.1,
+                                   poll_interval = 0.1,
+                                   use_inotify = use_inotify)
+        self.assertEqual(self.collect(watcher, 1), ['later.dat'])
+        watcher.close()
+
+    def test_polling(self):
+        self.checkWatcher(False)
+
+    def test_inotify(self):
+        if load_libc() == None:
+            return
+        watcher = DirectoryWatcher(self.tempdir)
+        self.assertTrue(isinstance(watcher.backend, InotifyBackend))
+        watcher.close()
+        self.checkWatcher(True)
+
+    def test_cursor_dropped_names(self):
+        self.write('a.dat')
+        cursor = WatchCursor.for_directory(self.tempdir)
+        cursor.add('a.dat')
+        cursor.add('gone.dat')
+        cursor.close()
+        cursor = WatchCursor.for_directory(self.tempdir)
+        self.assertTrue('a.dat' in cursor)
+        self.assertFalse('gone.dat' in cursor)
+        cursor.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
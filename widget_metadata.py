@@ -49,8 +49,8 @@ class MenuPair(QWidget):
         programmatically. Need to capture the item Text and
         set self.key and then reinitialise the value menu.
         """
-        logging.debug("widget_metadata: Key Menu Item triggered: " 
-                            + self.keymenu.currentText())
+        logging.debug("widget_metadata: Key Menu Item triggered: %s",
+                      self.keymenu.currentText())
         self.key = self.keymenu.currentText()
         self.initValuesMenu()
         self.emit(SIGNAL('keyMenuActivated'))
@@ -59,8 +59,8 @@ class MenuPair(QWidget):
     def valueMenuItemSelected(self):
         """Method to capture a new value menu selection
         """
-        logging.debug("widget_metadata: Value menu triggered: "
-                              + self.valuemenu.currentText())
+        logging.debug("widget_metadata: Value menu triggered: %s",
+                      self.valuemenu.currentText())
         self.value = self.valuemenu.currentText()
         self.emit(SIGNAL('valueMenuActivated'))
         logging.debug('widget_metadata: Emitted valueMenuActivated')
@@ -88,8 +88,8 @@ class MenuPair(QWidget):
         the menu is populated with these.
         """
         
-        logging.debug("widget_metadata: Initialising Value Menu with key: "
-                                 + str(self.key))
+        logging.debug("widget_metadata: Initialising Value Menu with "
+                      "key: %s", self.key)
         # Clear the values menu
 
         # If the key is in the mapping dictionary with associated values
@@ -106,11 +106,31 @@ class MenuPair(QWidget):
             logging.debug("widget_metadata: Self.key not in mapping dict")
 
     def getKey(self):
-        logging.debug("widget_metadata: Getting key: " + str(self.key))
+        logging.debug("widget_metadata: Getting key: %s", self.key)
         return self.key
 
+    def setKey(self, key):
+        """Select key in the key menu, entering it if not offered
+        """
+        index = self.keymenu.findText(key)
+        if index == -1:
+            self.keymenu.setEditText(key)
+            self.keyMenuItemSelected()
+        elif index != self.keymenu.currentIndex():
+            self.keymenu.setCurrentIndex(index)
+
+    def setValue(self, value):
+        """Select value in the value menu, entering it if not offered
+        """
+        index = self.valuemenu.findText(value)
+        if index == -1:
+            self.valuemenu.setEditText(value)
+            self.valueMenuItemSelected()
+        elif index != self.valuemenu.currentIndex():
+            self.valuemenu.setCurrentIndex(index)
+
     def getValue(self):
-        logging.debug("widget_metadata: Getting value: " + str(self.value))
+        logging.debug("widget_metadata: Getting value: %s", self.value)
         return self.value
 
     def setKeyMenuEnabled(self, boolean):
@@ -146,6 +166,14 @@ class MetadataWidget(QWidget):
     The object is to have a widget that starts with one double menu pair
     to select the section and plus and minus buttons to add extra menu
     pairs for the addition of extra key value pairs.
+
+    Above them a menu of saved presets of section and metadata, set 
+    with setPresets(), has buttons to save the current choices as a 
+    new preset and to delete the chosen one. The widget only emits 
+    metadataWidgetPresetChosen, metadataWidgetPresetSaved and 
+    metadataWidgetPresetDeleted with the name of the preset; the 
+    presets themselves are kept by the owner of the widget, which
+    applies a preset with setPreset().
     """
 
     def __init__(self, keymenuitems =[], keytovaluesmapping = {}, *args):
@@ -162,6 +190,23 @@ class MetadataWidget(QWidget):
         self.grid = QGridLayout()
         self.label = QLabel('Metadata')
 
+        # Set up the presets menu and buttons
+        self.presetbox = QHBoxLayout()
+        self.presetmenu = QComboBox()
+        self.connect(self.presetmenu, SIGNAL('activated(QString)'),
+                                      self.emitPresetChosen)
+        self.savepresetbutton = QPushButton('Save preset')
+        self.connect(self.savepresetbutton, SIGNAL('clicked()'),
+                                            self.emitPresetSaved)
+        self.deletepresetbutton = QPushButton('Delete preset')
+        self.deletepresetbutton.setEnabled(False)
+        self.connect(self.deletepresetbutton, SIGNAL('clicked()'),
+                                              self.emitPresetDeleted)
+        self.presetbox.addWidget(self.label)
+        self.presetbox.addWidget(self.presetmenu)
+        self.presetbox.addWidget(self.savepresetbutton)
+        self.presetbox.addWidget(self.deletepresetbutton)
+
         # Set up the section menu
         self.section = MenuPair(keymenuitems = ['Section'],
                                 keytovaluesmapping = self.keytovaluesmapping)
@@ -187,7 +232,7 @@ class MetadataWidget(QWidget):
                           self.removeMenuPair)
 
         # Initial layout
-        self.grid.addWidget(self.label, 0, 0)
+        self.grid.addLayout(self.presetbox, 0, 0, 1, 3)
         self.grid.addWidget(self.section, 1, 0)
         self.grid.addWidget(self.plusbutton, 1, 1)
         self.grid.addWidget(self.minusbutton, 1, 2)
@@ -248,6 +293,59 @@ class MetadataWidget(QWidget):
         self.grid.addWidget(self.plusbutton, (len(self.menupairlist)+1), 1)
         self.grid.addWidget(self.minusbutton, (len(self.menupairlist)+1), 2)
 
+    def setVocabulary(self, keymenuitems, keytovaluesmapping):
+        """Replace the keys and values offered
+
+        The section menu is reset with the new sections and menupairs
+        added from now on offer the new keys and values. Menupairs 
+        already added keep their selections.
+        """
+        self.keymenuitems = keymenuitems
+        self.keytovaluesmapping = keytovaluesmapping
+        self.section.keytovaluesmapping = keytovaluesmapping
+        self.section.initValuesMenu()
+
+    def setPresets(self, names):
+        """Replace the presets offered in the presets menu
+        """
+        self.presetmenu.clear()
+        for name in names:
+            self.presetmenu.addItem(name)
+        self.deletepresetbutton.setEnabled(len(names) > 0)
+
+    def setPreset(self, section, metadata):
+        """Select the section and replace the menupairs with metadata
+        """
+        self.section.setValue(section)
+        while self.menupairlist:
+            self.removeMenuPair()
+        for key in sorted(metadata):
+            self.addMenuPair()
+            self.menupairlist[-1].setKey(key)
+            self.menupairlist[-1].setValue(metadata[key])
+        self.emitMetadataChanged()
+
+    def emitPresetChosen(self, name):
+        """Method to notify view that a preset has been chosen
+        """
+        self.emit(SIGNAL('metadataWidgetPresetChosen'), (str(name),))
+
+    def emitPresetSaved(self):
+        """Ask for a preset name and notify view to save the choices
+        """
+        name, ok = QInputDialog.getText(self, 'Save preset', 'Preset name:',
+                                        QLineEdit.Normal,
+                                        self.presetmenu.currentText())
+        if ok and not name.isEmpty():
+            self.emit(SIGNAL('metadataWidgetPresetSaved'), (str(name),))
+
+    def emitPresetDeleted(self):
+        """Method to notify view that the chosen preset is to go
+        """
+        if self.presetmenu.count() > 0:
+            self.emit(SIGNAL('metadataWidgetPresetDeleted'),
+                      (str(self.presetmenu.currentText()),))
+
     def emitSectionChanged(self):
         """Method to notify view that section has been changed
         """